@@ -0,0 +1,133 @@
+"""Cohort aggregates maintained incrementally as reports are saved.
+
+``CohortAggregates`` is a report-store indexer: the SQLite store calls
+``update`` inside the same transaction that inserts a report, so the counts
+in the ``cohort_aggregates`` table are always consistent with the saved
+reports. Reading a cohort summary is then a scan of a few dozen rows no
+matter how many assessments are stored.
+
+``CohortDensity`` does the same for a two-dimensional histogram of CAT score
+against FEV1 % predicted per GOLD group, so a scatter of the whole cohort is
+drawn from at most a few thousand bins.
+"""
+from collections import defaultdict
+
+GROUPS = ["A", "B", "E"]
+GOLD_STAGES = ["GOLD 1", "GOLD 2", "GOLD 3", "GOLD 4"]
+CAT_MAX = 40
+
+# FEV1 % predicted bins for the CAT vs FEV1 density; higher values share the last bin
+FEV1_BIN_WIDTH = 2
+FEV1_MAX = 150
+
+TRIPLE_THERAPY_MARKER = "triple therapy"
+
+
+def has_triple_therapy_consideration(report):
+    """True if any special consideration suggests triple therapy"""
+    considerations = (report.get("recommendations") or {}).get("special_considerations") or []
+    return any(TRIPLE_THERAPY_MARKER in c.lower() for c in considerations)
+
+
+def aggregate_keys(report):
+    """(metric, key) pairs a report contributes one count to"""
+    patient = report.get("patient_data") or {}
+    diagnosis = report.get("diagnosis") or {}
+    keys = [("total", "")]
+    if diagnosis.get("GOLD_group"):
+        keys.append(("GOLD_group", diagnosis["GOLD_group"]))
+    keys.append(("gold_stage", patient.get("gold_stage") or "Not measured"))
+    if patient.get("CAT_score") is not None:
+        keys.append(("CAT_score", str(int(patient["CAT_score"]))))
+    keys.append(("triple_therapy", "yes" if has_triple_therapy_consideration(report) else "no"))
+    return keys
+
+
+class CohortAggregates:
+    """Report-store indexer keeping per-metric counts of saved reports"""
+
+    table = "cohort_aggregates"
+
+    def create(self, conn):
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                metric TEXT NOT NULL,
+                key TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (metric, key)
+            ) WITHOUT ROWID
+        """)
+
+    def update(self, conn, report_id, report):
+        conn.executemany(
+            f"INSERT INTO {self.table} (metric, key, count) VALUES (?, ?, 1) "
+            "ON CONFLICT (metric, key) DO UPDATE SET count = count + 1",
+            aggregate_keys(report))
+
+    def summary(self, conn):
+        """Nested {metric: {key: count}} of everything saved so far"""
+        counts = defaultdict(dict)
+        for metric, key, count in conn.execute(f"SELECT metric, key, count FROM {self.table}"):
+            counts[metric][key] = count
+        return cohort_summary(counts)
+
+
+def cohort_summary(counts):
+    """Shape raw aggregate counts for the Cohort Analytics page"""
+    total = counts.get("total", {}).get("", 0)
+    cat_counts = counts.get("CAT_score", {})
+    cat_histogram = [cat_counts.get(str(score), 0) for score in range(CAT_MAX + 1)]
+    cat_n = sum(cat_histogram)
+    triple = counts.get("triple_therapy", {}).get("yes", 0)
+    stages = counts.get("gold_stage", {})
+    return {
+        "total": total,
+        "GOLD_group": {group: counts.get("GOLD_group", {}).get(group, 0) for group in GROUPS},
+        "gold_stage": {stage: stages.get(stage, 0)
+                       for stage in GOLD_STAGES + sorted(set(stages) - set(GOLD_STAGES))},
+        "CAT_histogram": cat_histogram,
+        "CAT_mean": (sum(s * n for s, n in enumerate(cat_histogram)) / cat_n) if cat_n else None,
+        "triple_therapy": triple,
+        "triple_therapy_share": (triple / total) if total else None,
+    }
+
+
+def fev1_bin(fev1_percent):
+    """Lower edge of the FEV1 % predicted density bin holding a value"""
+    value = min(max(float(fev1_percent), 0.0), FEV1_MAX - FEV1_BIN_WIDTH)
+    return int(value // FEV1_BIN_WIDTH * FEV1_BIN_WIDTH)
+
+
+class CohortDensity:
+    """Report-store indexer keeping CAT x FEV1 % predicted counts per GOLD group"""
+
+    table = "cohort_density"
+
+    def create(self, conn):
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                GOLD_group TEXT NOT NULL,
+                CAT_score INTEGER NOT NULL,
+                fev1_bin INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (GOLD_group, CAT_score, fev1_bin)
+            ) WITHOUT ROWID
+        """)
+
+    def update(self, conn, report_id, report):
+        patient = report.get("patient_data") or {}
+        group = (report.get("diagnosis") or {}).get("GOLD_group")
+        if not group or patient.get("CAT_score") is None or patient.get("fev1_percent") is None:
+            return
+        conn.execute(
+            f"INSERT INTO {self.table} (GOLD_group, CAT_score, fev1_bin, count) VALUES (?, ?, ?, 1) "
+            "ON CONFLICT (GOLD_group, CAT_score, fev1_bin) DO UPDATE SET count = count + 1",
+            (group, int(patient["CAT_score"]), fev1_bin(patient["fev1_percent"])))
+
+    def bins(self, conn):
+        """{GOLD group: [(CAT score, FEV1 bin lower edge, count), ...]}"""
+        bins = defaultdict(list)
+        for group, cat, fev1, count in conn.execute(
+                f"SELECT GOLD_group, CAT_score, fev1_bin, count FROM {self.table}"):
+            bins[group].append((cat, fev1, count))
+        return dict(bins)
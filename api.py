@@ -0,0 +1,288 @@
+"""Local HTTP API serving the assessment rules to other systems, such as an EHR.
+
+    python api.py --port 8600 --threads 16 --processes 4
+
+Endpoints (JSON in and out, HTTP/1.1 with keep-alive):
+
+    POST /assess          one assessment -> report in the saved-report layout
+    POST /assess/batch    {"assessments": [...]} -> {"reports": [...], "errors": [...]}
+    GET  /health          status and knowledge-base version
+
+An assessment carries ``patient_data`` fields (see ``patient.SCHEMA``), with
+the app's raw inputs accepted in place of derived scores: ``dyspnea`` (the
+mMRC statement) for ``mMRC_score``, the eight CAT item scores for
+``CAT_score`` and ``fev1_actual``/``fev1_predicted`` for ``fev1_percent``;
+without ``fev1_predicted``, it comes from the reference equations when
+``age``, ``gender`` and ``height_cm`` are given. Fields must have their JSON
+type (strings, numbers, booleans, lists of strings); nothing is converted.
+``mMRC_score``, ``CAT_score`` and ``exacerbations`` are required. The GOLD
+stage (from FEV1; a client's ``gold_stage`` is ignored), GOLD group and
+considerations are computed exactly as on the Diagnosis & Treatment page,
+and the response is the ``report_data`` the page would save. Nothing is
+saved here.
+
+In a batch, ``reports[i]`` is the report for ``assessments[i]``, or null
+with the reason in ``errors`` (``{"index": i, "error": ...}``).
+
+Each process accepts connections on one socket and hands each connection to
+a fixed pool of ``--threads`` worker threads for as long as it is kept
+alive (idle connections are closed after ``IDLE_TIMEOUT`` seconds), so
+threads bound the concurrent connections a process serves. ``--processes``
+forks that many copies sharing the socket, for more than one core. The API
+has no authentication and listens on 127.0.0.1 unless told otherwise.
+"""
+import argparse
+import json
+import multiprocessing
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from assessment import (
+    CAT_ITEMS,
+    MMRC_SCALE,
+    build_report,
+    calculate_CAT_score,
+    calculate_fev1_percent,
+    classify_spirometry,
+)
+from knowledge_base import current as current_knowledge_base
+from patient import FIELD_NAMES, PatientRecord, validate
+from recommendations import cached_bundle
+from reference_equations import predicted
+
+DEFAULT_PORT = 8600
+DEFAULT_THREADS = 16
+
+# Seconds a kept-alive connection may sit idle before its worker drops it
+IDLE_TIMEOUT = 15
+
+MAX_BODY_BYTES = 10 * 2**20
+MAX_BATCH = 1000
+
+REQUIRED_FIELDS = ("mMRC_score", "CAT_score", "exacerbations")
+
+
+def _number(payload, name, low, high):
+    value = payload[name]
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not low <= value <= high:
+        raise ValueError(f"{name}: {value!r} is not a number in {low}-{high}")
+    return value
+
+
+def _reject_constant(name):
+    # json.loads accepts NaN and Infinity, which are not JSON
+    raise ValueError(f"{name} is not a JSON value")
+
+
+def patient_record(payload):
+    """Validated ``PatientRecord`` for one assessment; ValueError if it is invalid"""
+    if not isinstance(payload, dict):
+        raise ValueError("an assessment must be a JSON object")
+    # The GOLD stage is derived from FEV1 below, never taken from the client
+    values = {name: validate(name, payload[name], strict=True)
+              for name in FIELD_NAMES if name in payload and name != "gold_stage"}
+
+    if values.get("mMRC_score") is None and "dyspnea" in payload:
+        if not isinstance(payload["dyspnea"], str) or payload["dyspnea"] not in MMRC_SCALE:
+            raise ValueError(f"dyspnea: {payload['dyspnea']!r} is not an mMRC statement")
+        values["mMRC_score"] = MMRC_SCALE[payload["dyspnea"]]
+    if values.get("CAT_score") is None and any(item in payload for item in CAT_ITEMS):
+        missing = [item for item in CAT_ITEMS if item not in payload]
+        if missing:
+            raise ValueError(f"CAT items missing: {', '.join(missing)}")
+        values["CAT_score"] = calculate_CAT_score({item: _number(payload, item, 0, 5)
+                                                   for item in CAT_ITEMS})
+    if values.get("fev1_percent") is None and "fev1_actual" in payload:
+        if "fev1_predicted" in payload:
+            fev1_predicted = _number(payload, "fev1_predicted", 0, 10)
+        else:
+            reference = predicted(*(validate(name, values.get(name))
+                                    for name in ("age", "gender", "height_cm")))
+            fev1_predicted = reference["fev1_predicted"] if reference else 0
+        values["fev1_percent"] = calculate_fev1_percent(_number(payload, "fev1_actual", 0, 10),
+                                                        fev1_predicted)
+
+    # Staged from FEV1 as the Clinical Assessment page does
+    if values.get("fev1_percent") is not None:
+        values["fev1_percent"] = validate("fev1_percent", values["fev1_percent"])
+        values["gold_stage"] = classify_spirometry(values["fev1_percent"])[0]
+
+    missing = [name for name in REQUIRED_FIELDS if values.get(name) is None]
+    if missing:
+        raise ValueError(f"required: {', '.join(missing)}")
+    return PatientRecord().update(**values)
+
+
+def assess(payload, knowledge_base=None):
+    """Report for one assessment, as ``save_patient_data`` would receive it"""
+    if knowledge_base is None:
+        knowledge_base = current_knowledge_base()
+    data = patient_record(payload).to_dict()
+    bundle = cached_bundle(data, knowledge_base)
+    return build_report(data, bundle['GOLD_group'], bundle['considerations'], knowledge_base)
+
+
+def assess_many(payloads):
+    """(reports, errors) for a batch; one knowledge base for the whole batch"""
+    knowledge_base = current_knowledge_base()
+    reports, errors = [], []
+    for index, payload in enumerate(payloads):
+        try:
+            reports.append(assess(payload, knowledge_base))
+        except ValueError as e:
+            reports.append(None)
+            errors.append({"index": index, "error": str(e)})
+    return reports, errors
+
+
+class AssessmentHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "COPDAssessmentAPI/1.0"
+    timeout = IDLE_TIMEOUT
+    # Headers and body go out in two writes; without this, Nagle's algorithm
+    # holds the body back for the client's delayed ACK on kept-alive requests
+    disable_nagle_algorithm = True
+
+    def _send(self, status, body):
+        content = json.dumps(body, ensure_ascii=False, allow_nan=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _error(self, status, message):
+        self._send(status, {"error": message})
+
+    def _body(self):
+        """Parsed JSON body, or None after answering with an error"""
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+            if length < 0:
+                raise ValueError
+        except ValueError:
+            self.close_connection = True
+            self._error(411, "Content-Length required")
+            return None
+        if length > MAX_BODY_BYTES:
+            # The body is not read, so the connection cannot be reused
+            self.close_connection = True
+            self._error(413, f"body over {MAX_BODY_BYTES} bytes")
+            return None
+        try:
+            return json.loads(self.rfile.read(length), parse_constant=_reject_constant)
+        except (UnicodeDecodeError, ValueError) as e:
+            self._error(400, f"invalid JSON: {e}")
+            return None
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/health":
+            self._error(404, f"no such endpoint: {self.path}")
+            return
+        self._send(200, {"status": "ok", "knowledge_base_version": current_knowledge_base().version})
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        if path not in ("/assess", "/assess/batch"):
+            self.close_connection = True
+            self._error(404, f"no such endpoint: {self.path}")
+            return
+        body = self._body()
+        if body is None:
+            return
+
+        if path == "/assess":
+            try:
+                self._send(200, assess(body))
+            except ValueError as e:
+                self._error(422, str(e))
+            return
+
+        assessments = body.get("assessments") if isinstance(body, dict) else None
+        if not isinstance(assessments, list):
+            self._error(400, 'expected {"assessments": [...]}')
+        elif len(assessments) > MAX_BATCH:
+            self._error(413, f"more than {MAX_BATCH} assessments")
+        else:
+            reports, errors = assess_many(assessments)
+            self._send(200, {"reports": reports, "errors": errors})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer handing each accepted connection to a fixed pool of threads"""
+
+    request_queue_size = 128
+
+    def __init__(self, address, handler=AssessmentHandler, threads=DEFAULT_THREADS):
+        super().__init__(address, handler)
+        self.threads = threads
+        self._pool = None
+
+    def process_request(self, request, client_address):
+        # Created on first use, so forked workers each start their own threads
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.threads, thread_name_prefix="api")
+        self._pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def serve(host="127.0.0.1", port=DEFAULT_PORT, threads=DEFAULT_THREADS, processes=1, ready=None):
+    """Serve until interrupted; ``ready`` is called with the bound port"""
+    server = PooledHTTPServer((host, port), threads=threads)
+    # Loaded before forking so the workers share its memory
+    current_knowledge_base()
+    workers = []
+    if processes > 1:
+        context = multiprocessing.get_context("fork")
+        workers = [context.Process(target=server.serve_forever, daemon=True)
+                   for _ in range(processes - 1)]
+        for worker in workers:
+            worker.start()
+    if ready:
+        ready(server.server_address[1])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the COPD assessment rules over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="0 picks a free port")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS,
+                        help="worker threads per process (concurrent connections)")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes sharing the port")
+    args = parser.parse_args(argv)
+
+    def ready(port):
+        print(f"Listening on http://{args.host}:{port} "
+              f"({args.processes} x {args.threads} workers)", file=sys.stderr, flush=True)
+
+    serve(args.host, args.port, args.threads, args.processes, ready)
+
+
+if __name__ == "__main__":
+    main()
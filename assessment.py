@@ -0,0 +1,256 @@
+"""COPD scoring and classification rules.
+
+The scalar functions score one patient and back the Streamlit pages. The
+``*_batch`` functions apply exactly the same rules to whole columns with
+NumPy so that clinic panels can be re-triaged in one pass. NumPy and pandas
+are imported inside those functions so the Streamlit app, which only uses
+the scalar rules, does not pay for them at startup.
+"""
+from datetime import datetime
+from itertools import repeat
+
+from interactions import medication_considerations
+from knowledge_base import current as current_knowledge_base
+from metrics import timed
+
+MMRC_SCALE = {
+    "No breathlessness except with strenuous exercise": 0,
+    "Breathless when hurrying or walking up a slight hill": 1,
+    "Walks slower than people of same age due to breathlessness or has to stop for breath when walking at own pace": 2,
+    "Stops for breath after walking about 100 meters or after a few minutes": 3,
+    "Too breathless to leave house or breathless when dressing": 4
+}
+
+CAT_ITEMS = ["cough", "phlegm", "chest_tight", "breathless",
+             "activities", "confidence", "sleep", "energy"]
+
+# (stage, severity, lower FEV1 % bound), mildest first
+SPIROMETRY_STAGES = [
+    ("GOLD 1", "Mild", 80),
+    ("GOLD 2", "Moderate", 50),
+    ("GOLD 3", "Severe", 30),
+    ("GOLD 4", "Very Severe", None)
+]
+
+# Post-bronchodilator FEV1/FVC below this confirms airflow obstruction
+OBSTRUCTION_RATIO = 0.70
+
+
+@timed("calculate_mMRC_score")
+def calculate_mMRC_score(dyspnea_level):
+    """Calculate mMRC dyspnea scale score"""
+    return MMRC_SCALE.get(dyspnea_level, 0)
+
+
+@timed("calculate_CAT_score")
+def calculate_CAT_score(responses):
+    """Calculate COPD Assessment Test (CAT) score"""
+    return sum(responses.values())
+
+
+@timed("calculate_fev1_percent")
+def calculate_fev1_percent(fev1_actual, fev1_predicted):
+    """FEV1 as % predicted, or None when no predicted value is available"""
+    if fev1_predicted > 0:
+        return (fev1_actual / fev1_predicted) * 100
+    return None
+
+
+@timed("classify_spirometry")
+def classify_spirometry(fev1_percent):
+    """Classify airflow limitation based on FEV1"""
+    if fev1_percent >= 80:
+        return "GOLD 1", "Mild"
+    elif fev1_percent >= 50:
+        return "GOLD 2", "Moderate"
+    elif fev1_percent >= 30:
+        return "GOLD 3", "Severe"
+    else:
+        return "GOLD 4", "Very Severe"
+
+
+def airflow_obstruction(fev1_fvc):
+    """True if FEV1/FVC confirms airflow obstruction (COPD diagnosis)"""
+    return fev1_fvc < OBSTRUCTION_RATIO
+
+
+@timed("determine_GOLD_group")
+def determine_GOLD_group(mMRC, CAT, exacerbations_count, hospitalization):
+    """Determine GOLD ABE group based on symptoms and exacerbation history"""
+
+    # Group E: High risk (≥1 exacerbation)
+    if exacerbations_count >= 1 or hospitalization:
+        return "E"
+
+    # Group B: More symptomatic, low risk
+    if mMRC >= 2 or CAT >= 10:
+        return "B"
+
+    # Group A: Less symptomatic, low risk
+    return "A"
+
+
+# Batch (vectorized) API
+
+def calculate_mMRC_score_batch(dyspnea_levels):
+    """mMRC scores for a column of dyspnea descriptions (unknown -> 0)"""
+    import numpy as np
+    import pandas as pd
+
+    if isinstance(dyspnea_levels, pd.Series) and dyspnea_levels.dtype != object:
+        # Typed columns (pandas' str dtype): factorize once and score the few
+        # distinct values; code -1 (missing) takes the trailing 0
+        codes, uniques = dyspnea_levels.array.factorize()
+        scores = np.array([MMRC_SCALE.get(level, 0) for level in uniques] + [0], dtype=np.int64)
+        return scores[codes]
+    # Python objects: one dict lookup per row, which hashes these long
+    # strings faster than pandas' hash tables do
+    levels = np.asarray(dyspnea_levels, dtype=object)
+    return np.fromiter(map(MMRC_SCALE.get, levels, repeat(0)), dtype=np.int64, count=len(levels))
+
+
+def calculate_CAT_score_batch(responses):
+    """CAT totals for a table of item responses (one column per CAT item)"""
+    import numpy as np
+    import pandas as pd
+
+    if isinstance(responses, pd.DataFrame):
+        responses = responses[CAT_ITEMS].to_numpy()
+    return np.asarray(responses).sum(axis=1)
+
+
+def calculate_fev1_percent_batch(fev1_actual, fev1_predicted):
+    """FEV1 % predicted per row; NaN where predicted FEV1 is not > 0"""
+    import numpy as np
+
+    actual = np.asarray(fev1_actual, dtype=np.float64)
+    predicted = np.asarray(fev1_predicted, dtype=np.float64)
+    ratio = np.full(actual.shape, np.nan)
+    np.divide(actual, predicted, out=ratio, where=predicted > 0)
+    return ratio * 100
+
+
+def classify_spirometry_batch(fev1_percent):
+    """Vectorized ``classify_spirometry``: returns (stage, severity) arrays"""
+    import numpy as np
+
+    fev1_percent = np.asarray(fev1_percent, dtype=np.float64)
+    conditions = [fev1_percent >= bound
+                  for _, _, bound in SPIROMETRY_STAGES if bound is not None]
+    stage_codes = np.select(conditions, np.arange(len(conditions)),
+                            default=len(SPIROMETRY_STAGES) - 1)
+    stages = np.array([s for s, _, _ in SPIROMETRY_STAGES], dtype=object)
+    severities = np.array([s for _, s, _ in SPIROMETRY_STAGES], dtype=object)
+    return stages[stage_codes], severities[stage_codes]
+
+
+def determine_GOLD_group_batch(mMRC, CAT, exacerbations_count, hospitalization):
+    """Vectorized ``determine_GOLD_group``: returns an array of group letters"""
+    import numpy as np
+
+    high_risk = (np.asarray(exacerbations_count) >= 1) | np.asarray(hospitalization).astype(bool)
+    symptomatic = (np.asarray(mMRC) >= 2) | (np.asarray(CAT) >= 10)
+    groups = np.where(high_risk, "E", np.where(symptomatic, "B", "A"))
+    return groups.astype(object)
+
+
+def assess_batch(patients):
+    """Score and classify a cohort in one pass.
+
+    ``patients`` is a DataFrame with ``mMRC_score``, either ``CAT_score`` or
+    the eight CAT item columns, ``fev1_actual``, ``fev1_predicted``,
+    ``exacerbations`` and ``hospitalization``. Returns a DataFrame on the same
+    index with ``CAT_score``, ``fev1_percent``, ``gold_stage``, ``severity``
+    and ``GOLD_group``. As on the Clinical Assessment page, rows without a
+    positive predicted FEV1 get no GOLD stage (None) and a NaN FEV1 %.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if "CAT_score" in patients:
+        cat_score = patients["CAT_score"].to_numpy()
+    else:
+        cat_score = calculate_CAT_score_batch(patients)
+
+    fev1_percent = calculate_fev1_percent_batch(patients["fev1_actual"],
+                                                patients["fev1_predicted"])
+    gold_stage, severity = classify_spirometry_batch(fev1_percent)
+    measured = ~np.isnan(fev1_percent)
+    gold_stage[~measured] = None
+    severity[~measured] = None
+
+    groups = determine_GOLD_group_batch(patients["mMRC_score"].to_numpy(),
+                                        cat_score,
+                                        patients["exacerbations"].to_numpy(),
+                                        patients["hospitalization"].to_numpy())
+
+    # object dtype keeps None for unstaged rows, matching the scalar path
+    return pd.DataFrame({
+        "CAT_score": cat_score,
+        "fev1_percent": fev1_percent,
+        "gold_stage": pd.Series(gold_stage, index=patients.index, dtype=object),
+        "severity": pd.Series(severity, index=patients.index, dtype=object),
+        "GOLD_group": pd.Series(groups, index=patients.index, dtype=object)
+    }, index=patients.index)
+
+
+# Recommendations and reports
+
+@timed("build_considerations")
+def build_considerations(data, GOLD_group, knowledge_base=None):
+    """Special considerations shown on the Diagnosis & Treatment page.
+
+    Rules and medication names come from ``knowledge_base`` (default: the
+    live one).
+    """
+    if knowledge_base is None:
+        knowledge_base = current_knowledge_base()
+    considerations = knowledge_base.rules.evaluate(dict(data, GOLD_group=GOLD_group))
+
+    # Interactions and duplicated drug classes in the current medication list
+    considerations.extend(medication_considerations(data.get('current_medications'), GOLD_group,
+                                                    knowledge_base.scanner))
+
+    return considerations
+
+
+def build_considerations_batch(patients, groups, knowledge_base=None):
+    """``build_considerations`` for every row of a DataFrame.
+
+    ``groups`` holds each row's GOLD group. Returns one list per row.
+    """
+    if knowledge_base is None:
+        knowledge_base = current_knowledge_base()
+    considerations = knowledge_base.rules.evaluate_texts(patients, GOLD_group=groups)
+    if "current_medications" in patients:
+        for row, (medications, group) in enumerate(zip(patients["current_medications"], groups)):
+            considerations[row].extend(medication_considerations(medications, group,
+                                                                 knowledge_base.scanner))
+    return considerations
+
+
+def recommendation_sections(GOLD_group, considerations, knowledge_base):
+    """The report's ``diagnosis`` and ``recommendations`` sections"""
+    group_info = knowledge_base['groups'][GOLD_group]
+    return {
+        "diagnosis": {
+            "GOLD_group": GOLD_group,
+            "group_description": group_info['name'],
+            "treatment_strategy": group_info['treatment']
+        },
+        "recommendations": {
+            "medications": group_info['medications'],
+            "rescue_therapy": knowledge_base['rescue_therapy'],
+            "special_considerations": considerations
+        }
+    }
+
+
+def build_report(data, GOLD_group, considerations, knowledge_base, assessment_date=None):
+    """Assemble the report structure written by ``save_patient_data``"""
+    return {
+        "assessment_date": (assessment_date or datetime.now()).isoformat(),
+        "knowledge_base_version": knowledge_base.version,
+        "patient_data": data,
+        **recommendation_sections(GOLD_group, considerations, knowledge_base)
+    }
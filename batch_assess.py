@@ -0,0 +1,347 @@
+"""Headless batch assessment of a CSV or XLSX file of patients.
+
+Streams the input in fixed-size chunks, scores each chunk in a process pool
+with the same rules as the Streamlit pages and writes one report per patient
+in the JSON layout produced by ``save_patient_data``. Where
+``fev1_predicted`` is missing and an optional ``height_cm`` column is
+given, predicted FEV1 comes from the reference equations
+(``reference_equations.py``) for the patient's age, sex and height.
+
+Rows with a count or score that is not a whole number in its range are not
+assessed; they go to the ``--rejects`` CSV file with the reason.
+
+Usage:
+    python batch_assess.py patients.csv --output-dir patient_data/batch --rejects rejects.csv
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from assessment import (
+    CAT_ITEMS,
+    assess_batch,
+    build_considerations_batch,
+    build_report,
+    calculate_mMRC_score_batch,
+)
+from knowledge_base import current as current_knowledge_base
+from patient import SCHEMA
+from reference_equations import predicted_batch
+
+# Values used when a column is absent, matching the Streamlit widget defaults
+PATIENT_DEFAULTS = {
+    "patient_id": "",
+    "age": 60,
+    "gender": "Male",
+    "smoking_status": "Current Smoker",
+    "pack_years": 0,
+    "bmi": 25.0,
+    "comorbidities": "",
+    "current_medications": "",
+    "mMRC_score": 0,
+    "exacerbations": 0,
+    "hospitalization": False,
+    "fev1_actual": 2.0,
+    "fev1_predicted": 3.0,
+    "fev1_fvc": 0.65,
+    "eosinophils": 150,
+    "cxr_findings": "",
+    "cxr_notes": "",
+    "other_labs": ""
+}
+
+# Columns typed int in patient.SCHEMA; blank cells make pandas read them as float
+INTEGER_COLUMNS = [name for name in PATIENT_DEFAULTS if SCHEMA.get(name, (None,))[0] is int]
+
+# Whole-number columns checked before scoring -> (min, max)
+INTEGER_BOUNDS = {
+    **{name: SCHEMA[name][1] for name in INTEGER_COLUMNS + ["CAT_score"]},
+    **{item: (0, 5) for item in CAT_ITEMS},
+}
+
+# Rejected rows printed when no --rejects file is given
+MAX_LOGGED_REJECTS = 20
+
+# Multiselect fields arrive as "Asthma; Diabetes" in flat files
+LIST_COLUMNS = ["comorbidities", "cxr_findings"]
+LIST_SEPARATOR = ";"
+
+TRUE_VALUES = {"1", "true", "yes", "y", "t"}
+
+
+def iter_chunks(path, chunk_size):
+    """Yield DataFrames of at most ``chunk_size`` rows from a CSV or XLSX file"""
+    if Path(path).suffix.lower() in (".xlsx", ".xlsm"):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(h).strip() for h in next(rows)]
+            while True:
+                block = list(islice(rows, chunk_size))
+                if not block:
+                    break
+                yield pd.DataFrame(block, columns=header)
+        finally:
+            workbook.close()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, keep_default_na=False,
+                               na_values=[""], dtype={"patient_id": str})
+
+
+def _as_bool(column):
+    if column.dtype == bool:
+        return column
+    return column.map(lambda v: str(v).strip().lower() in TRUE_VALUES)
+
+
+def _split_list(value):
+    if not isinstance(value, str) or not value.strip():
+        return []
+    return [item.strip() for item in value.split(LIST_SEPARATOR) if item.strip()]
+
+
+def _plain(value):
+    """Convert NumPy scalars and NaN into JSON-friendly Python values"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def _whole_numbers(column, name, invalid):
+    """``column`` as numbers; rows that are not a whole number in range go to ``invalid``"""
+    numbers = pd.to_numeric(column, errors="coerce")
+    low, high = INTEGER_BOUNDS[name]
+    given = column.notna().to_numpy()
+    values = numbers.to_numpy(dtype=np.float64)
+    with np.errstate(invalid="ignore"):
+        bad = given & ~((values % 1 == 0) & (values >= low) & (values <= high))
+    for position in np.flatnonzero(bad).tolist():
+        value = _plain(column.iloc[position])
+        invalid.setdefault(position, f"{name}: {value!r} is not a whole number in {low}-{high}")
+    return numbers
+
+
+def normalize_chunk(chunk, rejects=None):
+    """Fill defaults and coerce column types so the chunk can be scored.
+
+    The result is indexed by row position in ``chunk``. Rows whose counts or
+    scores are not whole numbers in range are dropped and, when ``rejects``
+    is a list, appended to it as ``(position, patient_id, reason)``.
+    """
+    chunk = chunk.reset_index(drop=True)
+    chunk.columns = [str(c).strip() for c in chunk.columns]
+
+    invalid = {}
+    for column in INTEGER_BOUNDS:
+        if column in chunk:
+            chunk[column] = _whole_numbers(chunk[column], column, invalid)
+    if invalid:
+        for position, reason in sorted(invalid.items()) if rejects is not None else ():
+            patient_id = chunk["patient_id"].iloc[position] if "patient_id" in chunk else None
+            rejects.append((position, "" if pd.isna(patient_id) else str(patient_id), reason))
+        chunk = chunk.drop(index=list(invalid))
+
+    # mMRC may be given as the scale statement instead of a score
+    if "mMRC_score" not in chunk and "dyspnea" in chunk:
+        chunk["mMRC_score"] = calculate_mMRC_score_batch(chunk["dyspnea"])
+
+    if "fev1_predicted" in chunk:
+        missing_predicted = chunk["fev1_predicted"].isna().to_numpy()
+    else:
+        missing_predicted = np.ones(len(chunk), dtype=bool)
+
+    for column, default in PATIENT_DEFAULTS.items():
+        if column not in chunk:
+            chunk[column] = default
+        else:
+            chunk[column] = chunk[column].fillna(default)
+    chunk[INTEGER_COLUMNS] = chunk[INTEGER_COLUMNS].astype(np.int64)
+
+    # Height is optional; with it, missing predicted FEV1 comes from the
+    # reference equations instead of the default
+    if "height_cm" in chunk:
+        chunk["height_cm"] = pd.to_numeric(chunk["height_cm"], errors="coerce")
+        reference = predicted_batch(chunk["age"], chunk["gender"], chunk["height_cm"])["fev1_predicted"]
+        fill = missing_predicted & ~np.isnan(reference)
+        chunk["fev1_predicted"] = np.where(fill, reference,
+                                           chunk["fev1_predicted"].to_numpy(dtype=np.float64))
+    else:
+        chunk["height_cm"] = np.nan
+
+    # CAT is the score column or, where that is absent or blank, the sum of
+    # the eight items (0 where missing, as the sliders start)
+    if "CAT_score" not in chunk or chunk["CAT_score"].hasnans:
+        for item in CAT_ITEMS:
+            if item not in chunk:
+                chunk[item] = 0
+        chunk[CAT_ITEMS] = chunk[CAT_ITEMS].fillna(0).astype(np.int64)
+    if "CAT_score" in chunk:
+        if chunk["CAT_score"].hasnans:
+            chunk["CAT_score"] = chunk["CAT_score"].fillna(chunk[CAT_ITEMS].sum(axis=1))
+        chunk["CAT_score"] = chunk["CAT_score"].astype(np.int64)
+
+    chunk["hospitalization"] = _as_bool(chunk["hospitalization"])
+    chunk["patient_id"] = chunk["patient_id"].astype(str)
+    for column in LIST_COLUMNS:
+        chunk[column] = chunk[column].map(_split_list)
+    return chunk
+
+
+def _report_filename(patient_id, row_number):
+    safe_id = re.sub(r"[^A-Za-z0-9_-]", "_", patient_id) or "unknown"
+    return f"patient_{safe_id}_{row_number}.json"
+
+
+def chunk_reports(chunk, assessment_date=None):
+    """Score a normalized chunk; yields one report per row, in row order.
+
+    Rows are dated by an ``assessment_date`` column when the chunk has one,
+    otherwise by ``assessment_date`` (default: now).
+    """
+    # One knowledge base for the whole chunk, even if it is reloaded meanwhile
+    knowledge_base = current_knowledge_base()
+    results = assess_batch(chunk)
+    considerations = build_considerations_batch(chunk, results["GOLD_group"], knowledge_base)
+    assessment_date = assessment_date or datetime.now()
+    row_dates = chunk["assessment_date"].tolist() if "assessment_date" in chunk else None
+
+    for offset, (row, result) in enumerate(zip(chunk.to_dict("records"),
+                                               results.to_dict("records"))):
+        data = {
+            "patient_id": row["patient_id"],
+            "age": row["age"],
+            "gender": row["gender"],
+            "smoking_status": row["smoking_status"],
+            "pack_years": row["pack_years"],
+            "bmi": row["bmi"],
+            "height_cm": row["height_cm"],
+            "comorbidities": row["comorbidities"],
+            "current_medications": row["current_medications"],
+            "mMRC_score": row["mMRC_score"],
+            "CAT_score": result["CAT_score"],
+            "exacerbations": row["exacerbations"],
+            "hospitalization": row["hospitalization"],
+            "fev1_percent": result["fev1_percent"],
+            "fev1_fvc": row["fev1_fvc"],
+            "gold_stage": result["gold_stage"],
+            "eosinophils": row["eosinophils"],
+            "cxr_findings": row["cxr_findings"],
+            "cxr_notes": row["cxr_notes"],
+            "other_labs": row["other_labs"]
+        }
+        data = {key: _plain(value) for key, value in data.items()}
+        date = datetime.fromisoformat(str(row_dates[offset])) if row_dates else assessment_date
+        yield build_report(data, result["GOLD_group"], considerations[offset],
+                           knowledge_base, date)
+
+
+def assess_chunk(chunk, first_row, output_dir):
+    """Score one chunk and write a report file per patient.
+
+    Returns (rows assessed, rejects), rejects as ``(row, patient_id, reason)``.
+    """
+    rejects = []
+    chunk = normalize_chunk(chunk, rejects)
+    output_dir = Path(output_dir)
+
+    for position, report_data in zip(chunk.index, chunk_reports(chunk)):
+        patient_id = report_data["patient_data"]["patient_id"]
+        filename = output_dir / _report_filename(patient_id, first_row + position)
+        with open(filename, 'w') as f:
+            json.dump(report_data, f, indent=4)
+
+    return len(chunk), [(first_row + position, patient_id, reason)
+                        for position, patient_id, reason in rejects]
+
+
+def run(input_path, output_dir, chunk_size=10000, workers=None, rejects=None, log=sys.stderr):
+    """Assess every row of ``input_path``; returns (rows, seconds).
+
+    Rejected rows go to the csv writer ``rejects`` when given (else the
+    first ``MAX_LOGGED_REJECTS`` are printed to ``log``).
+    """
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    # Bound memory: never hold more than a couple of chunks per worker
+    max_pending = workers * 2
+
+    start = time.perf_counter()
+    rows_done = 0
+    rejected = 0
+    next_row = 0
+    pending = set()
+
+    def collect(future):
+        nonlocal rows_done, rejected
+        rows, rows_rejected = future.result()
+        rows_done += rows
+        for row in rows_rejected:
+            rejected += 1
+            if rejects is not None:
+                rejects.writerow(row)
+            elif rejected <= MAX_LOGGED_REJECTS:
+                print(f"row {row[0]} ({row[1] or 'no ID'}): {row[2]}", file=log)
+
+    def report_progress():
+        elapsed = time.perf_counter() - start
+        rate = rows_done / elapsed if elapsed > 0 else 0.0
+        print(f"{rows_done} rows in {elapsed:.1f}s ({rate:,.0f} rows/sec), {rejected} rejected",
+              file=log)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for chunk in iter_chunks(input_path, chunk_size):
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future)
+                report_progress()
+            pending.add(pool.submit(assess_chunk, chunk, next_row, output_dir))
+            next_row += len(chunk)
+
+        for future in pending:
+            collect(future)
+    report_progress()
+
+    return rows_done, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch COPD assessment of a CSV/XLSX patient file")
+    parser.add_argument("input", help="CSV or XLSX file, one patient per row")
+    parser.add_argument("--output-dir", default="patient_data/batch",
+                        help="directory for per-patient report JSON files")
+    parser.add_argument("--chunk-size", type=int, default=10000,
+                        help="rows per chunk handed to a worker")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument("--rejects", help="write rejected rows and reasons to this CSV file")
+    args = parser.parse_args(argv)
+
+    rejects_file = open(args.rejects, "w", newline="") if args.rejects else None
+    try:
+        rejects = csv.writer(rejects_file) if rejects_file else None
+        if rejects:
+            rejects.writerow(["row", "patient_id", "error"])
+        run(args.input, args.output_dir, args.chunk_size, args.workers, rejects)
+    finally:
+        if rejects_file:
+            rejects_file.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Throughput of the HTTP assessment API (``api.py``) on this machine.
+
+Starts ``api.py`` on a free local port and, for each client count N, runs N
+client processes that each send ``--requests`` requests over one kept-alive
+connection (or a new connection per request with ``--no-keep-alive``).
+Request bodies are synthetic patients (``synthetic_cohort.py``) in the raw
+input form: mMRC statement, CAT items and FEV1 litres. With ``--batch-size``
+above 1 the clients post to ``/assess/batch`` instead of ``/assess``.
+
+Per level it reports requests and assessments per second and p50/p95/p99
+request latency:
+
+    python benchmarks/api_throughput.py
+    python benchmarks/api_throughput.py --clients 1,8,32 --threads 32 --processes 4
+    python benchmarks/api_throughput.py --batch-size 100 --json api_curve.json
+"""
+import argparse
+import http.client
+import json
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE))
+sys.path.insert(0, str(HERE.parent))
+
+from load_test import percentile  # noqa: E402
+
+REPO_ROOT = HERE.parent
+DEFAULT_CLIENTS = (1, 2, 4, 8, 16)
+
+CURVE_FIELDS = ("clients", "requests", "assessments", "errors", "seconds", "requests_per_sec",
+                "assessments_per_sec", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+
+
+def payloads(count, seed=0):
+    """API request bodies for ``count`` synthetic patients"""
+    import numpy as np
+
+    from assessment import MMRC_SCALE
+    from synthetic_cohort import generate
+
+    statements = {score: statement for statement, score in MMRC_SCALE.items()}
+    frame = generate(count, np.random.default_rng(seed)).drop(columns=["assessment_date"])
+    bodies = []
+    for row in frame.to_dict("records"):
+        row = {key: value.item() if isinstance(value, np.generic) else value
+               for key, value in row.items()}
+        row["dyspnea"] = statements[row.pop("mMRC_score")]
+        for column in ("comorbidities", "cxr_findings"):
+            row[column] = [item for item in row[column].split("; ") if item]
+        bodies.append(row)
+    return bodies
+
+
+class ApiServer:
+    """``api.py`` in a subprocess, for use as a context manager"""
+
+    def __init__(self, threads, processes):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.args = ["--threads", str(threads), "--processes", str(processes)]
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "api.py", "--port", str(self.port)] + self.args,
+            cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{self.port}/health", timeout=1)
+                return self
+            except OSError:
+                time.sleep(0.1)
+        self.__exit__(None, None, None)
+        raise RuntimeError("API server did not start")
+
+    def __exit__(self, *exc):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait(timeout=30)
+
+
+def client(port, bodies, requests, batch_size, keep_alive):
+    """Send ``requests`` requests; returns (latencies in seconds, errors)"""
+    path = "/assess" if batch_size == 1 else "/assess/batch"
+    encoded = []
+    for i in range(0, len(bodies), batch_size):
+        chunk = bodies[i:i + batch_size]
+        body = chunk[0] if batch_size == 1 else {"assessments": chunk}
+        encoded.append(json.dumps(body).encode("utf-8"))
+    headers = {"Content-Type": "application/json"}
+    if not keep_alive:
+        headers["Connection"] = "close"
+
+    latencies, errors = [], 0
+    connection = None
+    for i in range(requests):
+        if connection is None:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        start = time.perf_counter()
+        connection.request("POST", path, encoded[i % len(encoded)], headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        errors += response.status != 200
+        if not keep_alive:
+            connection.close()
+            connection = None
+    if connection is not None:
+        connection.close()
+    return latencies, errors
+
+
+def measure(levels, requests, batch_size, threads, processes, keep_alive, log=sys.stderr):
+    """Throughput curve: one dict (CURVE_FIELDS) per client count"""
+    bodies = payloads(max(batch_size * 64, 1024))
+    curve = []
+    with ApiServer(threads, processes) as server:
+        # Warm-up so imports and the recommendation cache are not counted
+        client(server.port, bodies, 50, batch_size, keep_alive)
+        for clients in levels:
+            with ProcessPoolExecutor(clients) as pool:
+                start = time.perf_counter()
+                futures = [pool.submit(client, server.port, bodies[i::clients] or bodies,
+                                       requests, batch_size, keep_alive) for i in range(clients)]
+                results = [future.result() for future in futures]
+                seconds = time.perf_counter() - start
+
+            latencies = sorted(ms * 1000 for run, _ in results for ms in run)
+            total = len(latencies)
+            point = {
+                "clients": clients,
+                "requests": total,
+                "assessments": total * batch_size,
+                "errors": sum(errors for _, errors in results),
+                "seconds": round(seconds, 3),
+                "requests_per_sec": round(total / seconds, 1),
+                "assessments_per_sec": round(total * batch_size / seconds, 1),
+                "p50_ms": round(percentile(latencies, 50), 2),
+                "p95_ms": round(percentile(latencies, 95), 2),
+                "p99_ms": round(percentile(latencies, 99), 2),
+                "max_ms": round(latencies[-1], 2),
+            }
+            curve.append(point)
+            print(f"{clients:>4} clients  {point['requests_per_sec']:8.1f} req/s  "
+                  f"{point['assessments_per_sec']:9.1f} assessments/s  "
+                  f"p50 {point['p50_ms']:6.2f} ms  p95 {point['p95_ms']:6.2f} ms  "
+                  f"p99 {point['p99_ms']:6.2f} ms  errors {point['errors']}", file=log)
+    return curve
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", default=",".join(map(str, DEFAULT_CLIENTS)),
+                        help="comma-separated concurrent client counts")
+    parser.add_argument("--requests", type=int, default=500, help="requests per client per level")
+    parser.add_argument("--batch-size", type=int, default=1, help="assessments per request")
+    parser.add_argument("--threads", type=int, default=16, help="API worker threads per process")
+    parser.add_argument("--processes", type=int, default=1, help="API worker processes")
+    parser.add_argument("--no-keep-alive", dest="keep_alive", action="store_false",
+                        help="open a new connection for every request")
+    parser.add_argument("--json", help="write the curve as JSON")
+    args = parser.parse_args(argv)
+
+    levels = [int(level) for level in args.clients.split(",")]
+    if max(levels) > args.threads * args.processes:
+        print(f"note: more clients than {args.threads * args.processes} API workers; "
+              "extra kept-alive connections wait for a free worker", file=sys.stderr)
+    curve = measure(levels, args.requests, args.batch_size, args.threads, args.processes,
+                    args.keep_alive)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"batch_size": args.batch_size, "threads": args.threads,
+                       "processes": args.processes, "keep_alive": args.keep_alive,
+                       "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "curve": curve}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
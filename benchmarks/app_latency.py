@@ -0,0 +1,108 @@
+"""Startup and rerun latency budget for the Streamlit app.
+
+Runs ``app.py`` headless through Streamlit's ``AppTest`` and checks:
+
+* startup: first script run in a fresh interpreter (imports of the app's own
+  modules included, Streamlit itself excluded)
+* rerun: median rerun time of each navigation page
+
+Exits non-zero when a measurement exceeds its budget, so it can gate a
+deploy. Usage:
+
+    python benchmarks/app_latency.py [--reruns 20] [--json results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+APP = Path(__file__).resolve().parent.parent / "app.py"
+
+# Milliseconds, roughly 2-4x the timings on a developer laptop (startup was
+# ~960 ms and reruns ~65-75 ms before the per-page restructure).
+BUDGETS_MS = {
+    "startup": 800,
+    "rerun:Patient Information": 50,
+    "rerun:Clinical Assessment": 80,
+    "rerun:Diagnosis & Treatment": 50,
+    "rerun:Knowledge Base": 80,
+    "rerun:Cohort Analytics": 50,
+    "rerun:Report Search": 50,
+}
+
+
+def _app_test():
+    from streamlit.testing.v1 import AppTest
+
+    return AppTest.from_file(str(APP), default_timeout=30)
+
+
+def measure_startup():
+    """First run of the app in this (fresh) interpreter, in ms"""
+    at = _app_test()
+    start = time.perf_counter()
+    at.run()
+    elapsed = (time.perf_counter() - start) * 1000
+    if at.exception:
+        raise RuntimeError(at.exception)
+    return elapsed
+
+
+def measure_reruns(reruns):
+    """Median rerun time per page, in ms"""
+    at = _app_test().run()
+    results = {}
+    for page in at.sidebar.radio[0].options:
+        at.sidebar.radio[0].set_value(page).run()
+        timings = []
+        for _ in range(reruns):
+            start = time.perf_counter()
+            at.run()
+            timings.append((time.perf_counter() - start) * 1000)
+        if at.exception:
+            raise RuntimeError(f"{page}: {at.exception}")
+        results[f"rerun:{page}"] = statistics.median(timings)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reruns", type=int, default=20, help="reruns timed per page")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--startup-only", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    # Keep benchmark saves away from real patient data
+    os.environ.setdefault("COPD_REPORT_STORE", f"sqlite:///{tempfile.mkdtemp()}/reports.db")
+
+    if args.startup_only:
+        import streamlit.testing.v1  # noqa: F401  (not part of the app's startup)
+        print(measure_startup())
+        return 0
+
+    # Startup is measured in a child so nothing is already imported or cached
+    child = subprocess.run([sys.executable, __file__, "--startup-only"],
+                           capture_output=True, text=True, check=True)
+    results = {"startup": float(child.stdout.strip().splitlines()[-1])}
+    results.update(measure_reruns(args.reruns))
+
+    failed = False
+    for name, value in results.items():
+        budget = BUDGETS_MS.get(name)
+        status = "ok" if budget is None or value <= budget else "OVER BUDGET"
+        failed |= status != "ok"
+        print(f"{name:32s} {value:8.1f} ms  (budget {budget} ms)  {status}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"results_ms": results, "budgets_ms": BUDGETS_MS}, f, indent=4)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
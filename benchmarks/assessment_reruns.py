@@ -0,0 +1,95 @@
+"""Count script runs for one completed clinical assessment.
+
+Drives a real ``streamlit run app.py`` server through a scripted assessment
+(mMRC, eight CAT sliders, exacerbations, spirometry, eosinophils, Complete
+Assessment) and reports how many full-script and fragment-only runs it took
+and how much server time they used.
+
+    python benchmarks/assessment_reruns.py
+    python benchmarks/assessment_reruns.py --app-dir /path/to/other/checkout
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from streamlit_client import REPO_ROOT, Session, StreamlitServer  # noqa: E402
+
+CAT_SLIDERS = ("Cough frequency", "Phlegm in chest", "Chest tightness",
+               "Breathlessness going up hills/stairs", "Limited doing activities at home",
+               "Confidence leaving home", "Sleep quality", "Energy level")
+
+# (widget label, value) in the order a clinician fills in the page
+ASSESSMENT_STEPS = (
+    [("Select Section:", "Clinical Assessment"),
+     ("Select the statement that best describes breathlessness:",
+      "Walks slower than people of same age due to breathlessness or has to stop for breath when walking at own pace")]
+    + [(label, value) for label, value in zip(CAT_SLIDERS, (3, 2, 2, 4, 2, 1, 2, 3))]
+    + [("Number of exacerbations in past year requiring antibiotics/steroids:", 2),
+       ("FEV1 (Liters)", 1.4),
+       ("FEV1 Predicted (Liters)", 3.1),
+       ("FEV1/FVC Ratio", 0.58),
+       ("Blood Eosinophils (cells/μL)", 320),
+       ("Complete Assessment", True)]
+)
+
+
+async def complete_assessment(session):
+    for label, value in ASSESSMENT_STEPS:
+        await session.set(label, value)
+    if not any("assessment completed" in text for text in session.texts):
+        raise RuntimeError("assessment did not complete")
+
+
+def measure(app_dir, assessments):
+    """Run ``assessments`` sequential assessments; returns per-assessment stats"""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {"COPD_REPORT_STORE": f"sqlite:///{tmp}/reports.db"}
+        with StreamlitServer(app_dir, env=env) as server:
+            async def run_all():
+                results = []
+                for _ in range(assessments):
+                    session = await Session(server.url).connect()
+                    start = len(session.runs)
+                    await complete_assessment(session)
+                    runs = session.runs[start:]
+                    await session.close()
+                    results.append({
+                        "full_runs": sum(not r.fragment for r in runs),
+                        "fragment_runs": sum(r.fragment for r in runs),
+                        "server_ms": sum(r.seconds for r in runs) * 1000,
+                    })
+                return results
+            return asyncio.run(run_all())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app-dir", default=str(REPO_ROOT), help="checkout containing app.py")
+    parser.add_argument("--assessments", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = measure(args.app_dir, args.assessments)
+    summary = {
+        "widget_changes": len(ASSESSMENT_STEPS),
+        "full_runs": results[0]["full_runs"],
+        "fragment_runs": results[0]["fragment_runs"],
+        "median_ms_per_assessment": round(statistics.median(r["server_ms"] for r in results), 1),
+    }
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"{summary['widget_changes']} widget changes per assessment")
+        print(f"  full script runs:   {summary['full_runs']}")
+        print(f"  fragment runs:      {summary['fragment_runs']}")
+        print(f"  round-trip time:    {summary['median_ms_per_assessment']} ms (median)")
+
+
+if __name__ == "__main__":
+    main()
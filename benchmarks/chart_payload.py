@@ -0,0 +1,103 @@
+"""Build time and browser payload of the app's charts for a large cohort.
+
+Feeds ``charts`` the data a cohort of ``--assessments`` assessments would
+produce and measures, for each chart, the server time to build the figure
+and serialize it as ``st.plotly_chart`` does (validate, then JSON), and the
+size of that JSON:
+
+* density: FEV1 % vs CAT by GOLD group, from ``CohortDensity``-style bins
+* trend:   one series of ``--assessments`` points, downsampled by LTTB
+
+Exits non-zero when a measurement exceeds its budget. Usage:
+
+    python benchmarks/chart_payload.py [--assessments 1000000] [--json results.json]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Payload must not grow with the cohort; build times are ~3x a laptop's
+BUDGETS = {
+    "density:build_ms": 300,
+    "density:payload_kb": 1024,
+    "trend:build_ms": 300,
+    "trend:payload_kb": 256,
+}
+
+
+def density_bins(assessments, rng):
+    """{group: [(CAT, FEV1 bin, count)]} for a synthetic cohort, binned as CohortDensity does"""
+    import numpy as np
+
+    from analytics import FEV1_BIN_WIDTH, FEV1_MAX, GROUPS
+
+    group = rng.choice(len(GROUPS), assessments, p=[0.4, 0.35, 0.25])
+    cat = np.clip(rng.normal(12 + 6 * group, 7), 0, 40).astype(np.int64)
+    fev1 = np.clip(rng.normal(70 - 12 * group, 18), 0, FEV1_MAX - FEV1_BIN_WIDTH)
+    fev1_bin = (fev1 // FEV1_BIN_WIDTH * FEV1_BIN_WIDTH).astype(np.int64)
+    keys, counts = np.unique(np.column_stack([group, cat, fev1_bin]), axis=0, return_counts=True)
+    bins = {}
+    for (g, c, f), n in zip(keys.tolist(), counts.tolist()):
+        bins.setdefault(GROUPS[g], []).append((c, f, n))
+    return bins
+
+
+def trend_series(assessments, rng):
+    """A ``Trajectories.series``-style FEV1 series of ``assessments`` daily points"""
+    import numpy as np
+
+    dates = (np.datetime64("2000-01-01T00:00:00") + np.arange(assessments) * np.timedelta64(1, "D"))
+    values = 80 + np.cumsum(rng.normal(0, 0.5, assessments))
+    return {"fev1_percent": (dates.astype(str).tolist(), values.tolist())}
+
+
+def measure(build, data):
+    """(build + serialize ms, payload KB) as st.plotly_chart would send it"""
+    import plotly.io
+    import plotly.tools
+
+    start = time.perf_counter()
+    figure = plotly.tools.return_figure_from_figure_or_data(build(data), validate_figure=True)
+    payload = plotly.io.to_json(figure, validate=False)
+    return (time.perf_counter() - start) * 1000, len(payload.encode()) / 1024
+
+
+def main(argv=None):
+    import numpy as np
+
+    from charts import cohort_density_figure, trend_figure
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--assessments", type=int, default=1_000_000)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    charts = {"density": (cohort_density_figure, density_bins(args.assessments, rng)),
+              "trend": (trend_figure, trend_series(args.assessments, rng))}
+    # First build imports plotly; time the second
+    results = {}
+    for name, (build, data) in charts.items():
+        measure(build, data)
+        results[f"{name}:build_ms"], results[f"{name}:payload_kb"] = measure(build, data)
+
+    failed = False
+    for name, value in results.items():
+        budget = BUDGETS.get(name)
+        status = "ok" if budget is None or value <= budget else "OVER BUDGET"
+        failed |= status != "ok"
+        print(f"{name:24s} {value:10.1f}  (budget {budget})  {status}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"assessments": args.assessments, "results": results, "budgets": BUDGETS},
+                      f, indent=4)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
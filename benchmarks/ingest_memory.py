@@ -0,0 +1,116 @@
+"""Peak memory of reading spirometer exports, by file layout.
+
+Writes exports of ``--records`` tests in each layout and reads every record
+through ``spirometry_ingest.read_records``, checking that all records (and,
+resumed halfway, the second half) come back and that the tracemalloc peak
+stays within budget whatever the file size:
+
+* csv:    one test per line
+* flat:   XML ``<export><record/>...</export>``
+* nested: XML ``<export><site><tests><record/>...</tests></site>...</export>``
+
+Exits non-zero on a wrong count or a measurement over budget. Usage:
+
+    python benchmarks/ingest_memory.py [--records 200000] [--json results.json]
+"""
+import argparse
+import json
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Peak MB while reading; parsed records are dropped, so this does not grow
+# with --records
+BUDGET_MB = 2.0
+
+SITES = 4
+
+
+def _fields(i):
+    return {"MRN": f"MRN-{i:07d}", "Test Date": "2026-03-01", "FEV1": "1.85", "FVC": "2.90"}
+
+
+def write_csv(path, records):
+    with open(path, "w") as f:
+        f.write(",".join(_fields(0)) + "\n")
+        for i in range(records):
+            f.write(",".join(_fields(i).values()) + "\n")
+
+
+def _xml_record(i):
+    fields = _fields(i)
+    mrn = fields.pop("MRN")
+    leaves = "".join(f"<{name.replace(' ', '')}>{value}</{name.replace(' ', '')}>"
+                     for name, value in fields.items())
+    return f'<record MRN="{mrn}">{leaves}</record>\n'
+
+
+def write_xml(path, records, nested):
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0"?>\n<export>\n')
+        if not nested:
+            for i in range(records):
+                f.write(_xml_record(i))
+        else:
+            per_site = -(-records // SITES)
+            for site in range(SITES):
+                f.write(f'<site id="{site}"><tests>\n')
+                for i in range(site * per_site, min(records, (site + 1) * per_site)):
+                    f.write(_xml_record(i))
+                f.write("</tests></site>\n")
+        f.write("</export>\n")
+
+
+def measure(path, records):
+    """(peak MB, records read, records read when resumed halfway)"""
+    from spirometry_ingest import read_records
+
+    tracemalloc.start()
+    read = 0
+    halfway = None
+    for position, _ in read_records(path):
+        read += 1
+        if read == records // 2:
+            halfway = position
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    resumed = sum(1 for _ in read_records(path, halfway))
+    return peak, read, resumed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        layouts = {"csv": Path(tmp) / "export.csv", "flat": Path(tmp) / "flat.xml",
+                   "nested": Path(tmp) / "nested.xml"}
+        write_csv(layouts["csv"], args.records)
+        write_xml(layouts["flat"], args.records, nested=False)
+        write_xml(layouts["nested"], args.records, nested=True)
+
+        for name, path in layouts.items():
+            peak, read, resumed = measure(path, args.records)
+            results[name] = {"peak_mb": peak, "records": read, "resumed": resumed}
+            ok = (peak <= BUDGET_MB and read == args.records
+                  and resumed == args.records - args.records // 2)
+            failed |= not ok
+            print(f"{name:8s} peak {peak:6.2f} MB  (budget {BUDGET_MB} MB)  "
+                  f"{read:,} records, {resumed:,} resumed  {'ok' if ok else 'FAILED'}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"records": args.records, "budget_mb": BUDGET_MB, "results": results},
+                      f, indent=4)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
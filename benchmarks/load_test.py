@@ -0,0 +1,158 @@
+"""Concurrent-session load test and scaling curve for one app server.
+
+Starts ``streamlit run app.py`` once and, for each concurrency level N,
+runs N simultaneous sessions through the clinician journey: Patient
+Information (filled in and saved) -> Clinical Assessment (completed) ->
+Diagnosis & Treatment -> Save Assessment Report, waiting for the report
+downloads. Every rerun a session triggers is timed from the widget change
+to the end of the script run, so queueing inside the server shows up as
+latency.
+
+Per level it reports p50/p95/p99 rerun latency, reruns and journeys per
+second, and the server's resident memory growth since startup. The curve can
+be written as JSON and CSV to compare between releases:
+
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --levels 1,4,16,64 --journeys 2 \\
+        --json load_curve.json --csv load_curve.csv
+"""
+import argparse
+import asyncio
+import csv
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from assessment_reruns import ASSESSMENT_STEPS  # noqa: E402
+from streamlit_client import REPO_ROOT, Session, StreamlitServer  # noqa: E402
+
+DEFAULT_LEVELS = (1, 2, 4, 8, 16, 32)
+
+# Seconds between reruns while a report export is pending, like the page's
+# polling fragment, and the most polls before giving up
+EXPORT_POLL_INTERVAL = 0.5
+EXPORT_POLLS = 60
+
+CURVE_FIELDS = ("sessions", "journeys", "reruns", "seconds", "reruns_per_sec",
+                "journeys_per_sec", "p50_ms", "p95_ms", "p99_ms", "max_ms",
+                "rss_mb", "rss_growth_mb")
+
+
+def patient_steps(patient_id):
+    return (
+        ("Select Section:", "Patient Information"),
+        ("Patient ID/MRN", patient_id),
+        ("Age", 67),
+        ("Smoking Status", "Former Smoker"),
+        ("Pack Years (if applicable)", 40),
+        ("Comorbidities", ["Cardiovascular Disease", "Hypertension"]),
+        ("Current Medications", "Spiriva Respimat, metoprolol 50 mg"),
+        ("Save Patient Information", True),
+    )
+
+
+async def journey(session, patient_id):
+    """One full clinician journey in an open session"""
+    for label, value in patient_steps(patient_id) + tuple(ASSESSMENT_STEPS):
+        await session.set(label, value)
+    await session.set("Select Section:", "Diagnosis & Treatment")
+    await session.set("save_report", True)
+    for _ in range(EXPORT_POLLS):
+        if any(widget.key == "download_json" for widget in session.widgets.values()):
+            return
+        await asyncio.sleep(EXPORT_POLL_INTERVAL)
+        await session.rerun()
+    raise RuntimeError(f"report for {patient_id} was not exported")
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[int(rank) - 1]
+
+
+async def run_level(server, sessions, journeys, level):
+    """N concurrent sessions, each running ``journeys`` journeys"""
+    async def one(index):
+        session = await Session(server.url).connect()
+        try:
+            for j in range(journeys):
+                await journey(session, f"LOAD-{level}-{index}-{j}")
+        finally:
+            await session.close()
+        return session.runs
+
+    start = time.perf_counter()
+    runs = await asyncio.gather(*(one(i) for i in range(sessions)))
+    return [run for session_runs in runs for run in session_runs], time.perf_counter() - start
+
+
+def measure(app_dir, levels, journeys, log=sys.stderr):
+    """Scaling curve: one dict (CURVE_FIELDS) per concurrency level"""
+    curve = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {"COPD_REPORT_STORE": f"sqlite:///{tmp}/reports.db"}
+        with StreamlitServer(app_dir, env=env) as server:
+            # Warm-up journey so imports and cached resources are not counted
+            asyncio.run(run_level(server, 1, 1, "warmup"))
+            baseline_rss = server.rss_bytes()
+
+            for sessions in levels:
+                runs, seconds = asyncio.run(run_level(server, sessions, journeys, sessions))
+                latencies = sorted(run.seconds * 1000 for run in runs)
+                rss = server.rss_bytes()
+                point = {
+                    "sessions": sessions,
+                    "journeys": sessions * journeys,
+                    "reruns": len(runs),
+                    "seconds": round(seconds, 3),
+                    "reruns_per_sec": round(len(runs) / seconds, 1),
+                    "journeys_per_sec": round(sessions * journeys / seconds, 2),
+                    "p50_ms": round(percentile(latencies, 50), 1),
+                    "p95_ms": round(percentile(latencies, 95), 1),
+                    "p99_ms": round(percentile(latencies, 99), 1),
+                    "max_ms": round(latencies[-1], 1),
+                    "rss_mb": round(rss / 2**20, 1),
+                    "rss_growth_mb": round((rss - baseline_rss) / 2**20, 1),
+                }
+                curve.append(point)
+                print(f"{sessions:>4} sessions  p50 {point['p50_ms']:7.1f} ms  "
+                      f"p95 {point['p95_ms']:7.1f} ms  p99 {point['p99_ms']:7.1f} ms  "
+                      f"{point['reruns_per_sec']:7.1f} reruns/s  "
+                      f"{point['journeys_per_sec']:5.2f} journeys/s  "
+                      f"RSS +{point['rss_growth_mb']:.1f} MB", file=log)
+    return curve
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app-dir", default=str(REPO_ROOT), help="checkout containing app.py")
+    parser.add_argument("--levels", default=",".join(map(str, DEFAULT_LEVELS)),
+                        help="comma-separated concurrent session counts")
+    parser.add_argument("--journeys", type=int, default=1, help="journeys per session per level")
+    parser.add_argument("--json", help="write the scaling curve as JSON")
+    parser.add_argument("--csv", help="write the scaling curve as CSV")
+    args = parser.parse_args(argv)
+
+    levels = [int(level) for level in args.levels.split(",")]
+    curve = measure(args.app_dir, levels, args.journeys)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"app_dir": args.app_dir, "journeys_per_session": args.journeys,
+                       "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "curve": curve}, f, indent=4)
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CURVE_FIELDS)
+            writer.writeheader()
+            writer.writerows(curve)
+
+
+if __name__ == "__main__":
+    main()
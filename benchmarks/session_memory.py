@@ -0,0 +1,127 @@
+"""Memory held per session for the patient record.
+
+Two measurements:
+
+* record: tracemalloc size of the patient data one session keeps after a
+  completed assessment, as the old free-form dict versus ``PatientRecord``;
+* server: growth in resident memory of a real ``streamlit run app.py``
+  server per connected session, each of which has entered patient
+  information and completed an assessment.
+
+    python benchmarks/session_memory.py
+    python benchmarks/session_memory.py --sessions 100 --app-dir /path/to/other/checkout
+"""
+import argparse
+import asyncio
+import gc
+import json
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from assessment_reruns import ASSESSMENT_STEPS  # noqa: E402
+from streamlit_client import REPO_ROOT, Session, StreamlitServer  # noqa: E402
+
+PATIENT_STEPS = (
+    ("Patient ID/MRN", "MRN-004217"),
+    ("Comorbidities", ["Cardiovascular Disease", "Hypertension"]),
+    ("Current Medications", "Spiriva Respimat, metoprolol 50 mg, atorvastatin"),
+    ("Save Patient Information", True),
+)
+
+PATIENT_INFO = {
+    "patient_id": "MRN-004217", "age": 67, "gender": "Female",
+    "smoking_status": "Former Smoker", "pack_years": 40, "bmi": 23.5,
+    "comorbidities": ["Cardiovascular Disease", "Hypertension"],
+    "current_medications": "Spiriva Respimat, metoprolol 50 mg, atorvastatin",
+}
+
+ASSESSMENT = {
+    "mMRC_score": 2, "CAT_score": 19, "exacerbations": 2, "hospitalization": False,
+    "fev1_percent": 45.16129, "fev1_fvc": 0.58, "gold_stage": "GOLD 3",
+    "eosinophils": 320, "cxr_findings": ["Hyperinflation"], "cxr_notes": "",
+    "other_labs": "",
+}
+
+
+def _allocated(build, count):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = [build() for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    return (after - before) / count
+
+
+def record_bytes(count=10000):
+    """Bytes per session for the old dict and for PatientRecord"""
+    from patient import PatientRecord
+
+    def as_dict():
+        # What the pages used to build: an empty dict grown by two update() calls
+        data = {}
+        data.update(json.loads(json.dumps(PATIENT_INFO)))
+        data.update(json.loads(json.dumps(ASSESSMENT)))
+        return data
+
+    def as_record():
+        record = PatientRecord()
+        record.update(**json.loads(json.dumps(PATIENT_INFO)))
+        record.update(**json.loads(json.dumps(ASSESSMENT)))
+        return record
+
+    return {"dict": _allocated(as_dict, count), "PatientRecord": _allocated(as_record, count)}
+
+
+def server_bytes(app_dir, sessions):
+    """Server RSS growth per connected session after a full assessment"""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {"COPD_REPORT_STORE": f"sqlite:///{tmp}/reports.db"}
+        with StreamlitServer(app_dir, env=env) as server:
+            async def run():
+                # Warm-up session so imports and caches are not counted
+                warm = await Session(server.url).connect()
+                for label, value in PATIENT_STEPS + tuple(ASSESSMENT_STEPS):
+                    await warm.set(label, value)
+                await warm.close()
+                await asyncio.sleep(1)
+                baseline = server.rss_bytes()
+
+                async def one():
+                    session = await Session(server.url).connect()
+                    for label, value in PATIENT_STEPS + tuple(ASSESSMENT_STEPS):
+                        await session.set(label, value)
+                    return session
+
+                open_sessions = await asyncio.gather(*(one() for _ in range(sessions)))
+                await asyncio.sleep(1)
+                grown = server.rss_bytes() - baseline
+                for session in open_sessions:
+                    await session.close()
+                return grown / sessions
+            return asyncio.run(run())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app-dir", default=str(REPO_ROOT), help="checkout containing app.py")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--skip-server", action="store_true", help="only measure the record itself")
+    args = parser.parse_args(argv)
+
+    for kind, size in record_bytes().items():
+        print(f"record  {kind:<14} {size:8.0f} bytes/session")
+    if not args.skip_server:
+        per_session = server_bytes(args.app_dir, args.sessions)
+        print(f"server  RSS growth     {per_session / 1024:8.1f} KiB/session "
+              f"({args.sessions} sessions)")
+
+
+if __name__ == "__main__":
+    main()
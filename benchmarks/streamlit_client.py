@@ -0,0 +1,198 @@
+"""Minimal headless Streamlit client for benchmarks.
+
+Starts ``app.py`` in a local Streamlit server and drives sessions over the
+same websocket protocol the browser uses: every widget change is sent as a
+``rerun_script`` message carrying the widget states, scoped to the widget's
+fragment when it lives in one, exactly as the frontend does. Each completed
+run is recorded as either a full script run or a fragment run.
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+FINISHED_FRAGMENT = ForwardMsg.ScriptFinishedStatus.FINISHED_FRAGMENT_RUN_SUCCESSFULLY
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class StreamlitServer:
+    """``streamlit run app.py`` in a subprocess, for use as a context manager"""
+
+    def __init__(self, app_dir=REPO_ROOT, env=None):
+        self.app_dir = Path(app_dir)
+        self.port = _free_port()
+        self.env = dict(os.environ, **(env or {}))
+        self.process = None
+
+    @property
+    def url(self):
+        return f"ws://127.0.0.1:{self.port}/_stcore/stream"
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", "app.py",
+             "--server.port", str(self.port), "--server.headless", "true",
+             "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"],
+            cwd=self.app_dir, env=self.env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{self.port}/_stcore/health", timeout=1)
+                return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__(None, None, None)
+        raise RuntimeError("Streamlit server did not start")
+
+    def __exit__(self, *exc):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait(timeout=30)
+
+    def rss_bytes(self):
+        """Resident memory of the server process (Linux only; 0 elsewhere)"""
+        try:
+            with open(f"/proc/{self.process.pid}/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            return 0
+
+
+@dataclass
+class Widget:
+    id: str
+    kind: str
+    label: str
+    fragment_id: str
+    options: list = field(default_factory=list)
+
+    @property
+    def key(self):
+        # Widget IDs look like "$$ID-<hash>-<user key or None>"
+        return self.id.rsplit("-", 1)[-1]
+
+
+@dataclass
+class RunRecord:
+    fragment: bool
+    seconds: float
+
+
+class Session:
+    """One browser tab: a websocket connection plus its widget states"""
+
+    def __init__(self, url):
+        self.url = url
+        self.ws = None
+        self.widgets = {}
+        self.states = {}
+        self.runs = []
+        self.texts = []
+
+    async def connect(self):
+        self.ws = await websockets.connect(self.url, subprotocols=["streamlit"],
+                                           max_size=None)
+        await self.rerun()
+        return self
+
+    async def close(self):
+        await self.ws.close()
+
+    def find(self, key_or_label):
+        for widget in self.widgets.values():
+            if key_or_label in (widget.key, widget.label):
+                return widget
+        raise KeyError(key_or_label)
+
+    async def set(self, key_or_label, value):
+        """Change a widget the way a user would and wait for the rerun"""
+        widget = self.find(key_or_label)
+        state = WidgetState(id=widget.id)
+        if widget.kind == "button":
+            state.trigger_value = True
+        elif widget.kind == "checkbox":
+            state.bool_value = bool(value)
+        elif widget.kind == "slider":
+            state.double_array_value.data[:] = [float(value)]
+        elif widget.kind == "number_input":
+            state.double_value = float(value)
+        elif widget.kind == "multiselect":
+            state.string_array_value.data[:] = list(value)
+        else:  # selectbox, radio, text_input, text_area
+            state.string_value = str(value)
+        self.states[widget.id] = state
+        await self.rerun(widget.fragment_id)
+        # Button triggers fire once, like the frontend
+        if widget.kind == "button":
+            self.states.pop(widget.id, None)
+
+    async def rerun(self, fragment_id=""):
+        """Rerun the script (or one fragment) with the current widget states
+        and wait for it to finish, like ``AppTest.run()``"""
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_script_hash = ""
+        message.rerun_script.fragment_id = fragment_id
+        message.rerun_script.widget_states.widgets.extend(self.states.values())
+        start = time.perf_counter()
+        await self.ws.send(message.SerializeToString())
+
+        if not fragment_id:
+            self.widgets = {}
+            self.texts = []
+        while True:
+            msg = ForwardMsg.FromString(await self.ws.recv())
+            kind = msg.WhichOneof("type")
+            if kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                self._record_element(msg.delta)
+            elif kind == "script_finished":
+                if msg.script_finished == ForwardMsg.ScriptFinishedStatus.FINISHED_EARLY_FOR_RERUN:
+                    continue
+                self.runs.append(RunRecord(msg.script_finished == FINISHED_FRAGMENT,
+                                           time.perf_counter() - start))
+                return
+
+    def _record_element(self, delta):
+        element = delta.new_element
+        kind = element.WhichOneof("type")
+        proto = getattr(element, kind)
+        widget_id = getattr(proto, "id", "")
+        if widget_id:
+            self.widgets[widget_id] = Widget(widget_id, kind, getattr(proto, "label", ""),
+                                             delta.fragment_id, list(getattr(proto, "options", [])))
+        elif kind in ("markdown", "alert"):
+            self.texts.append(getattr(proto, "body", ""))
+
+
+def run_sessions(server, scenario, sessions=1):
+    """Run ``scenario(session)`` in ``sessions`` concurrent sessions"""
+    async def one():
+        session = await Session(server.url).connect()
+        try:
+            await scenario(session)
+        finally:
+            await session.close()
+        return session
+
+    async def all_sessions():
+        return await asyncio.gather(*(one() for _ in range(sessions)))
+
+    return asyncio.run(all_sessions())
@@ -0,0 +1,318 @@
+"""Benchmark suite with regression check against a stored baseline.
+
+Groups (all run by default):
+
+* scalar:  ``classify_spirometry``, ``determine_GOLD_group``,
+           ``calculate_CAT_score`` and ``calculate_mMRC_score`` called once
+           per patient, at each cohort size (1e3-1e7)
+* batch:   the vectorized ``*_batch`` versions at the same sizes
+* pages:   median full-page rerun time of every page through ``AppTest``
+* storage: ``save_patient_data`` throughput (background export: store
+           insert, XLSX and PDF) and raw report-store inserts
+
+Results are written as JSON. Every metric is compared to the baseline
+(``benchmarks/baseline.json`` by default) and the run fails if any is slower
+by more than the tolerance, or if there is no baseline to compare with.
+Baselines are machine-specific: the committed one records the machine it was
+taken on in ``meta``, a run on different hardware warns, and CI machines
+should record their own:
+
+    python benchmarks/suite.py --save-baseline
+    python benchmarks/suite.py --output results.json           # compare
+    python benchmarks/suite.py --only scalar,batch --sizes 1e3,1e5
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE))
+sys.path.insert(0, str(HERE.parent))
+
+GROUPS = ("scalar", "batch", "pages", "storage")
+DEFAULT_SIZES = (10**3, 10**4, 10**5, 10**6, 10**7)
+DEFAULT_BASELINE = HERE / "baseline.json"
+DEFAULT_TOLERANCE = 0.25
+
+# Scalar calls cycle through this many distinct inputs, so a 1e7-patient run
+# does not need 1e7 dicts in memory
+POOL_SIZE = 4096
+
+
+def _result(value, unit, higher_is_better=False):
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def _best_of(run, repeats=7, min_seconds=0.05):
+    """Fastest of ``repeats`` timings of ``run``, in seconds per call.
+
+    Quick calls are looped until one timing takes ``min_seconds``, so small
+    cohorts are not dominated by timer noise; slow calls are timed once.
+    """
+    start = time.perf_counter()
+    run()
+    first = time.perf_counter() - start
+    if first >= 1.0:
+        return first
+    loops = max(1, int(min_seconds / first) + 1) if first else 1000
+    timings = []
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for _ in range(loops):
+                run()
+            timings.append((time.perf_counter() - start) / loops)
+    finally:
+        gc.enable()
+    return min(timings)
+
+
+def _label(size):
+    return f"1e{len(str(size)) - 1}" if str(size).strip("0") == "1" else str(size)
+
+
+def _cohort(size, seed=0):
+    import numpy as np
+
+    from assessment import CAT_ITEMS, MMRC_SCALE
+
+    rng = np.random.default_rng(seed)
+    return {
+        "fev1_percent": rng.uniform(15, 110, size),
+        "mMRC": rng.integers(0, 5, size),
+        "CAT": rng.integers(0, 41, size),
+        "exacerbations": rng.poisson(0.7, size),
+        "hospitalization": rng.random(size) < 0.1,
+        "cat_items": rng.integers(0, 6, (size, len(CAT_ITEMS)), dtype=np.int8),
+        "dyspnea": np.array(list(MMRC_SCALE), dtype=object)[rng.integers(0, 5, size)],
+    }
+
+
+def bench_scalar(sizes):
+    """ns per patient for the scalar classification functions"""
+    from assessment import (CAT_ITEMS, calculate_CAT_score, calculate_mMRC_score,
+                            classify_spirometry, determine_GOLD_group)
+
+    pool = _cohort(POOL_SIZE)
+    fev1 = pool["fev1_percent"].tolist()
+    groups_args = list(zip(pool["mMRC"].tolist(), pool["CAT"].tolist(),
+                           pool["exacerbations"].tolist(), pool["hospitalization"].tolist()))
+    responses = [dict(zip(CAT_ITEMS, row)) for row in pool["cat_items"].tolist()]
+    dyspnea = pool["dyspnea"].tolist()
+    mask = POOL_SIZE - 1
+
+    cases = {
+        "classify_spirometry": lambda n: [classify_spirometry(fev1[i & mask]) for i in range(n)],
+        "determine_GOLD_group": lambda n: [determine_GOLD_group(*groups_args[i & mask])
+                                           for i in range(n)],
+        "calculate_CAT_score": lambda n: [calculate_CAT_score(responses[i & mask]) for i in range(n)],
+        "calculate_mMRC_score": lambda n: [calculate_mMRC_score(dyspnea[i & mask]) for i in range(n)],
+    }
+    results = {}
+    for name, run in cases.items():
+        for size in sizes:
+            seconds = _best_of(lambda: run(size))
+            results[f"scalar.{name}.{_label(size)}"] = _result(seconds / size * 1e9, "ns/patient")
+    return results
+
+
+def bench_batch(sizes):
+    """ns per patient for the vectorized classification functions"""
+    from assessment import (calculate_CAT_score_batch, calculate_mMRC_score_batch,
+                            classify_spirometry_batch, determine_GOLD_group_batch)
+
+    results = {}
+    for size in sizes:
+        cohort = _cohort(size)
+        cases = {
+            "classify_spirometry": lambda: classify_spirometry_batch(cohort["fev1_percent"]),
+            "determine_GOLD_group": lambda: determine_GOLD_group_batch(
+                cohort["mMRC"], cohort["CAT"], cohort["exacerbations"], cohort["hospitalization"]),
+            "calculate_CAT_score": lambda: calculate_CAT_score_batch(cohort["cat_items"]),
+            "calculate_mMRC_score": lambda: calculate_mMRC_score_batch(cohort["dyspnea"]),
+        }
+        for name, run in cases.items():
+            seconds = _best_of(run)
+            results[f"batch.{name}.{_label(size)}"] = _result(seconds / size * 1e9, "ns/patient")
+        del cohort
+    return results
+
+
+def bench_pages(reruns):
+    """Median full rerun per page, in ms"""
+    from app_latency import measure_reruns
+
+    return {f"pages.{name.partition(':')[2]}": _result(ms, "ms")
+            for name, ms in measure_reruns(reruns).items()}
+
+
+def _sample_report(i):
+    from assessment import build_considerations, build_report, determine_GOLD_group
+    from knowledge_base import current
+
+    data = {
+        "patient_id": f"BENCH-{i:06d}", "age": 67, "gender": "Female",
+        "smoking_status": "Former Smoker", "pack_years": 40, "bmi": 23.5,
+        "comorbidities": ["Cardiovascular Disease"], "current_medications": "Spiriva, metoprolol",
+        "mMRC_score": 2, "CAT_score": 19, "exacerbations": i % 3, "hospitalization": False,
+        "fev1_percent": 45.2, "fev1_fvc": 0.58, "gold_stage": "GOLD 3", "eosinophils": 320,
+        "cxr_findings": ["Hyperinflation"], "cxr_notes": "", "other_labs": "",
+    }
+    group = determine_GOLD_group(data["mMRC_score"], data["CAT_score"],
+                                 data["exacerbations"], data["hospitalization"])
+    return build_report(data, group, build_considerations(data, group), current())
+
+
+def bench_storage(saves, inserts):
+    """save_patient_data and report-store throughput, in reports/sec"""
+    # Streamlit warns about caches used outside a running app; harmless here
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    import views
+    from storage import open_store
+
+    reports = [_sample_report(i) for i in range(max(saves, inserts))]
+
+    start = time.perf_counter()
+    exports = [views.save_patient_data(report) for report in reports[:saves]]
+    for export in exports:
+        export.result()
+    save_rate = saves / (time.perf_counter() - start)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_store(f"sqlite:///{tmp}/bench.db")
+        start = time.perf_counter()
+        for report in reports[:inserts]:
+            store.save(report)
+        insert_rate = inserts / (time.perf_counter() - start)
+        store.close()
+
+    return {
+        "storage.save_patient_data": _result(save_rate, "reports/s", higher_is_better=True),
+        "storage.store_save": _result(insert_rate, "reports/s", higher_is_better=True),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """(name, current, baseline, change) rows and the names that regressed"""
+    rows, regressions = [], []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None or not base["value"]:
+            rows.append((name, result, None, None))
+            continue
+        change = result["value"] / base["value"] - 1
+        worse = -change if result["higher_is_better"] else change
+        if worse > tolerance:
+            regressions.append(name)
+        rows.append((name, result, base, change))
+    return rows, regressions
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, text=True,
+                              capture_output=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", default=",".join(GROUPS),
+                        help=f"comma-separated groups to run ({', '.join(GROUPS)})")
+    parser.add_argument("--sizes", default=",".join(_label(s) for s in DEFAULT_SIZES),
+                        help="cohort sizes for scalar and batch benchmarks")
+    parser.add_argument("--reruns", type=int, default=20, help="reruns timed per page")
+    parser.add_argument("--saves", type=int, default=200, help="reports saved via save_patient_data")
+    parser.add_argument("--inserts", type=int, default=2000, help="reports inserted into the store")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="baseline JSON to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="write results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown before failing (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    groups = [g.strip() for g in args.only.split(",") if g.strip()]
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown groups: {', '.join(sorted(unknown))}")
+    sizes = [int(float(s)) for s in args.sizes.split(",")]
+
+    # Keep benchmark saves away from real patient data
+    tmp = tempfile.mkdtemp()
+    os.environ["COPD_REPORT_STORE"] = f"sqlite:///{tmp}/reports.db"
+
+    results = {}
+    for group in groups:
+        start = time.perf_counter()
+        if group == "scalar":
+            results.update(bench_scalar(sizes))
+        elif group == "batch":
+            results.update(bench_batch(sizes))
+        elif group == "pages":
+            results.update(bench_pages(args.reruns))
+        else:
+            results.update(bench_storage(args.saves, args.inserts))
+        print(f"[{group}] {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    document = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+    baseline_path = Path(args.baseline)
+    baseline = {}
+    if baseline_path.exists() and not args.save_baseline:
+        with open(baseline_path) as f:
+            recorded = json.load(f)
+        baseline = recorded["results"]
+        for key in ("machine", "cpu_count", "python"):
+            if recorded["meta"].get(key) != document["meta"][key]:
+                print(f"Baseline {key} {recorded['meta'].get(key)} differs from this run's "
+                      f"{document['meta'][key]}; timings may not be comparable", file=sys.stderr)
+    rows, regressions = compare(results, baseline, args.tolerance)
+
+    for name, result, base, change in rows:
+        line = f"{name:44s} {result['value']:12.2f} {result['unit']:<11}"
+        if base is not None:
+            flag = "  REGRESSION" if name in regressions else ""
+            line += f" baseline {base['value']:12.2f} ({change:+.0%}){flag}"
+        print(line)
+
+    document["regressions"] = regressions
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=4)
+    if args.save_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump(document, f, indent=4)
+        print(f"Baseline saved to {baseline_path}", file=sys.stderr)
+    elif not baseline:
+        print(f"No baseline at {baseline_path}; run with --save-baseline to record one",
+              file=sys.stderr)
+        return 2
+
+    if regressions:
+        print(f"{len(regressions)} regressions over {args.tolerance:.0%}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
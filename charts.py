@@ -0,0 +1,124 @@
+"""Plotly figures for the Diagnosis & Treatment and Cohort Analytics pages.
+
+Figures are built as plain dicts (``Figure.to_dict()``), which the pages
+cache per data version with ``st.cache_data`` and pass to
+``st.plotly_chart``. Traces are WebGL (``scattergl``, ``scatterpolargl``)
+and the data behind each chart is bounded however many assessments are
+stored:
+
+* a patient's series longer than ``TREND_POINTS`` is downsampled with
+  Largest-Triangle-Three-Buckets (LTTB), which keeps the peaks and troughs
+  a plain stride would drop;
+* the cohort scatter of FEV1 % predicted against CAT score is drawn from the
+  ``analytics.CohortDensity`` bins, one marker per occupied bin sized by its
+  count, so it never has more than a few thousand markers.
+"""
+from analytics import CAT_MAX, FEV1_BIN_WIDTH, FEV1_MAX, GROUPS
+from trajectory import THRESHOLDS
+
+# Points kept per series on the trend chart
+TREND_POINTS = 500
+
+GROUP_COLORS = {"A": "#2ca02c", "B": "#ff7f0e", "E": "#d62728"}
+
+# Largest density marker, in pixels
+MAX_MARKER_SIZE = 18
+
+# GOLD cut-offs drawn as guides on the cohort scatter
+HIGH_SYMPTOM_CAT = 10
+GOLD_FEV1_CUTS = (80, 50, 30)
+
+
+def lttb(x, y, threshold):
+    """Indices of the ``threshold`` points LTTB keeps from a series.
+
+    ``x`` must be increasing. The first and last points are always kept;
+    each bucket in between keeps the point forming the largest triangle with
+    the previously kept point and the mean of the next bucket.
+    """
+    import numpy as np
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # threshold - 2 buckets over the interior points, then the last point
+    edges = np.append(np.linspace(1, n - 1, threshold - 1).astype(np.int64), n)
+    sizes = np.diff(edges)
+    mean_x = np.add.reduceat(x, edges[:-1]) / sizes
+    mean_y = np.add.reduceat(y, edges[:-1]) / sizes
+
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - mean_x[i + 1]) * (y[lo:hi] - y[a])
+                      - (x[a] - x[lo:hi]) * (mean_y[i + 1] - y[a]))
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+
+def cat_items_figure(labels, scores):
+    """Radar of the eight CAT item scores (0-5)"""
+    import plotly.graph_objects as go
+
+    figure = go.Figure(go.Scatterpolargl(
+        r=list(scores) + [scores[0]], theta=list(labels) + [labels[0]],
+        fill="toself", line_color="#1f77b4", hovertemplate="%{theta}: %{r}<extra></extra>"))
+    figure.update_layout(polar={"radialaxis": {"range": [0, 5], "dtick": 1}},
+                         showlegend=False, height=380, margin={"t": 30, "b": 30})
+    return figure.to_dict()
+
+
+def trend_figure(series):
+    """One row per metric of a patient's ``Trajectories.series``, sharing the date axis"""
+    import numpy as np
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    metrics = [metric for metric in THRESHOLDS if metric in series]
+    figure = make_subplots(rows=len(metrics), cols=1, shared_xaxes=True, vertical_spacing=0.08,
+                           subplot_titles=[THRESHOLDS[metric][0] for metric in metrics])
+    for row, metric in enumerate(metrics, 1):
+        dates, values = series[metric]
+        keep = lttb(np.array(dates, dtype="datetime64[us]").astype(np.int64), values, TREND_POINTS)
+        figure.add_trace(go.Scattergl(
+            x=[dates[i] for i in keep], y=[values[i] for i in keep], mode="lines+markers",
+            name=THRESHOLDS[metric][0], line_color="#1f77b4"), row=row, col=1)
+    figure.update_layout(showlegend=False, height=40 + 200 * len(metrics),
+                         margin={"t": 40, "b": 20})
+    return figure.to_dict()
+
+
+def cohort_density_figure(bins):
+    """FEV1 % predicted against CAT score by GOLD group from ``CohortDensity.bins``"""
+    import numpy as np
+    import plotly.graph_objects as go
+
+    groups = [group for group in GROUPS if group in bins] + sorted(set(bins) - set(GROUPS))
+    largest = max((count for group in groups for _, _, count in bins[group]), default=1)
+    figure = go.Figure()
+    for i, group in enumerate(groups):
+        cat, fev1, count = np.array(bins[group], dtype=np.int32).T
+        # Groups side by side within each CAT score, so shared bins stay visible;
+        # float32/int32 halve the typed arrays sent to the browser
+        offset = (i - (len(groups) - 1) / 2) * 0.25
+        figure.add_trace(go.Scattergl(
+            x=(cat + offset).astype(np.float32), y=(fev1 + FEV1_BIN_WIDTH / 2).astype(np.float32),
+            mode="markers", name=f"Group {group}",
+            marker={"size": (3 + (MAX_MARKER_SIZE - 3) * np.sqrt(count / largest)).astype(np.float32),
+                    "color": GROUP_COLORS.get(group, "#7f7f7f"), "opacity": 0.6},
+            customdata=np.column_stack([cat, fev1, fev1 + FEV1_BIN_WIDTH, count]),
+            hovertemplate=("CAT %{customdata[0]}, FEV1 %{customdata[1]}-%{customdata[2]}%: "
+                           "%{customdata[3]:,} assessments<extra>%{fullData.name}</extra>")))
+    figure.add_vline(x=HIGH_SYMPTOM_CAT - 0.5, line_dash="dot", line_color="#7f7f7f")
+    for cut in GOLD_FEV1_CUTS:
+        figure.add_hline(y=cut, line_dash="dot", line_color="#7f7f7f")
+    figure.update_layout(xaxis={"title": "CAT score", "range": [-1, CAT_MAX + 1]},
+                         yaxis={"title": "FEV1 % predicted", "range": [0, FEV1_MAX]},
+                         height=480, margin={"t": 30}, legend={"orientation": "h"})
+    return figure.to_dict()
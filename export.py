@@ -0,0 +1,288 @@
+"""Report export: JSON, XLSX and PDF files, single or in bulk.
+
+``ReportExporter`` runs exports on a small background thread pool so the
+Streamlit session that asked for one is not blocked on serialization or
+disk I/O. ``submit`` serializes the report to JSON once, saves that text to
+the report store, renders the XLSX and PDF versions and returns a
+``concurrent.futures.Future`` the page polls.
+
+Thousands of saved assessments can be exported to one workbook. Reports are
+streamed from the store and written with openpyxl's write-only mode, so
+memory stays flat however many rows are written:
+
+    python export.py workbook assessments.xlsx --group E --since 2026-01-01
+"""
+import argparse
+import io
+import json
+import re
+import sys
+import textwrap
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from metrics import timed
+
+MIME_TYPES = {
+    "json": "application/json",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pdf": "application/pdf",
+}
+
+FORMATS = tuple(MIME_TYPES)
+
+# (column header, report section, key); None section means top level
+REPORT_COLUMNS = [
+    ("Assessment Date", None, "assessment_date"),
+    ("Patient ID", "patient_data", "patient_id"),
+    ("Age", "patient_data", "age"),
+    ("Gender", "patient_data", "gender"),
+    ("Smoking Status", "patient_data", "smoking_status"),
+    ("Pack Years", "patient_data", "pack_years"),
+    ("BMI", "patient_data", "bmi"),
+    ("Height (cm)", "patient_data", "height_cm"),
+    ("Comorbidities", "patient_data", "comorbidities"),
+    ("Current Medications", "patient_data", "current_medications"),
+    ("mMRC", "patient_data", "mMRC_score"),
+    ("CAT", "patient_data", "CAT_score"),
+    ("Exacerbations", "patient_data", "exacerbations"),
+    ("Hospitalization", "patient_data", "hospitalization"),
+    ("FEV1 % Predicted", "patient_data", "fev1_percent"),
+    ("FEV1/FVC", "patient_data", "fev1_fvc"),
+    ("GOLD Stage", "patient_data", "gold_stage"),
+    ("Eosinophils", "patient_data", "eosinophils"),
+    ("CXR Findings", "patient_data", "cxr_findings"),
+    ("GOLD Group", "diagnosis", "GOLD_group"),
+    ("Treatment Strategy", "diagnosis", "treatment_strategy"),
+    ("Special Considerations", "recommendations", "special_considerations"),
+]
+
+# Characters outside the PDF base fonts' WinAnsi encoding
+PDF_REPLACEMENTS = {"≥": ">=", "≤": "<=", "μ": "u", "✅": "-", "→": "->"}
+
+PDF_PAGE_WIDTH, PDF_PAGE_HEIGHT = 612, 792  # US Letter, points
+PDF_MARGIN = 54
+PDF_WRAP = 100
+
+
+def plain_text(text):
+    """Strip Markdown emphasis from report strings"""
+    return re.sub(r"\*\*(.+?)\*\*", r"\1", str(text))
+
+
+def _cell(value):
+    if isinstance(value, list):
+        return "; ".join(plain_text(v) for v in value)
+    if isinstance(value, str):
+        return plain_text(value)
+    return value
+
+
+def report_row(report):
+    """One flat worksheet row for a report, in REPORT_COLUMNS order"""
+    return [_cell(report.get(key) if section is None else (report.get(section) or {}).get(key))
+            for _, section, key in REPORT_COLUMNS]
+
+
+def file_stem(report):
+    patient_id = (report.get("patient_data") or {}).get("patient_id") or "unknown"
+    return f"COPD_Assessment_{patient_id}_{datetime.now().strftime('%Y%m%d')}"
+
+
+# XLSX
+
+def report_xlsx(report):
+    """Workbook bytes for one report: an assessment sheet and a recommendations sheet"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Assessment")
+    sheet.append(["Field", "Value"])
+    for (header, _, _), value in zip(REPORT_COLUMNS, report_row(report)):
+        sheet.append([header, value])
+
+    sheet = workbook.create_sheet("Recommendations")
+    sheet.append(["Section", "Recommendation"])
+    recommendations = report.get("recommendations") or {}
+    for section, title in (("medications", "Medication"), ("rescue_therapy", "Rescue Therapy"),
+                           ("special_considerations", "Special Consideration")):
+        for item in recommendations.get(section) or []:
+            sheet.append([title, plain_text(item)])
+
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def export_workbook(reports, path):
+    """Write ``(report_id, report)`` pairs to one workbook, streaming; returns rows"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Assessments")
+    sheet.append(["Report ID"] + [header for header, _, _ in REPORT_COLUMNS])
+    rows = 0
+    for report_id, report in reports:
+        sheet.append([report_id] + report_row(report))
+        rows += 1
+    workbook.save(path)
+    return rows
+
+
+# PDF
+
+def _pdf_text(text):
+    for char, replacement in PDF_REPLACEMENTS.items():
+        text = text.replace(char, replacement)
+    text = text.encode("cp1252", errors="ignore").decode("cp1252").strip()
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def report_lines(report):
+    """(font, size, text) lines of the printable report"""
+    patient = report.get("patient_data") or {}
+    diagnosis = report.get("diagnosis") or {}
+    recommendations = report.get("recommendations") or {}
+
+    lines = [("F2", 16, "COPD Assessment Report"),
+             ("F1", 10, f"Assessment date: {report.get('assessment_date', '')}"),
+             ("F1", 10, f"Knowledge base: {report.get('knowledge_base_version') or 'unrecorded'}"),
+             ("F1", 10, "")]
+
+    def section(title, items):
+        lines.append(("F2", 12, title))
+        for item in items:
+            for i, chunk in enumerate(textwrap.wrap(plain_text(item), PDF_WRAP) or [""]):
+                lines.append(("F1", 10, chunk if i == 0 else "    " + chunk))
+        lines.append(("F1", 10, ""))
+
+    section("Patient", [f"{header}: {value}" for (header, section_name, _), value
+                        in zip(REPORT_COLUMNS, report_row(report))
+                        if section_name == "patient_data" and value not in (None, "", [])])
+    section("Diagnosis", [f"GOLD Group {diagnosis.get('GOLD_group', '')}: "
+                          f"{diagnosis.get('group_description', '')}",
+                          f"Treatment strategy: {diagnosis.get('treatment_strategy', '')}",
+                          f"Airflow limitation: {patient.get('gold_stage') or 'Not measured'}"])
+    section("Recommended Medications", [f"{i}. {m}" for i, m in
+                                        enumerate(recommendations.get("medications") or [], 1)])
+    section("Rescue Therapy", [f"- {m}" for m in recommendations.get("rescue_therapy") or []])
+    section("Special Considerations", [f"- {c}" for c in recommendations.get("special_considerations") or []]
+            or ["None"])
+    return lines
+
+
+def render_pdf(lines):
+    """Minimal PDF (Helvetica, US Letter) of (font, size, text) lines"""
+    pages, page, y = [], [], PDF_PAGE_HEIGHT - PDF_MARGIN
+    for font, size, text in lines:
+        leading = size * 1.4
+        if y - leading < PDF_MARGIN and page:
+            pages.append(page)
+            page, y = [], PDF_PAGE_HEIGHT - PDF_MARGIN
+        y -= leading
+        if text:
+            page.append(f"BT /{font} {size} Tf {PDF_MARGIN} {y:.1f} Td ({_pdf_text(text)}) Tj ET")
+    pages.append(page)
+
+    # Objects: 1 catalog, 2 page tree, 3-4 fonts, then (page, content) pairs
+    objects = [None, None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for commands in pages:
+        stream = "\n".join(commands).encode("cp1252")
+        page_number = len(objects) + 1
+        kids.append(f"{page_number} 0 R")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PDF_PAGE_WIDTH} {PDF_PAGE_HEIGHT}] "
+                       f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {page_number + 1} 0 R >>")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects[0] = "<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        body = body.encode("latin-1") if isinstance(body, str) else body
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+              % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def report_pdf(report):
+    return render_pdf(report_lines(report))
+
+
+# Background exports
+
+@timed("export_report")
+def export_report(report, store=None, formats=FORMATS):
+    """Serialize ``report`` once, save it to ``store`` and render ``formats``.
+
+    Returns ``{"reference": store reference or None, "files": {format:
+    (file name, MIME type, bytes)}}``.
+    """
+    text = json.dumps(report, indent=4)
+    reference = store.save(report, text=text) if store is not None else None
+    renderers = {"json": lambda: text.encode("utf-8"), "xlsx": lambda: report_xlsx(report),
+                 "pdf": lambda: report_pdf(report)}
+    stem = file_stem(report)
+    return {
+        "reference": reference,
+        "files": {fmt: (f"{stem}.{fmt}", MIME_TYPES[fmt], renderers[fmt]()) for fmt in formats},
+    }
+
+
+class ReportExporter:
+    """Background pool for report exports, shared by all sessions"""
+
+    def __init__(self, max_workers=2):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers,
+                                        thread_name_prefix="report-export")
+
+    def submit(self, report, store=None, formats=FORMATS):
+        """Start an export; returns a Future of ``export_report``'s result"""
+        return self._pool.submit(export_report, report, store, formats)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+
+def main(argv=None):
+    from storage import open_store
+
+    parser = argparse.ArgumentParser(description="Export saved assessment reports")
+    commands = parser.add_subparsers(dest="command", required=True)
+    workbook = commands.add_parser("workbook", help="export saved reports to one XLSX workbook")
+    workbook.add_argument("output", help="workbook path (.xlsx)")
+    workbook.add_argument("--store", default=None, help="report store URL")
+    workbook.add_argument("--group", default=None, help="only this GOLD group")
+    workbook.add_argument("--since", default=None, help="only assessments on or after this ISO date")
+    workbook.add_argument("--until", default=None, help="only assessments before this ISO date")
+    args = parser.parse_args(argv)
+
+    def selected(reports):
+        for report_id, report in reports:
+            date = report.get("assessment_date") or ""
+            if args.group and (report.get("diagnosis") or {}).get("GOLD_group") != args.group:
+                continue
+            if (args.since and date < args.since) or (args.until and date >= args.until):
+                continue
+            yield report_id, report
+
+    start = time.perf_counter()
+    rows = export_workbook(selected(open_store(args.store).iter_reports()), args.output)
+    elapsed = time.perf_counter() - start
+    print(f"Exported {rows} reports to {args.output} in {elapsed:.1f}s "
+          f"({rows / elapsed if elapsed else 0:,.0f} rows/sec)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""Drug-interaction and duplicate-therapy checks on free-text medication lists.
+
+The "Current Medications" field is free text ("Spiriva daily, metoprolol
+50 mg, Anoro Ellipta"). ``InteractionScanner`` compiles every generic name,
+brand name and inhaled-steroid ingredient from ``medications.json``, plus the
+agents named by (or standing for) each ``drug_interactions`` entry, into one
+Aho-Corasick automaton, so a medication list is scanned in a single pass
+however many names are known.
+
+``medication_considerations`` turns a scan into Special Considerations lines.
+The scanner is part of the knowledge base (``default_scanner``): built once
+per version of the medication file and shared by every Streamlit session and
+batch worker. Stored reports can be audited in
+bulk with:
+
+    python interactions.py audit --output medication_audit.csv
+"""
+import argparse
+import csv
+import re
+import sys
+from collections import deque
+
+from medications import normalize
+
+# Classes whose duplication across two products is flagged
+MAINTENANCE_CLASSES = ("LAMA", "LABA", "ICS")
+
+# Drug classes each GOLD group's initial therapy draws on; interactions are
+# checked against these as well as against what the patient already takes
+GROUP_THERAPY_CLASSES = {
+    "A": ("LAMA", "LABA"),
+    "B": ("LAMA", "LABA"),
+    "E": ("LAMA", "LABA", "ICS"),
+}
+
+# Patients list drugs, not drug classes. Common agents for each interaction
+# entry (keyed by the text before its colon) are matched as well as the
+# entry's own wording.
+INTERACTION_AGENTS = {
+    "Beta-blockers": ("beta-blocker", "beta blocker", "metoprolol", "atenolol", "propranolol",
+                      "carvedilol", "bisoprolol", "nebivolol", "labetalol", "nadolol", "sotalol"),
+    "MAO inhibitors, tricyclic antidepressants": (
+        "mao inhibitor", "maoi", "phenelzine", "tranylcypromine", "isocarboxazid", "selegiline",
+        "tricyclic", "amitriptyline", "nortriptyline", "imipramine", "doxepin", "clomipramine",
+        "desipramine"),
+    "Diuretics": ("diuretic", "furosemide", "bumetanide", "torsemide", "hydrochlorothiazide",
+                  "hctz", "chlorthalidone", "indapamide", "metolazone"),
+    "QT-prolonging drugs": ("amiodarone", "sotalol", "dofetilide", "azithromycin",
+                            "clarithromycin", "levofloxacin", "moxifloxacin", "citalopram",
+                            "escitalopram", "haloperidol", "ondansetron", "methadone"),
+    "Other anticholinergics": ("anticholinergic", "oxybutynin", "tolterodine", "solifenacin",
+                               "darifenacin", "trospium", "hyoscyamine", "benztropine",
+                               "diphenhydramine"),
+    "Drugs that cause urinary retention": ("morphine", "oxycodone", "hydrocodone", "codeine",
+                                           "tramadol", "pseudoephedrine", "amitriptyline"),
+    "Strong CYP3A4 inhibitors (ritonavir, ketoconazole)": (
+        "ritonavir", "cobicistat", "ketoconazole", "itraconazole", "clarithromycin",
+        "paxlovid"),
+    "Live vaccines": ("live vaccine", "mmr vaccine", "varicella vaccine", "yellow fever vaccine",
+                      "zostavax"),
+}
+
+_WORD_CHAR = re.compile(r"\w")
+
+
+class Automaton:
+    """Aho-Corasick automaton over lower-case patterns with payloads"""
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for pattern, payload in patterns:
+            state = 0
+            for char in pattern:
+                nxt = self._goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][char] = nxt
+                state = nxt
+            self._out[state].append((len(pattern), payload))
+
+        # Breadth-first failure links; each state inherits its fallback's outputs
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(char, 0) if state else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def __len__(self):
+        return len(self._goto)
+
+    def find_all(self, text):
+        """(start, end, payload) for every occurrence of every pattern"""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, payload in out[state]:
+                yield end - length, end, payload
+
+
+def _whole_words(text, matches):
+    """Leftmost-longest non-overlapping matches that start and end on word boundaries.
+
+    Patterns shared by several entries (e.g. sotalol) keep every payload.
+    """
+    chosen, span = [], (-1, 0)
+    for start, end, payload in sorted(matches, key=lambda m: (m[0], m[0] - m[1])):
+        if (start, end) != span and start < span[1]:
+            continue
+        if start > 0 and _WORD_CHAR.match(text[start - 1]):
+            continue
+        if end < len(text) and _WORD_CHAR.match(text[end]):
+            continue
+        chosen.append((start, end, payload))
+        span = (start, end)
+    return chosen
+
+
+class InteractionScanner:
+    """Finds COPD products and interacting agents in a medication list"""
+
+    def __init__(self, index):
+        self.index = index
+        patterns = []
+        for product, classes, terms in self._products(index):
+            for term in terms:
+                patterns.append((term, ("product", product, classes)))
+        for drug_class, entries in index.drug_interactions.items():
+            for entry in entries:
+                for term in self._agent_terms(entry):
+                    patterns.append((term, ("agent", drug_class, entry)))
+        self.automaton = Automaton(patterns)
+
+    @staticmethod
+    def _products(index):
+        """(display name, drug classes, search terms) for each known product"""
+        # Brand families ("Spiriva" for Spiriva HandiHaler and Spiriva Respimat)
+        # are matched too when they belong to a single product
+        families = {}
+        for i, record in enumerate(index.records):
+            for brand in record["brand_names"]:
+                families.setdefault(normalize(brand).split()[0], set()).add(i)
+
+        products = []
+        ingredient_classes = {}
+        for i, record in enumerate(index.records):
+            name = record["name"]
+            brands = ", ".join(record["brand_names"])
+            terms = {normalize(alias) for alias in re.split(r"\s*[()]\s*", name) if alias}
+            terms |= {normalize(brand) for brand in record["brand_names"]}
+            terms |= {family for family, owners in families.items() if owners == {i}}
+            # "Tiotropium/Olodaterol" and "tiotropium olodaterol" are the same product
+            for term in list(terms):
+                if "-" in term:
+                    terms |= {term.replace("-", "/"), term.replace("-", " ")}
+            products.append((f"{name} ({brands})" if brands else name, record["drug_classes"], terms))
+            if len(record["drug_classes"]) == 1:
+                for alias in re.split(r"\s*[()]\s*", name):
+                    if alias:
+                        ingredient_classes[normalize(alias)] = record["drug_classes"]
+
+        # Inhaled steroids only appear inside combinations in the database but
+        # are often prescribed alone ("fluticasone"): a combination's one
+        # unknown component takes the one class its known components lack.
+        for record in index.records:
+            components = normalize(record["name"]).split("-")
+            unknown = [c for c in components if c not in ingredient_classes]
+            known = {cls for c in components for cls in ingredient_classes.get(c, ())}
+            remaining = tuple(c for c in record["drug_classes"] if c not in known)
+            if len(components) > 1 and len(unknown) == 1 and len(remaining) == 1:
+                ingredient_classes[unknown[0]] = remaining
+                products.append((unknown[0].capitalize(), remaining, {unknown[0]}))
+        return products
+
+    @staticmethod
+    def _agent_terms(entry):
+        """Trigger terms for one drug_interactions entry"""
+        label = entry.split(":", 1)[0].strip()
+        terms = {normalize(part) for part in re.split(r"[,()]", label) if part.strip()}
+        terms |= set(INTERACTION_AGENTS.get(label, ()))
+        return terms
+
+    def scan(self, text):
+        """Products and interacting agents named in ``text``.
+
+        Returns ``(products, agents)``: ``products`` maps each product's
+        display name to its drug classes, ``agents`` lists ``(matched text,
+        drug class, interaction entry)`` in order of appearance.
+        """
+        text = normalize(text or "")
+        products, agents = {}, []
+        if not text:
+            return products, agents
+        for start, end, (kind, *payload) in _whole_words(text, self.automaton.find_all(text)):
+            if kind == "product":
+                name, classes = payload
+                products[name] = classes
+            else:
+                agents.append((text[start:end], *payload))
+        return products, agents
+
+
+def default_scanner():
+    """Scanner over the live knowledge base's medications, rebuilt with its index"""
+    from knowledge_base import current
+
+    return current().scanner
+
+
+def medication_findings(text, GOLD_group=None, scanner=None):
+    """(kind, detail) findings for a free-text medication list.
+
+    ``kind`` is ``"interaction"`` or ``"duplication"``. Interactions are
+    reported for classes the patient already takes and, when ``GOLD_group``
+    is given, for classes that group's recommended therapy uses.
+    """
+    scanner = scanner or default_scanner()
+    products, agents = scanner.scan(text)
+    findings = []
+
+    classes_in_use = {c for classes in products.values() for c in classes}
+    relevant = classes_in_use | set(GROUP_THERAPY_CLASSES.get(GOLD_group, ()))
+    reported = set()
+    for agent, drug_class, entry in agents:
+        if drug_class in relevant and (drug_class, entry) not in reported:
+            reported.add((drug_class, entry))
+            findings.append(("interaction", f"{drug_class} + {agent}: {entry}"))
+
+    for drug_class in MAINTENANCE_CLASSES:
+        holders = [name for name, classes in products.items() if drug_class in classes]
+        if len(holders) > 1:
+            findings.append(("duplication", f"{drug_class} in {', '.join(holders)}"))
+    if "LAMA" in classes_in_use and "SAMA" in classes_in_use:
+        anticholinergics = [name for name, classes in products.items()
+                            if {"LAMA", "SAMA"} & set(classes)]
+        findings.append(("duplication",
+                         f"LAMA with SAMA ({', '.join(anticholinergics)}): "
+                         "cumulative anticholinergic effects"))
+    return findings
+
+
+def medication_considerations(text, GOLD_group=None, scanner=None):
+    """Special Considerations lines for a free-text medication list"""
+    considerations = []
+    for kind, detail in medication_findings(text, GOLD_group, scanner):
+        if kind == "interaction":
+            considerations.append(f"💊 **Drug Interaction:** {detail}")
+        else:
+            considerations.append(f"💊 **Duplicate Therapy:** {detail}")
+    return considerations
+
+
+def audit_reports(reports, scanner=None):
+    """Findings rows for ``(report_id, report)`` pairs, for pharmacy review"""
+    scanner = scanner or default_scanner()
+    for report_id, report in reports:
+        patient = report.get("patient_data") or {}
+        group = (report.get("diagnosis") or {}).get("GOLD_group")
+        for kind, detail in medication_findings(patient.get("current_medications"), group, scanner):
+            yield {
+                "report_id": report_id,
+                "patient_id": patient.get("patient_id") or "",
+                "assessment_date": report.get("assessment_date") or "",
+                "GOLD_group": group or "",
+                "finding": kind,
+                "detail": detail,
+            }
+
+
+def main(argv=None):
+    from storage import open_store
+
+    parser = argparse.ArgumentParser(description="Medication checks on free-text medication lists")
+    commands = parser.add_subparsers(dest="command", required=True)
+    audit = commands.add_parser("audit", help="scan every stored report and write findings as CSV")
+    audit.add_argument("--store", default=None, help="report store URL")
+    audit.add_argument("--output", default="-", help="CSV file (default: stdout)")
+    scan = commands.add_parser("scan", help="scan one medication list")
+    scan.add_argument("text")
+    scan.add_argument("--group", default=None, help="GOLD group (A, B or E)")
+    args = parser.parse_args(argv)
+
+    if args.command == "scan":
+        for kind, detail in medication_findings(args.text, args.group):
+            print(f"{kind}: {detail}")
+        return
+
+    fields = ["report_id", "patient_id", "assessment_date", "GOLD_group", "finding", "detail"]
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    try:
+        writer = csv.DictWriter(out, fieldnames=fields)
+        writer.writeheader()
+        rows = 0
+        for row in audit_reports(open_store(args.store).iter_reports()):
+            writer.writerow(row)
+            rows += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"{rows} findings", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""Versioned COPD knowledge base, reloaded from its data files while the app runs.
+
+The guideline content lives in JSON files under ``knowledge_base/`` (or the
+directory named by ``COPD_KNOWLEDGE_BASE``), each carrying its own
+``version``:
+
+    guidelines.json       GOLD groups, rescue therapy, spirometry classes
+    considerations.json   special-consideration rules, compiled by rules.RuleSet
+    medications.json      medication database, indexed by medications.py
+
+``current()`` returns one immutable ``KnowledgeBase`` shared by every
+session and batch worker: the guideline content as read-only mappings and
+tuples, the compiled rule set, the medication index and the interaction
+scanner. At most every ``CHECK_INTERVAL`` seconds it stats the files; when
+one has changed, only that file's part is rebuilt, the unchanged parts are
+reused and the shared reference is swapped in one assignment. Readers never
+lock, and a rerun that already holds the previous object finishes with it.
+A file that fails to load is logged and the previous knowledge base stays
+in service.
+
+``KnowledgeBase.version`` (the guidelines version plus a digest of all
+three files) is recorded in every saved report. Check edited files before
+publishing them with:
+
+    python knowledge_base.py [directory]
+"""
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from types import MappingProxyType
+
+import metrics
+from interactions import InteractionScanner
+from medications import MedicationIndex
+from rules import RuleSet
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(os.environ.get("COPD_KNOWLEDGE_BASE") or Path(__file__).with_name("knowledge_base"))
+
+# Seconds between checks of the files for changes
+CHECK_INTERVAL = float(os.environ.get("COPD_KNOWLEDGE_BASE_INTERVAL", "2"))
+
+# Part name -> data file, in the order their digests enter the version
+FILES = {
+    "guidelines": "guidelines.json",
+    "considerations": "considerations.json",
+    "medications": "medications.json",
+}
+
+# Keys the report and pages read from every GOLD group
+GROUPS = ("A", "B", "E")
+GROUP_KEYS = ("name", "criteria", "treatment", "medications")
+
+# What a malformed or unreadable file raises while loading
+LOAD_ERRORS = (OSError, ValueError, KeyError, TypeError, AttributeError)
+
+
+def freeze(value):
+    """Read-only copy of parsed JSON: dicts become mapping proxies, lists tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(v) for key, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def _guidelines(data):
+    groups = data.get("groups") or {}
+    missing = [f"groups.{group}.{key}" for group in GROUPS for key in GROUP_KEYS
+               if key not in groups.get(group, {})]
+    missing += [key for key in ("rescue_therapy", "spirometry_classification") if key not in data]
+    if missing:
+        raise ValueError(f"guidelines are missing {', '.join(missing)}")
+    return freeze(data)
+
+
+def _medications(data):
+    index = MedicationIndex(data)
+    return index, InteractionScanner(index)
+
+
+# Part name -> function building it from the parsed file
+BUILDERS = {
+    "guidelines": _guidelines,
+    "considerations": RuleSet,
+    "medications": _medications,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class Source:
+    """One loaded data file and the part built from it"""
+    path: Path
+    stamp: tuple     # (mtime_ns, size) when read
+    digest: str      # SHA-256 of the contents
+    version: str
+    value: object
+
+
+def _stamp(path):
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def read_source(name, path, previous=None):
+    """Load one data file; ``previous`` is reused if the contents are unchanged"""
+    stamp = _stamp(path)
+    raw = path.read_bytes()
+    digest = hashlib.sha256(raw).hexdigest()
+    if previous is not None and previous.digest == digest:
+        return replace(previous, path=path, stamp=stamp)
+    data = json.loads(raw)
+    if not isinstance(data, dict) or "version" not in data:
+        raise ValueError(f"{path.name} has no version")
+    return Source(path, stamp, digest, str(data["version"]), BUILDERS[name](data))
+
+
+@dataclass(frozen=True, slots=True)
+class KnowledgeBase:
+    """Immutable snapshot of the knowledge-base files.
+
+    Indexing reads the guideline content, so ``knowledge_base['groups']``
+    works as it did on the plain dictionary.
+    """
+    version: str
+    sources: MappingProxyType    # part name -> Source
+    guidelines: MappingProxyType
+    rules: RuleSet
+    medications: MedicationIndex
+    scanner: InteractionScanner
+
+    @classmethod
+    def from_sources(cls, sources):
+        digest = hashlib.sha256("".join(sources[name].digest for name in FILES).encode()).hexdigest()
+        medications, scanner = sources["medications"].value
+        return cls(
+            version=f"{sources['guidelines'].version}-{digest[:12]}",
+            sources=MappingProxyType(dict(sources)),
+            guidelines=sources["guidelines"].value,
+            rules=sources["considerations"].value,
+            medications=medications,
+            scanner=scanner,
+        )
+
+    def __getitem__(self, key):
+        return self.guidelines[key]
+
+    @property
+    def versions(self):
+        """Version of each data file"""
+        return {name: source.version for name, source in self.sources.items()}
+
+
+def load(directory=None, previous=None):
+    """Knowledge base from ``directory`` (default ``DATA_DIR``).
+
+    Parts whose file is unchanged since ``previous`` was loaded are reused;
+    if none changed, ``previous`` itself is returned.
+    """
+    directory = Path(directory or DATA_DIR)
+    sources = {}
+    for name, filename in FILES.items():
+        path = directory / filename
+        old = previous.sources[name] if previous is not None else None
+        if old is not None and old.path == path and old.stamp == _stamp(path):
+            sources[name] = old
+        else:
+            sources[name] = read_source(name, path, old)
+    if previous is not None and all(sources[name] is previous.sources[name] for name in FILES):
+        return previous
+    return KnowledgeBase.from_sources(sources)
+
+
+# The live knowledge base. Replaced, never modified, so reading it needs no lock.
+_current = None
+_checked = 0.0
+_last_error = None
+_reload_lock = threading.Lock()
+
+
+def _count(result):
+    if metrics.ENABLED:
+        metrics.REGISTRY.increment("copd_knowledge_base_reloads_total", (("result", result),))
+
+
+def _reload():
+    """Check the files and swap in a new knowledge base if they changed; lock held"""
+    global _current, _checked, _last_error
+    _checked = time.monotonic()
+    try:
+        knowledge_base = load(previous=_current)
+    except LOAD_ERRORS as e:
+        if _current is None:
+            raise
+        if str(e) != _last_error:
+            _last_error = str(e)
+            logger.warning("Knowledge base not reloaded, keeping %s: %s", _current.version, e)
+            _count("error")
+        return
+    _last_error = None
+    if knowledge_base is not _current:
+        if _current is not None:
+            logger.info("Knowledge base %s replaced by %s", _current.version, knowledge_base.version)
+            _count("reloaded")
+        _current = knowledge_base
+
+
+def current():
+    """The live knowledge base, checked for file changes every ``CHECK_INTERVAL`` seconds"""
+    if _current is None:
+        with _reload_lock:
+            if _current is None:
+                _reload()
+    elif time.monotonic() - _checked >= CHECK_INTERVAL:
+        # One thread checks; the others carry on with the current object
+        if _reload_lock.acquire(blocking=False):
+            try:
+                _reload()
+            finally:
+                _reload_lock.release()
+    return _current
+
+
+def refresh():
+    """Check the files now; returns the live knowledge base"""
+    with _reload_lock:
+        _reload()
+    return _current
+
+
+def main(argv=None):
+    directory = Path(argv[0] if argv else DATA_DIR)
+    try:
+        knowledge_base = load(directory)
+    except LOAD_ERRORS as e:
+        print(f"{directory}: {e}", file=sys.stderr)
+        return 1
+    print(f"Knowledge base {knowledge_base.version}")
+    for name, version in knowledge_base.versions.items():
+        print(f"  {FILES[name]:20s} {version}")
+    print(f"  {len(knowledge_base.rules)} consideration rules, "
+          f"{len(knowledge_base.medications.records)} medications")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
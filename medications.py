@@ -0,0 +1,206 @@
+"""Indexed view of the medication database in ``knowledge_base/medications.json``.
+
+``MedicationIndex`` parses the file once into a flat tuple of read-only
+medication records (frozen with ``knowledge_base.freeze``), with dictionary
+lookups by generic name, brand name, class and device type. Search is served
+from precomputed tables: every prefix of every searchable term maps to its
+ranked matches, and a single-deletion neighbourhood of those prefixes catches
+one-character typos, so answering a query is a handful of dictionary lookups
+regardless of its result size.
+
+    index = MedicationIndex.from_file()
+    index.brand("Spiriva Respimat")["name"]        # 'Tiotropium'
+    [m["name"] for m in index.containing("LAMA")]  # every LAMA-containing product
+    [m["name"] for m in index.search("umec")]      # prefix match
+    [m["name"] for m in index.search("tiotorpium")]  # typo tolerated
+"""
+import json
+import re
+from collections import defaultdict
+from pathlib import Path
+
+DEFAULT_PATH = Path(__file__).with_name("knowledge_base") / "medications.json"
+
+# Pharmacological classes a product can contain
+DRUG_CLASSES = ("LABA", "LAMA", "ICS", "SABA", "SAMA")
+
+# medication_classes keys whose name does not spell out their components
+CLASS_COMPONENTS = {"triple_therapy": ("LAMA", "LABA", "ICS")}
+
+# device_types key -> words that identify it in a medication's device field
+DEVICE_KEYWORDS = {
+    "MDI": ("mdi", "metered dose"),
+    "DPI": ("dpi", "dry powder"),
+    "SMI": ("smi", "soft mist"),
+    "Nebulizer": ("nebulizer",),
+}
+
+# Placeholder brand entries that are not product names
+NOT_A_BRAND = {"available only in combinations"}
+
+# Search ranks, best first
+RANK_NAME, RANK_BRAND, RANK_WORD, RANK_CATEGORY = range(4)
+
+# Shortest query that is also matched with one-character typos
+FUZZY_MIN_LENGTH = 4
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text):
+    """Lower-case and collapse whitespace, the form all index keys use"""
+    return " ".join(str(text).lower().split())
+
+
+def _deletions(term):
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _drug_classes(class_key):
+    if class_key in CLASS_COMPONENTS:
+        return CLASS_COMPONENTS[class_key]
+    return tuple(c for c in class_key.split("_") if c in DRUG_CLASSES)
+
+
+def _devices(device):
+    device = device.lower()
+    return tuple(key for key, words in DEVICE_KEYWORDS.items()
+                 if any(word in device for word in words))
+
+
+class MedicationIndex:
+    """Medication records with name, brand, class, device and search indexes"""
+
+    def __init__(self, data):
+        # Shared by every session, so records and tables are read-only
+        from knowledge_base import freeze
+
+        self.classes = freeze({key: {k: v for k, v in info.items() if k != "medications"}
+                               for key, info in data["medication_classes"].items()})
+        self.device_types = freeze(data.get("device_types", {}))
+        self.drug_interactions = freeze(data.get("drug_interactions", {}))
+        self.special_populations = freeze(data.get("special_populations", {}))
+        self.side_effects = freeze(data.get("side_effects_management", {}))
+
+        records = []
+        for class_key, info in data["medication_classes"].items():
+            for medication in info["medications"]:
+                records.append(freeze(dict(
+                    medication,
+                    brand_names=[b for b in medication.get("brand_names", [])
+                                 if normalize(b) not in NOT_A_BRAND],
+                    medication_class=class_key,
+                    drug_classes=_drug_classes(class_key),
+                    devices=_devices(medication.get("device", "")),
+                )))
+        self.records = tuple(records)
+
+        self._generic = {}
+        self._brand = {}
+        self._by_class = defaultdict(list)
+        self._containing = defaultdict(list)
+        self._by_device = defaultdict(list)
+        for i, record in enumerate(self.records):
+            name = record["name"]
+            self._generic[normalize(name)] = i
+            # "Albuterol (Salbutamol)" is also found as either name alone
+            for alias in re.split(r"\s*[()]\s*", name):
+                if alias:
+                    self._generic.setdefault(normalize(alias), i)
+            for brand in record["brand_names"]:
+                self._brand[normalize(brand)] = i
+            self._by_class[record["medication_class"]].append(i)
+            for drug_class in record["drug_classes"]:
+                self._containing[drug_class].append(i)
+            for device in record["devices"]:
+                self._by_device[device].append(i)
+
+        self._build_search()
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_PATH):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    # Lookups
+
+    def generic(self, name):
+        """Record for a generic (or combination) name, or None"""
+        i = self._generic.get(normalize(name))
+        return None if i is None else self.records[i]
+
+    def brand(self, name):
+        """Record for a brand name, or None"""
+        i = self._brand.get(normalize(name))
+        return None if i is None else self.records[i]
+
+    def by_class(self, class_key):
+        """Records listed under a ``medication_classes`` key, e.g. ``LAMA_LABA_combinations``"""
+        return [self.records[i] for i in self._by_class.get(class_key, ())]
+
+    def containing(self, drug_class):
+        """Records with ``drug_class`` (LABA, LAMA, ICS, SABA, SAMA) as a component"""
+        return [self.records[i] for i in self._containing.get(drug_class, ())]
+
+    def by_device(self, device):
+        """Records available for a ``device_types`` key (MDI, DPI, SMI, Nebulizer)"""
+        return [self.records[i] for i in self._by_device.get(device, ())]
+
+    def interactions(self, drug_class):
+        return list(self.drug_interactions.get(drug_class, ()))
+
+    # Search
+
+    def _search_terms(self, record):
+        """(term, rank) pairs a record can be found by"""
+        yield normalize(record["name"]), RANK_NAME
+        for brand in record["brand_names"]:
+            yield normalize(brand), RANK_BRAND
+        for text in (record["name"], *record["brand_names"]):
+            for word in _WORD.findall(text.lower()):
+                yield word, RANK_WORD
+        for category in record["drug_classes"] + record["devices"]:
+            yield category.lower(), RANK_CATEGORY
+
+    def _build_search(self):
+        prefixes = defaultdict(dict)
+        typos = defaultdict(dict)
+        for i, record in enumerate(self.records):
+            for term, rank in self._search_terms(record):
+                for end in range(1, len(term) + 1):
+                    prefix = term[:end]
+                    if rank < prefixes[prefix].get(i, RANK_CATEGORY + 1):
+                        prefixes[prefix][i] = rank
+                    if rank == RANK_CATEGORY or end < FUZZY_MIN_LENGTH - 1:
+                        continue
+                    for key in _deletions(prefix) | {prefix}:
+                        if rank < typos[key].get(i, RANK_CATEGORY + 1):
+                            typos[key][i] = rank
+
+        def ranked(matches):
+            return tuple(sorted(matches, key=lambda i: (matches[i], i)))
+
+        self._prefixes = {prefix: ranked(matches) for prefix, matches in prefixes.items()}
+        self._typos = {key: ranked(matches) for key, matches in typos.items()}
+
+    def search(self, query, limit=10):
+        """Records matching ``query`` as a prefix, or within one typo if none do"""
+        query = normalize(query)
+        if not query:
+            return []
+        hits = list(self._prefixes.get(query, ()))
+        if not hits and len(query) >= FUZZY_MIN_LENGTH:
+            seen = set()
+            for key in [query] + sorted(_deletions(query)):
+                for i in self._typos.get(key, ()):
+                    if i not in seen:
+                        seen.add(i)
+                        hits.append(i)
+        return [self.records[i] for i in hits[:limit]]
+
+
+def default_index():
+    """Index of the live knowledge base's medications, rebuilt only when the file changes"""
+    from knowledge_base import current
+
+    return current().medications
@@ -0,0 +1,294 @@
+"""Opt-in timing histograms and counters for the app's hot paths.
+
+Instrumentation is off unless one of these environment variables is set
+when the server starts:
+
+    COPD_METRICS_FILE=/var/lib/node_exporter/copd.prom   Prometheus text file
+    COPD_METRICS_PORT=9464                               local /metrics endpoint
+    COPD_PROFILE_DIR=profiles/                           one cProfile dump per rerun
+
+When it is off, ``timed`` returns the decorated function unchanged and
+``rerun`` is an empty context manager, so the app runs exactly the code it
+ran before. When it is on, each timed call costs two ``perf_counter`` calls
+and a histogram update under a lock. Only one rerun at a time is profiled (a
+process can have one active profiler from Python 3.12); reruns that start
+while another is being profiled are timed but not profiled.
+
+Metrics:
+
+    copd_page_render_seconds{page}      full-page render time
+    copd_reruns_total{page}             full reruns
+    copd_session_reruns                 reruns per session (histogram)
+    copd_call_seconds{function}         timed functions (knowledge base load,
+                                        report save, classification rules)
+    copd_knowledge_base_reloads_total{result}   knowledge-base file changes
+                                        (reloaded or error)
+    copd_recommendation_cache_total{event}      Diagnosis & Treatment result
+                                        cache hits, misses, evictions,
+                                        expirations and invalidations
+"""
+import cProfile
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+METRICS_FILE = os.environ.get("COPD_METRICS_FILE")
+METRICS_PORT = os.environ.get("COPD_METRICS_PORT")
+PROFILE_DIR = os.environ.get("COPD_PROFILE_DIR")
+ENABLED = bool(METRICS_FILE or METRICS_PORT or PROFILE_DIR)
+
+# Seconds between rewrites of the metrics file
+FILE_INTERVAL = float(os.environ.get("COPD_METRICS_INTERVAL", "10"))
+
+# Histogram upper bounds: seconds for timings, counts for reruns per session
+SECONDS_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+RERUN_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Sessions remembered for the reruns-per-session histogram
+MAX_SESSIONS = 10000
+
+HELP = {
+    "copd_page_render_seconds": ("histogram", "Time to render one page on a full rerun"),
+    "copd_reruns_total": ("counter", "Full script reruns"),
+    "copd_session_reruns": ("histogram", "Full reruns per session, over recent sessions"),
+    "copd_call_seconds": ("histogram", "Time spent in an instrumented function"),
+    "copd_knowledge_base_reloads_total": ("counter", "Knowledge-base file changes applied or rejected"),
+    "copd_recommendation_cache_total": ("counter", "Recommendation cache lookups and removals by event"),
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Process-wide metrics, safe to update from every session thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._sessions = OrderedDict()
+
+    def histogram(self, name, labels, buckets=SECONDS_BUCKETS):
+        """The histogram for ``name`` and ``labels``, created on first use"""
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = Histogram(buckets)
+            return histogram
+
+    def observe(self, histogram, value):
+        with self._lock:
+            histogram.observe(value)
+
+    def increment(self, name, labels, amount=1):
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0) + amount
+
+    def session_rerun(self, session_id):
+        with self._lock:
+            self._sessions[session_id] = self._sessions.pop(session_id, 0) + 1
+            if len(self._sessions) > MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            histograms = {key: (h.buckets, list(h.counts), h.sum, h.count)
+                          for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+            sessions = list(self._sessions.values())
+
+        per_session = Histogram(RERUN_BUCKETS)
+        for reruns in sessions:
+            per_session.observe(reruns)
+        histograms[("copd_session_reruns", ())] = (
+            RERUN_BUCKETS, per_session.counts, per_session.sum, per_session.count)
+
+        lines, described = [], set()
+        for (name, labels), value in sorted(counters.items()):
+            lines += _describe(name, described)
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+            lines += _describe(name, described)
+            cumulative = 0
+            for bound, n in zip(buckets + ("+Inf",), counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _describe(name, described):
+    if name in described:
+        return []
+    described.add(name)
+    kind, text = HELP.get(name, ("untyped", name))
+    return [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (f'{key}="{_escape(value)}"' for key, value in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REGISTRY = Registry()
+
+
+def timed(function_name):
+    """Decorator recording a function's run time as ``copd_call_seconds``"""
+    def decorate(function):
+        if not ENABLED:
+            return function
+        histogram = REGISTRY.histogram("copd_call_seconds", (("function", function_name),))
+        observe, clock = REGISTRY.observe, time.perf_counter
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                observe(histogram, clock() - start)
+        return wrapper
+    return decorate
+
+
+# Exporters
+
+_started = False
+_start_lock = threading.Lock()
+_write_lock = threading.Lock()
+_last_write = 0.0
+_profile_lock = threading.Lock()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve ``/metrics`` from a daemon thread; returns the server"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def write_file(path=None):
+    """Atomically replace the metrics file (for node_exporter's textfile collector)"""
+    path = Path(path or METRICS_FILE)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    temporary.write_text(REGISTRY.render())
+    os.replace(temporary, path)
+
+
+def _start_exporters():
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+        if METRICS_PORT:
+            serve(int(METRICS_PORT))
+        if PROFILE_DIR:
+            Path(PROFILE_DIR).mkdir(parents=True, exist_ok=True)
+
+
+def _flush_file():
+    global _last_write
+    # One session thread writes; the others skip rather than wait
+    if not _write_lock.acquire(blocking=False):
+        return
+    try:
+        now = time.monotonic()
+        if now - _last_write >= FILE_INTERVAL:
+            _last_write = now
+            write_file()
+    finally:
+        _write_lock.release()
+
+
+def _start_profile():
+    """An enabled profiler, or None while another rerun is being profiled"""
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Another profiler (not ours) is already active in this process
+        _profile_lock.release()
+        return None
+    return profile
+
+
+@contextmanager
+def _instrumented_rerun(page, session_id):
+    _start_exporters()
+    profile = _start_profile() if PROFILE_DIR else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if profile:
+            profile.disable()
+            _profile_lock.release()
+        elapsed = time.perf_counter() - start
+        labels = (("page", page),)
+        REGISTRY.observe(REGISTRY.histogram("copd_page_render_seconds", labels), elapsed)
+        REGISTRY.increment("copd_reruns_total", labels)
+        REGISTRY.session_rerun(session_id)
+        if profile:
+            slug = re.sub(r"\W+", "_", page).strip("_").lower()
+            profile.dump_stats(Path(PROFILE_DIR) / f"{time.time_ns()}-{session_id[:8]}-{slug}.prof")
+        if METRICS_FILE:
+            _flush_file()
+
+
+def rerun(page, session_id):
+    """Context manager around one full rerun's page render"""
+    if not ENABLED:
+        return nullcontext()
+    return _instrumented_rerun(page, session_id)
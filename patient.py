@@ -0,0 +1,161 @@
+"""Typed patient/assessment record kept in each Streamlit session.
+
+``PatientRecord`` is a slotted dataclass with one attribute per field of a
+saved report's ``patient_data`` section, so a session holds a fixed-size
+object instead of a growing dict. Values are checked against ``SCHEMA`` once,
+when a page commits them with ``update``; code reading the record can rely
+on the declared types instead of ``data.get(...)`` fallbacks.
+
+``to_dict`` and ``from_dict`` convert to and from the report JSON layout.
+"""
+import math
+from dataclasses import dataclass, field, fields
+
+# Allowed values, shared with the input widgets
+GENDER_OPTIONS = ("Male", "Female", "Other")
+SMOKING_OPTIONS = ("Current Smoker", "Former Smoker", "Never Smoked")
+COMORBIDITY_OPTIONS = ("Cardiovascular Disease", "Diabetes", "Asthma",
+                       "Hypertension", "Gastroesophageal Reflux", "Osteoporosis")
+CXR_FINDING_OPTIONS = ("Hyperinflation", "Flattened diaphragm", "Bullae",
+                       "Increased retrosternal airspace", "Narrow cardiac silhouette",
+                       "Bronchial wall thickening", "No significant findings")
+GOLD_STAGE_OPTIONS = ("GOLD 1", "GOLD 2", "GOLD 3", "GOLD 4")
+
+# field -> (type, (min, max) or allowed values, may be None); the numeric
+# bounds are the input widgets' bounds, and FEV1 above twice predicted is an
+# entry error
+SCHEMA = {
+    "patient_id": (str, None, False),
+    "age": (int, (18, 120), True),
+    "gender": (str, GENDER_OPTIONS, True),
+    "smoking_status": (str, SMOKING_OPTIONS, True),
+    "pack_years": (int, (0, 200), True),
+    "bmi": (float, (10.0, 50.0), True),
+    "height_cm": (float, (100.0, 250.0), True),
+    "comorbidities": (list, COMORBIDITY_OPTIONS, False),
+    "current_medications": (str, None, False),
+    "mMRC_score": (int, (0, 4), True),
+    "CAT_score": (int, (0, 40), True),
+    "exacerbations": (int, (0, 20), True),
+    "hospitalization": (bool, None, False),
+    "fev1_percent": (float, (0.0, 200.0), True),
+    "fev1_fvc": (float, (0.0, 1.0), True),
+    "gold_stage": (str, GOLD_STAGE_OPTIONS, True),
+    "eosinophils": (int, (0, 2000), True),
+    "cxr_findings": (list, CXR_FINDING_OPTIONS, False),
+    "cxr_notes": (str, None, False),
+    "other_labs": (str, None, False),
+}
+
+
+# JSON types accepted for each field type when validating strictly
+JSON_TYPES = {str: str, int: (int, float), float: (int, float), bool: bool, list: list}
+
+
+def _json_typed(kind, value):
+    # bool is an int subclass, but true is not a number and 1 is not a boolean
+    if isinstance(value, bool) is not (kind is bool) or not isinstance(value, JSON_TYPES[kind]):
+        return False
+    return kind is not list or all(isinstance(item, str) for item in value)
+
+
+def validate(name, value, strict=False):
+    """``value`` coerced to field ``name``'s type; ValueError if it does not fit.
+
+    With ``strict`` (client JSON) nothing is coerced across types: text
+    fields take strings, list fields lists of strings, numbers must be
+    numbers and booleans booleans.
+    """
+    try:
+        kind, constraint, nullable = SCHEMA[name]
+    except KeyError:
+        raise ValueError(f"Unknown patient field: {name}") from None
+    if value is None:
+        if nullable:
+            return None
+        raise ValueError(f"{name} is required")
+    if strict and not _json_typed(kind, value):
+        raise ValueError(f"{name}: {value!r} is not a valid {kind.__name__}")
+
+    try:
+        if kind is list:
+            value = [str(item) for item in value] if not isinstance(value, str) else [value]
+        elif kind is bool:
+            # bool("false") is True; only booleans (or 0/1) say what they mean
+            if isinstance(value, str) or value not in (0, 1):
+                raise ValueError
+            value = bool(value)
+        elif kind is int and isinstance(value, float) and not value.is_integer():
+            raise ValueError
+        else:
+            value = kind(value)
+        # NaN passes every bounds check below by failing all comparisons
+        if kind in (int, float) and not math.isfinite(value):
+            raise ValueError
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"{name}: {value!r} is not a valid {kind.__name__}") from None
+
+    if kind in (int, float) and constraint:
+        low, high = constraint
+        if (low is not None and value < low) or (high is not None and value > high):
+            bounds = f"{low}-{high}" if high is not None else f"≥{low}"
+            raise ValueError(f"{name}: {value} is outside {bounds}")
+    elif constraint:
+        invalid = [v for v in (value if kind is list else [value]) if v not in constraint]
+        if invalid:
+            raise ValueError(f"{name}: {', '.join(map(repr, invalid))} is not one of {', '.join(constraint)}")
+    return value
+
+
+@dataclass(slots=True)
+class PatientRecord:
+    """Patient information and clinical assessment for one session"""
+
+    # Patient Information page
+    patient_id: str = ""
+    age: int | None = None
+    gender: str | None = None
+    smoking_status: str | None = None
+    pack_years: int | None = None
+    bmi: float | None = None
+    height_cm: float | None = None
+    comorbidities: list = field(default_factory=list)
+    current_medications: str = ""
+
+    # Clinical Assessment page
+    mMRC_score: int | None = None
+    CAT_score: int | None = None
+    exacerbations: int | None = None
+    hospitalization: bool = False
+    fev1_percent: float | None = None
+    fev1_fvc: float | None = None
+    gold_stage: str | None = None
+    eosinophils: int | None = None
+    cxr_findings: list = field(default_factory=list)
+    cxr_notes: str = ""
+    other_labs: str = ""
+
+    def update(self, **values):
+        """Validate and commit fields; nothing is changed if any value is invalid"""
+        checked = {name: validate(name, value) for name, value in values.items()}
+        for name, value in checked.items():
+            setattr(self, name, value)
+        return self
+
+    def to_dict(self):
+        """The report's ``patient_data`` section"""
+        data = {name: getattr(self, name) for name in FIELD_NAMES}
+        data["comorbidities"] = list(self.comorbidities)
+        data["cxr_findings"] = list(self.cxr_findings)
+        return data
+
+    @classmethod
+    def from_dict(cls, data, validate_fields=True):
+        """Record from a report's ``patient_data``; unknown keys are ignored"""
+        values = {name: data[name] for name in FIELD_NAMES if name in data}
+        if validate_fields:
+            return cls().update(**values)
+        return cls(**values)
+
+
+FIELD_NAMES = tuple(f.name for f in fields(PatientRecord))
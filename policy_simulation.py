@@ -0,0 +1,401 @@
+"""Monte Carlo comparison of treatment-escalation policies over a cohort.
+
+A policy assigns each patient a maintenance therapy with an ordered rule
+table, first match wins, written like the consideration rules
+(``[field, operator, value]`` conditions over assessment fields such as
+``GOLD_group`` and ``eosinophils``) and compiled by ``rules.RuleSet``:
+
+    {"when": [["GOLD_group", "==", "E"], ["eosinophils", ">=", 300]],
+     "therapy": "LAMA+LABA+ICS"}
+
+For every policy the simulator estimates a year's moderate-or-severe
+exacerbations and pneumonia episodes for the cohort, and the differences
+from the reference policy (exacerbations avoided, excess pneumonia). Each
+replicate draws:
+
+* every patient's underlying exacerbation rate from its posterior given the
+  exacerbations in their last assessment (gamma-Poisson, with the prior fit
+  to the cohort), assuming that history was recorded on the reference
+  policy's therapy;
+* the treatment effects in ``PARAMETERS`` from their confidence intervals:
+  bronchodilator rate ratios, the ICS rate ratio by eosinophil band (the
+  app's 100 and 300 cells/μL cut-offs) and the ICS pneumonia hazard ratio.
+
+Replicates report expected counts, so the spread is the uncertainty in the
+rates and effects rather than one year's chance. Patients with the same
+eosinophil band and the same therapy under every policy share one cell;
+since a sum of gamma draws with a common scale is itself a gamma draw, a
+replicate costs a few operations per cell, not per patient. Replicates run
+in fixed-size blocks seeded from one ``numpy.random.SeedSequence``, so a
+seed gives the same intervals whatever the number of worker processes:
+
+    python policy_simulation.py --replicates 20000 --workers 4
+    python policy_simulation.py --csv cohort.csv --policies guideline,triple_eos100
+
+``PARAMETERS`` are planning estimates from the published trials, not
+calibrated to any population; review them before relying on the numbers.
+"""
+import argparse
+import json
+import math
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from rules import RuleSet
+
+# Therapy -> (bronchodilator component, contains ICS)
+THERAPIES = {
+    "LAMA": ("LAMA", False),
+    "LABA": ("LABA", False),
+    "LAMA+LABA": ("LAMA+LABA", False),
+    "LABA+ICS": ("LABA", True),
+    "LAMA+LABA+ICS": ("LAMA+LABA", True),
+}
+BRONCHODILATORS = ("LAMA", "LABA", "LAMA+LABA")
+
+# Eosinophil bands (cells/μL) for the ICS effect: <100, 100-299, >=300
+EOSINOPHIL_CUTS = (100, 300)
+
+# (estimate, 95% CI low, high) of each ratio; drawn log-normally
+PARAMETERS = {
+    # Exacerbation rate ratio vs LAMA+LABA
+    "rate_ratio": {
+        "LAMA": (1.10, 1.02, 1.19),
+        "LABA": (1.25, 1.13, 1.38),
+        "LAMA+LABA": (1.0, 1.0, 1.0),
+    },
+    # Exacerbation rate ratio of adding ICS, by eosinophil band
+    "ics_rate_ratio": ((0.95, 0.85, 1.06), (0.80, 0.72, 0.89), (0.62, 0.54, 0.71)),
+    # Pneumonia hazard ratio on ICS
+    "ics_pneumonia_ratio": (1.50, 1.30, 1.80),
+    # Pneumonia episodes per patient-year without ICS at age 65
+    "pneumonia_rate": (0.025, 0.018, 0.035),
+}
+
+# Pneumonia risk multipliers: per year of age over 65, BMI < 20, FEV1 < 50%
+PNEUMONIA_AGE_FACTOR = 1.03
+PNEUMONIA_LOW_BMI = 1.4
+PNEUMONIA_SEVERE_FEV1 = 1.5
+
+# Policy name -> rules, first match wins; the last rule must match everyone
+POLICIES = {
+    "guideline": [
+        {"when": [["GOLD_group", "==", "A"]], "therapy": "LAMA"},
+        {"when": [], "therapy": "LAMA+LABA"},
+    ],
+    "triple_eos300": [
+        {"when": [["GOLD_group", "==", "E"], ["eosinophils", ">=", 300]], "therapy": "LAMA+LABA+ICS"},
+        {"when": [["GOLD_group", "==", "A"]], "therapy": "LAMA"},
+        {"when": [], "therapy": "LAMA+LABA"},
+    ],
+    "triple_eos100": [
+        {"when": [["GOLD_group", "==", "E"], ["eosinophils", ">=", 100]], "therapy": "LAMA+LABA+ICS"},
+        {"when": [["GOLD_group", "==", "A"]], "therapy": "LAMA"},
+        {"when": [], "therapy": "LAMA+LABA"},
+    ],
+    "triple_all_E": [
+        {"when": [["GOLD_group", "==", "E"]], "therapy": "LAMA+LABA+ICS"},
+        {"when": [["GOLD_group", "==", "A"]], "therapy": "LAMA"},
+        {"when": [], "therapy": "LAMA+LABA"},
+    ],
+}
+DEFAULT_REFERENCE = "guideline"
+
+POLICY_DESCRIPTIONS = {
+    "guideline": "Group A: LAMA; groups B and E: LAMA+LABA",
+    "triple_eos300": "Group E with eosinophils ≥300: LAMA+LABA+ICS",
+    "triple_eos100": "Group E with eosinophils ≥100: LAMA+LABA+ICS",
+    "triple_all_E": "All of group E: LAMA+LABA+ICS",
+}
+
+# Cohort columns, with the values used where an assessment lacks them
+COHORT_DEFAULTS = {
+    "GOLD_group": "A",
+    "eosinophils": 0,
+    "exacerbations": 0,
+    "hospitalization": False,
+    "age": 65,
+    "bmi": 25.0,
+    "fev1_percent": None,
+    "CAT_score": 0,
+    "mMRC_score": 0,
+    "comorbidities": [],
+}
+
+DEFAULT_REPLICATES = 2000
+BLOCK_SIZE = 500  # replicates per seeded block
+Z_95 = 1.959964
+
+OUTCOMES = ("exacerbations", "exacerbations_avoided", "pneumonia", "excess_pneumonia")
+
+
+def _log_normal(rng, estimate, size):
+    """Draws of a ratio given (estimate, CI low, CI high)"""
+    value, low, high = estimate
+    sigma = (math.log(high) - math.log(low)) / (2 * Z_95)
+    return rng.lognormal(math.log(value), sigma, size)
+
+
+def _therapy_index(cohort, policy):
+    """Index into THERAPIES of each cohort row's therapy under ``policy``"""
+    import numpy as np
+
+    for rule in policy:
+        if rule["therapy"] not in THERAPIES:
+            raise ValueError(f"unknown therapy {rule['therapy']!r}; expected one of {', '.join(THERAPIES)}")
+    rules = RuleSet({"version": "policy", "rules": [
+        {"id": str(j), "text": rule["therapy"], "when": rule["when"]} for j, rule in enumerate(policy)]})
+    fired = rules.evaluate_frame(cohort).to_numpy()
+    if not fired.any(axis=1).all():
+        raise ValueError("the policy's last rule must match every patient")
+    return np.array([list(THERAPIES).index(t) for t in rules.texts])[fired.argmax(axis=1)]
+
+
+def therapies(cohort, policy):
+    """Therapy name per cohort row under ``policy`` (a list of rules)"""
+    import numpy as np
+
+    return np.array(list(THERAPIES), dtype=object)[_therapy_index(cohort, policy)]
+
+
+def pneumonia_rates(cohort):
+    """Relative pneumonia risk per patient (1 = age 65, no other factor)"""
+    import numpy as np
+
+    age = cohort["age"].to_numpy(dtype=np.float64)
+    bmi = cohort["bmi"].to_numpy(dtype=np.float64)
+    fev1 = cohort["fev1_percent"].to_numpy(dtype=np.float64)
+    return (PNEUMONIA_AGE_FACTOR ** (age - 65)
+            * np.where(bmi < 20, PNEUMONIA_LOW_BMI, 1.0)
+            * np.where(fev1 < 50, PNEUMONIA_SEVERE_FEV1, 1.0))
+
+
+def build_cells(cohort, policies, reference=DEFAULT_REFERENCE):
+    """Collapse a cohort into cells of patients the simulation treats alike.
+
+    Returns a dict of arrays: the gamma shape and relative pneumonia risk
+    summed per cell, each cell's eosinophil band and its therapy index
+    (into THERAPIES) under every policy, plus the prior's rate parameter and
+    per-policy patient counts.
+    """
+    import numpy as np
+
+    names = list(policies)
+    if not len(cohort):
+        raise ValueError("the cohort is empty")
+    if reference not in names:
+        raise ValueError(f"reference policy {reference!r} is not among the policies")
+    exacerbations = cohort["exacerbations"].to_numpy(dtype=np.float64)
+    # Gamma prior by moments: negative-binomial fit of the cohort's counts
+    mean, variance = exacerbations.mean(), exacerbations.var()
+    rate = mean / (variance - mean) if variance > mean * 1.001 else 100.0
+    shape = max(mean, 0.01) * rate
+
+    assigned = np.column_stack([_therapy_index(cohort, policies[name]) for name in names])
+    band = np.searchsorted(EOSINOPHIL_CUTS, cohort["eosinophils"].to_numpy(dtype=np.float64),
+                           side="right")
+    # One integer per patient (band, then each policy's therapy, as digits):
+    # a 1-D unique is far cheaper than a row-wise one
+    columns = np.column_stack([band, assigned])
+    radix = max(len(THERAPIES), len(EOSINOPHIL_CUTS) + 1)
+    codes, cell = np.unique(columns @ radix ** np.arange(columns.shape[1], dtype=np.int64),
+                            return_inverse=True)
+    keys = codes[:, None] // radix ** np.arange(columns.shape[1], dtype=np.int64) % radix
+    ics = np.array([THERAPIES[t][1] for t in THERAPIES])
+    return {
+        "policies": names,
+        "reference": names.index(reference),
+        "band": keys[:, 0],
+        "therapy": keys[:, 1:],                     # cells x policies
+        "shape": np.bincount(cell, weights=exacerbations + shape, minlength=len(keys)),
+        "rate": rate + 1.0,                         # posterior rate after one year observed
+        "pneumonia": np.bincount(cell, weights=pneumonia_rates(cohort), minlength=len(keys)),
+        "patients": len(cohort),
+        "on_ics": ics[assigned].sum(axis=0),
+        "changed": (assigned != assigned[:, [names.index(reference)]]).sum(axis=0),
+    }
+
+
+def simulate_block(cells, replicates, seed):
+    """(replicates, policies, OUTCOMES) array of outcomes for one seeded block"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    therapy_names = list(THERAPIES)
+    # Exacerbation rate ratio of each therapy in each eosinophil band, per replicate
+    bronchodilator = np.column_stack([_log_normal(rng, PARAMETERS["rate_ratio"][b], replicates)
+                                      for b in BRONCHODILATORS])
+    ics = np.column_stack([_log_normal(rng, band, replicates) for band in PARAMETERS["ics_rate_ratio"]])
+    ratio = np.stack([bronchodilator[:, [BRONCHODILATORS.index(THERAPIES[t][0])]]
+                      * (ics if THERAPIES[t][1] else np.ones_like(ics)) for t in therapy_names], axis=1)
+    pneumonia_ratio = _log_normal(rng, PARAMETERS["ics_pneumonia_ratio"], replicates)
+    pneumonia_rate = _log_normal(rng, PARAMETERS["pneumonia_rate"], replicates)
+
+    # Cell totals of the patients' rates on the reference therapy
+    rates = rng.gamma(cells["shape"], 1 / cells["rate"], (replicates, len(cells["shape"])))
+    band, therapy = cells["band"], cells["therapy"]
+    multiplier = (ratio[:, therapy, band[:, None]]
+                  / ratio[:, therapy[:, [cells["reference"]]], band[:, None]])
+    exacerbations = np.einsum("rc,rcp->rp", rates, multiplier)
+    has_ics = np.array([THERAPIES[t][1] for t in therapy_names])[therapy]
+    pneumonia = pneumonia_rate[:, None] * np.einsum(
+        "c,rcp->rp", cells["pneumonia"], np.where(has_ics, pneumonia_ratio[:, None, None], 1.0))
+
+    reference = cells["reference"]
+    return np.stack([exacerbations,
+                     exacerbations[:, [reference]] - exacerbations,
+                     pneumonia,
+                     pneumonia - pneumonia[:, [reference]]], axis=2)
+
+
+def simulate(cohort, policies=None, replicates=DEFAULT_REPLICATES, seed=0, workers=1,
+             reference=DEFAULT_REFERENCE, confidence=0.95):
+    """Compare ``policies`` ({name: rules}, default POLICIES) over ``cohort``.
+
+    Returns {policy: {outcome: {"mean", "low", "high"}, "on_ics", "changed"}}
+    with the central ``confidence`` interval of each outcome across
+    replicates; outcomes are expected counts per year for the whole cohort.
+    """
+    import numpy as np
+
+    cells = build_cells(cohort, policies or POLICIES, reference)
+    blocks = [min(BLOCK_SIZE, replicates - start) for start in range(0, replicates, BLOCK_SIZE)]
+    seeds = np.random.SeedSequence(seed).spawn(len(blocks))
+    if workers > 1 and len(blocks) > 1:
+        with ProcessPoolExecutor(min(workers, len(blocks))) as pool:
+            results = list(pool.map(simulate_block, [cells] * len(blocks), blocks, seeds))
+    else:
+        results = [simulate_block(cells, size, block_seed) for size, block_seed in zip(blocks, seeds)]
+    outcomes = np.concatenate(results)
+
+    tail = (1 - confidence) / 2 * 100
+    mean = outcomes.mean(axis=0)
+    low, high = np.percentile(outcomes, [tail, 100 - tail], axis=0)
+    summary = {}
+    for p, name in enumerate(cells["policies"]):
+        summary[name] = {outcome: {"mean": float(mean[p, j]), "low": float(low[p, j]),
+                                   "high": float(high[p, j])}
+                         for j, outcome in enumerate(OUTCOMES)}
+        summary[name]["on_ics"] = int(cells["on_ics"][p])
+        summary[name]["changed"] = int(cells["changed"][p])
+    return summary
+
+
+# Cohorts
+
+def cohort_frame(records):
+    """Cohort DataFrame (COHORT_DEFAULTS columns) from assessment dicts or a DataFrame"""
+    import pandas as pd
+
+    frame = pd.DataFrame(records)
+    for column, default in COHORT_DEFAULTS.items():
+        if column not in frame:
+            frame[column] = [default] * len(frame) if isinstance(default, list) else default
+        elif not isinstance(default, list) and default is not None:
+            frame[column] = frame[column].fillna(default)
+    frame["fev1_percent"] = frame["fev1_percent"].astype(float)
+    return frame[list(COHORT_DEFAULTS)]
+
+
+def _latest_assessments(conn):
+    fields = [f"json_extract(report, '$.diagnosis.GOLD_group')"] + [
+        f"json_extract(report, '$.patient_data.{field}')" for field in list(COHORT_DEFAULTS)[1:]]
+    rows = conn.execute(f"""
+        WITH latest AS (
+            SELECT id, max(assessment_date) FROM reports WHERE patient_id != '' GROUP BY patient_id
+            UNION ALL
+            SELECT id, assessment_date FROM reports WHERE patient_id = ''
+        )
+        SELECT {', '.join(fields)} FROM latest JOIN reports USING (id)
+    """)
+    records = []
+    for row in rows:
+        record = dict(zip(COHORT_DEFAULTS, row))
+        record["comorbidities"] = json.loads(record["comorbidities"] or "[]")
+        records.append(record)
+    return records
+
+
+def cohort_from_store(store):
+    """Latest saved assessment of every patient (reports without an ID count singly)"""
+    return cohort_frame(store.read(_latest_assessments))
+
+
+def cohort_from_csv(path, chunk_size=100000):
+    """Cohort from a batch-assessment CSV/XLSX file, grouped as batch_assess would"""
+    import pandas as pd
+
+    from assessment import assess_batch
+    from batch_assess import iter_chunks, normalize_chunk
+
+    frames = []
+    for chunk in iter_chunks(path, chunk_size):
+        chunk = normalize_chunk(chunk)
+        results = assess_batch(chunk)
+        chunk["GOLD_group"] = results["GOLD_group"]
+        chunk["CAT_score"] = results["CAT_score"]
+        chunk["fev1_percent"] = results["fev1_percent"]
+        frames.append(cohort_frame(chunk))
+    return pd.concat(frames, ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate treatment-escalation policies over a cohort")
+    parser.add_argument("--csv", help="batch-assessment CSV/XLSX cohort (default: the report store)")
+    parser.add_argument("--store", default=None, help="report store URL (sqlite:// only)")
+    parser.add_argument("--policies", default=",".join(POLICIES),
+                        help="comma-separated policy names to compare")
+    parser.add_argument("--policy-file", help="JSON file of extra policies {name: [rules]}")
+    parser.add_argument("--reference", default=DEFAULT_REFERENCE)
+    parser.add_argument("--replicates", type=int, default=DEFAULT_REPLICATES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes")
+    parser.add_argument("--json", help="write the summary as JSON")
+    args = parser.parse_args(argv)
+
+    available = dict(POLICIES)
+    if args.policy_file:
+        with open(args.policy_file) as f:
+            available.update(json.load(f))
+    names = [name.strip() for name in args.policies.split(",")]
+    if args.reference not in names:
+        names.insert(0, args.reference)
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        parser.error(f"unknown policies: {', '.join(unknown)}")
+
+    start = time.perf_counter()
+    if args.csv:
+        cohort = cohort_from_csv(args.csv)
+    else:
+        from storage import SQLiteReportStore, open_store
+
+        store = open_store(args.store)
+        if not isinstance(store, SQLiteReportStore):
+            parser.error("reading the cohort requires a sqlite:// report store")
+        cohort = cohort_from_store(store)
+    loaded = time.perf_counter()
+    try:
+        summary = simulate(cohort, {name: available[name] for name in names}, args.replicates,
+                           args.seed, args.workers, args.reference)
+    except ValueError as e:
+        parser.error(str(e))
+    done = time.perf_counter()
+
+    print(f"{len(cohort):,} patients, {args.replicates:,} replicates "
+          f"(cohort {loaded - start:.2f}s, simulation {done - loaded:.2f}s); 95% intervals per year",
+          file=sys.stderr)
+    for name, result in summary.items():
+        print(f"{name}  (ICS {result['on_ics']:,}, changed {result['changed']:,})")
+        for outcome in OUTCOMES:
+            value = result[outcome]
+            print(f"  {outcome:24s} {value['mean']:12,.1f}  [{value['low']:,.1f}, {value['high']:,.1f}]")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"patients": len(cohort), "replicates": args.replicates, "seed": args.seed,
+                       "reference": args.reference, "policies": summary}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Recommendation bundles, memoized across sessions.
+
+The Diagnosis & Treatment page needs the same derived values on every
+rerun: the GOLD group, the special considerations (rule table plus the
+medication-interaction scan) and the report's diagnosis and recommendation
+sections. ``recommendation_bundle`` computes them as a pure function of the
+few patient fields that affect them and the knowledge base, and
+``cached_bundle`` memoizes it in a process-wide LRU cache with a time to
+live. Sessions share entries, so patients with identical inputs reuse one
+computation.
+
+Entries are keyed by the canonical form of the relevant fields plus the
+knowledge-base version; when the knowledge base is reloaded with a new
+version, the cache empties itself. ``stats()`` reports hits, misses,
+evictions, expirations and invalidations (also exported as
+``copd_recommendation_cache_total`` when metrics are enabled).
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+import metrics
+from assessment import build_considerations, determine_GOLD_group, recommendation_sections
+from knowledge_base import current as current_knowledge_base
+
+# Patient fields every bundle depends on: GOLD group inputs and the
+# medication list. The consideration rules add the fields they read.
+BASE_FIELDS = ("mMRC_score", "CAT_score", "exacerbations", "hospitalization", "current_medications")
+
+DEFAULT_MAXSIZE = 10000
+DEFAULT_TTL = 3600.0  # seconds
+
+
+def _canonical(value):
+    if isinstance(value, (list, tuple, set)):
+        return tuple(sorted(_canonical(v) for v in value))
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+@lru_cache(maxsize=8)
+def bundle_fields(rules):
+    """Patient fields a bundle depends on under a compiled rule set"""
+    return tuple(dict.fromkeys(BASE_FIELDS + tuple(f for f in rules.fields if f != "GOLD_group")))
+
+
+def bundle_key(data, knowledge_base):
+    """Cache key: the bundle's inputs in canonical form (hashable).
+
+    Lists are sorted, strings stripped and integral floats made ints, so
+    equivalent inputs from different pages or sessions share one entry.
+    """
+    return (knowledge_base.version,) + tuple(_canonical(data.get(field))
+                                             for field in bundle_fields(knowledge_base.rules))
+
+
+def recommendation_bundle(data, knowledge_base):
+    """GOLD group, considerations and report sections for one assessment"""
+    GOLD_group = determine_GOLD_group(data["mMRC_score"], data["CAT_score"],
+                                      data["exacerbations"], data["hospitalization"])
+    considerations = build_considerations(data, GOLD_group, knowledge_base)
+    return {
+        "GOLD_group": GOLD_group,
+        "considerations": considerations,
+        **recommendation_sections(GOLD_group, considerations, knowledge_base)
+    }
+
+
+class BundleCache:
+    """Thread-safe LRU cache with a per-entry time to live"""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttl=DEFAULT_TTL, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires at, value)
+        self._version = None
+        self._counts = dict.fromkeys(("hits", "misses", "evictions", "expirations", "invalidations"), 0)
+
+    def _count(self, event):
+        self._counts[event] += 1
+        if metrics.ENABLED:
+            metrics.REGISTRY.increment("copd_recommendation_cache_total", (("event", event),))
+
+    def get(self, key, version, compute):
+        """Cached value for ``key``, or ``compute()`` stored under it.
+
+        A ``version`` different from the previous call's (a changed
+        knowledge base) empties the cache first.
+        """
+        now = self._clock()
+        with self._lock:
+            if version != self._version:
+                if self._entries:
+                    self._count("invalidations")
+                self._entries.clear()
+                self._version = version
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._count("hits")
+                    return entry[1]
+                del self._entries[key]
+                self._count("expirations")
+            self._count("misses")
+
+        # Computed outside the lock; concurrent misses on one key both compute
+        value = compute()
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = (now + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self._count("evictions")
+        return value
+
+    def clear(self):
+        with self._lock:
+            if self._entries:
+                self._count("invalidations")
+            self._entries.clear()
+
+    def stats(self):
+        """Counters plus current size and hit rate"""
+        with self._lock:
+            stats = dict(self._counts, size=len(self._entries), maxsize=self.maxsize, ttl=self.ttl)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else None
+        return stats
+
+
+@lru_cache(maxsize=None)
+def default_cache():
+    """Process-wide cache shared by every session"""
+    return BundleCache()
+
+
+def cached_bundle(data, knowledge_base=None, cache=None):
+    """``recommendation_bundle`` through ``cache`` (default: the shared one).
+
+    ``knowledge_base`` defaults to the live one. The returned dict and its
+    considerations list are copies, so callers may modify them without
+    touching the cached entry.
+    """
+    cache = cache or default_cache()
+    if knowledge_base is None:
+        knowledge_base = current_knowledge_base()
+    bundle = cache.get(bundle_key(data, knowledge_base), knowledge_base.version,
+                       lambda: recommendation_bundle(data, knowledge_base))
+    considerations = list(bundle["considerations"])
+    return {
+        "GOLD_group": bundle["GOLD_group"],
+        "considerations": considerations,
+        "diagnosis": dict(bundle["diagnosis"]),
+        "recommendations": dict(bundle["recommendations"], special_considerations=considerations),
+    }
+
+
+def stats():
+    return default_cache().stats()
@@ -0,0 +1,178 @@
+"""Predicted spirometry from age, sex and height (GLI-style reference equations).
+
+Each of FEV1, FVC and FEV1/FVC follows the LMS model used by the Global Lung
+Function Initiative, per sex:
+
+    M   = exp(a1 ln(height) + T(age))        predicted (median) value
+    S   = exp(p0 + p1 ln(age))               coefficient of variation
+    L   = q0 + q1 ln(age)                    skewness
+    LLN = M (1 - 1.645 L S) ** (1 / L)       lower limit of normal (5th centile)
+
+``T(age)`` stands for GLI's intercept, age term and age spline together. It
+is tabulated once per process, on first use, into arrays on a quarter-year
+age grid by a natural cubic spline through ``MEDIAN_KNOTS``; a patient is
+then a constant-time lookup between two grid points, and a cohort the same
+lookup vectorized with NumPy.
+
+The coefficients and knots are approximations tuned to GLI-2012 predictions
+for adults of European ancestry (18-95 years; ages outside are clamped).
+They are not the published GLI lookup tables and are intended for triage
+and defaults, not for reporting spirometry; replace ``MEDIAN_KNOTS`` and
+the coefficients with the official tables before clinical use.
+
+    predicted(67, "Female", 162)["fev1_predicted"]   # litres
+"""
+import math
+from functools import lru_cache
+
+AGE_MIN, AGE_MAX = 18.0, 95.0
+STEPS_PER_YEAR = 4
+
+# Sexes with reference equations; "Other" has none
+SEXES = ("Male", "Female")
+
+# Output key prefix for each measure
+MEASURES = ("fev1", "fvc", "fev1_fvc")
+
+# Knot ages (years) for the tabulated age term
+KNOT_AGES = (18, 20, 25, 30, 35, 40, 45, 50, 55, 60, 65, 70, 75, 80, 85, 90, 95)
+
+# Height (cm) at which MEDIAN_KNOTS are given
+REFERENCE_HEIGHT = {"Male": 175.0, "Female": 162.0}
+
+# Predicted FVC (L) and FEV1/FVC at REFERENCE_HEIGHT, per knot age. FEV1
+# knots are their product.
+MEDIAN_KNOTS = {
+    ("fvc", "Male"): (5.05, 5.20, 5.30, 5.25, 5.15, 5.02, 4.87, 4.71, 4.54,
+                      4.36, 4.17, 3.97, 3.76, 3.55, 3.33, 3.11, 2.90),
+    ("fvc", "Female"): (3.75, 3.85, 3.90, 3.85, 3.77, 3.67, 3.56, 3.44, 3.31,
+                        3.17, 3.03, 2.88, 2.72, 2.56, 2.40, 2.24, 2.08),
+    ("fev1_fvc", "Male"): (0.860, 0.855, 0.840, 0.825, 0.810, 0.800, 0.790, 0.780, 0.770,
+                           0.760, 0.750, 0.740, 0.730, 0.720, 0.710, 0.700, 0.690),
+    ("fev1_fvc", "Female"): (0.875, 0.870, 0.855, 0.840, 0.830, 0.820, 0.810, 0.800, 0.790,
+                             0.780, 0.770, 0.760, 0.750, 0.740, 0.730, 0.720, 0.710),
+}
+
+# measure -> (a1, (p0, p1), (q0, q1)), shared by both sexes
+COEFFICIENTS = {
+    "fev1": (2.20, (-3.049, 0.247), (1.10, 0.0)),
+    "fvc": (2.30, (-3.029, 0.2256), (0.95, 0.0)),
+    "fev1_fvc": (-0.09, (-3.571, 0.224), (4.00, 0.0)),
+}
+
+# Standard normal 5th centile
+LLN_Z = 1.645
+
+
+def _natural_spline(x, y, grid):
+    """Natural cubic spline through (x, y), evaluated at ``grid``"""
+    import numpy as np
+
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    h = np.diff(x)
+    n = len(x)
+    # Second derivatives: tridiagonal system with zero curvature at both ends
+    system = np.zeros((n, n))
+    rhs = np.zeros(n)
+    system[0, 0] = system[-1, -1] = 1
+    for i in range(1, n - 1):
+        system[i, i - 1:i + 2] = h[i - 1], 2 * (h[i - 1] + h[i]), h[i]
+        rhs[i] = 6 * ((y[i + 1] - y[i]) / h[i] - (y[i] - y[i - 1]) / h[i - 1])
+    m = np.linalg.solve(system, rhs)
+
+    i = np.clip(np.searchsorted(x, grid, side="right") - 1, 0, n - 2)
+    t = grid - x[i]
+    slope = (y[i + 1] - y[i]) / h[i] - h[i] * (2 * m[i] + m[i + 1]) / 6
+    return y[i] + slope * t + m[i] / 2 * t**2 + (m[i + 1] - m[i]) / (6 * h[i]) * t**3
+
+
+@lru_cache(maxsize=None)
+def tables():
+    """{(measure, sex): (T, S, L) arrays over the age grid}, built once per process"""
+    import numpy as np
+
+    ages = np.linspace(AGE_MIN, AGE_MAX, int((AGE_MAX - AGE_MIN) * STEPS_PER_YEAR) + 1)
+    log_age = np.log(ages)
+    knots = dict(MEDIAN_KNOTS)
+    for sex in SEXES:
+        knots[("fev1", sex)] = tuple(f * r for f, r in zip(knots[("fvc", sex)],
+                                                            knots[("fev1_fvc", sex)]))
+    result = {}
+    for (measure, sex), medians in knots.items():
+        a1, (p0, p1), (q0, q1) = COEFFICIENTS[measure]
+        log_median = _natural_spline(KNOT_AGES, np.log(medians), ages)
+        result[(measure, sex)] = (log_median - a1 * math.log(REFERENCE_HEIGHT[sex]),
+                                  np.exp(p0 + p1 * log_age),
+                                  q0 + q1 * log_age)
+    return result
+
+
+@lru_cache(maxsize=None)
+def _scalar_tables():
+    # Plain lists: indexing them is cheaper than NumPy scalars for one patient
+    return {key: tuple(column.tolist() for column in columns) for key, columns in tables().items()}
+
+
+@lru_cache(maxsize=None)
+def _batch_tables():
+    # measure -> (T, S, L) with the sexes' tables laid end to end, in SEXES order
+    import numpy as np
+
+    return {measure: tuple(np.concatenate(columns) for columns in
+                           zip(*(tables()[(measure, sex)] for sex in SEXES)))
+            for measure in MEASURES}
+
+
+def _lln(median, s, l):
+    return median * (1 - LLN_Z * l * s) ** (1 / l)
+
+
+def predicted(age, sex, height_cm):
+    """Predicted and LLN values for one patient, or None without age, sex or height.
+
+    Keys: ``fev1_predicted``, ``fev1_lln``, ``fvc_predicted``, ``fvc_lln``
+    (litres), ``fev1_fvc_predicted`` and ``fev1_fvc_lln`` (ratio).
+    """
+    if age is None or not height_cm or sex not in SEXES:
+        return None
+    position = (min(max(age, AGE_MIN), AGE_MAX) - AGE_MIN) * STEPS_PER_YEAR
+    i = min(int(position), int((AGE_MAX - AGE_MIN) * STEPS_PER_YEAR) - 1)
+    w = position - i
+    log_height = math.log(height_cm)
+
+    values = {}
+    scalar = _scalar_tables()
+    for measure in MEASURES:
+        term, s, l = scalar[(measure, sex)]
+        median = math.exp(COEFFICIENTS[measure][0] * log_height + term[i] + w * (term[i + 1] - term[i]))
+        values[f"{measure}_predicted"] = median
+        values[f"{measure}_lln"] = _lln(median, s[i] + w * (s[i + 1] - s[i]),
+                                        l[i] + w * (l[i + 1] - l[i]))
+    return values
+
+
+def predicted_batch(age, sex, height_cm):
+    """Vectorized ``predicted``: a dict of float arrays, NaN where not computable"""
+    import numpy as np
+
+    age = np.asarray(age, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_height = np.log(np.asarray(height_cm, dtype=np.float64))
+    # Index of each row's sex in SEXES; -1 for none with equations
+    sex = np.asarray(sex, dtype=object)
+    sex_code = np.select([sex == name for name in SEXES], range(len(SEXES)), -1)
+    valid = (sex_code >= 0) & (age >= 0) & np.isfinite(log_height)
+
+    last = int((AGE_MAX - AGE_MIN) * STEPS_PER_YEAR)
+    position = (np.clip(np.where(valid, age, AGE_MIN), AGE_MIN, AGE_MAX) - AGE_MIN) * STEPS_PER_YEAR
+    i = np.minimum(position.astype(np.int64), last - 1)
+    w = position - i
+    i += np.maximum(sex_code, 0).astype(np.int64) * (last + 1)
+
+    values = {}
+    for measure, (term, s, l) in _batch_tables().items():
+        median = np.exp(COEFFICIENTS[measure][0] * log_height + term[i] + w * (term[i + 1] - term[i]))
+        lln = _lln(median, s[i] + w * (s[i + 1] - s[i]), l[i] + w * (l[i + 1] - l[i]))
+        values[f"{measure}_predicted"] = np.where(valid, median, np.nan)
+        values[f"{measure}_lln"] = np.where(valid, lln, np.nan)
+    return values
@@ -0,0 +1,256 @@
+"""Declarative rule tables compiled into scalar and vectorized evaluators.
+
+A rule table (see ``knowledge_base/considerations.json``) is plain
+data: a version, per-field defaults and an ordered list of rules, each with
+an ``id``, the ``text`` it contributes and the conditions (``[field,
+operator, value]``) that must all hold. ``RuleSet`` compiles the table once,
+into one generated Python function for single patients, and into NumPy
+expressions for whole DataFrames, so the Streamlit pages, batch jobs and
+reports evaluate the same rules with no per-rule branching in their code.
+
+Operators: ``==``, ``!=``, ``<``, ``<=``, ``>``, ``>=``, ``in`` (field value
+is one of a list), ``contains`` (list field includes the value) and
+``truthy`` (value ignored).
+
+A missing field value (absent, None or NaN) takes the table default in both
+evaluators. ``python rules.py check`` runs both over generated records,
+missing values included, and fails if any record's rules differ.
+"""
+import argparse
+import json
+import math
+import operator
+import sys
+
+COMPARISONS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+OPERATORS = set(COMPARISONS) | {"in", "contains", "truthy"}
+
+
+def _scalar_test(op, value):
+    """Function of one field value for a condition"""
+    if op in COMPARISONS:
+        compare = COMPARISONS[op]
+        return lambda v: compare(v, value)
+    if op == "in":
+        allowed = frozenset(value)
+        return lambda v: v in allowed
+    if op == "contains":
+        return lambda v: value in (v or ())
+    return bool
+
+
+def _scalar_source(op, var, const):
+    """Python expression for a condition on local ``var`` and constant ``const``"""
+    if op in COMPARISONS:
+        return f"{var} {op} {const}"
+    if op == "in":
+        return f"{var} in {const}"
+    if op == "contains":
+        return f"{const} in ({var} or ())"
+    return f"bool({var})"
+
+
+def _vector_test(op, value, column):
+    """Boolean array for a condition over a pandas Series"""
+    import numpy as np
+
+    if op in COMPARISONS:
+        values = column.to_numpy()
+        if values.dtype == object and op not in ("==", "!="):
+            values = column.astype(float).to_numpy()
+        return np.asarray(COMPARISONS[op](values, value), dtype=bool)
+    if op == "in":
+        return column.isin(list(value)).to_numpy()
+    if op == "contains":
+        return np.fromiter((value in (v or ()) for v in column), dtype=bool, count=len(column))
+    return column.fillna(False).astype(bool).to_numpy()
+
+
+class RuleSet:
+    """A compiled rule table"""
+
+    def __init__(self, table):
+        self.version = table["version"]
+        self.defaults = dict(table.get("defaults", {}))
+        self.ids = []
+        self.texts = []
+        self._conditions = []
+        for rule in table["rules"]:
+            conditions = [tuple(condition) for condition in rule["when"]]
+            for field, op, _ in conditions:
+                if op not in OPERATORS:
+                    raise ValueError(f"Rule {rule['id']!r}: unknown operator {op!r} on {field!r}")
+            self.ids.append(rule["id"])
+            self.texts.append(rule["text"])
+            self._conditions.append(conditions)
+
+        # Record fields the rules read, in first-use order
+        self.fields = tuple(dict.fromkeys(f for conditions in self._conditions for f, _, _ in conditions))
+        self._fire = self._compile()
+
+    def _compile(self):
+        """Generate one function that tests every rule on a record.
+
+        Each field is read once; each rule becomes an ``if`` over its
+        conditions, so evaluating a patient costs a few comparisons per rule.
+        """
+        namespace = {}
+        fields = {}
+        lines = ["def fire(record, values):", "    fired = []"]
+        for field in self.fields:
+            fields[field] = var = f"f{len(fields)}"
+            namespace[f"d_{var}"] = self.defaults.get(field)
+            lines.append(f"    {var} = record.get({field!r})")
+            # Missing is None or NaN (NaN != NaN), as in evaluate_frame
+            lines.append(f"    if {var} is None or {var} != {var}: {var} = d_{var}")
+        for j, conditions in enumerate(self._conditions):
+            tests = []
+            for field, op, value in conditions:
+                const = f"c{len(namespace)}"
+                namespace[const] = frozenset(value) if op == "in" else value
+                tests.append(_scalar_source(op, fields[field], const))
+            lines.append(f"    if {' and '.join(tests) or 'True'}:")
+            lines.append(f"        fired.append(values[{j}])")
+        lines.append("    return fired")
+        exec(compile("\n".join(lines), f"<rules {self.version}>", "exec"), namespace)
+        return namespace["fire"]
+
+    def __len__(self):
+        return len(self.ids)
+
+    # One patient
+
+    def matches(self, record):
+        """IDs of the rules that fire for one record (a dict of fields)"""
+        return self._fire(record, self.ids)
+
+    def evaluate(self, record):
+        """Texts of the rules that fire for one record, in table order"""
+        return self._fire(record, self.texts)
+
+    # Whole cohorts
+
+    def evaluate_frame(self, frame, **columns):
+        """Boolean DataFrame (one column per rule ID) over a cohort.
+
+        Fields are read from ``frame``; keyword arguments supply or override
+        columns (e.g. ``GOLD_group=results["GOLD_group"]``). Fields absent from
+        both take the table default for every row, and missing values in a
+        column take it for that row.
+        """
+        import numpy as np
+        import pandas as pd
+
+        def column(field):
+            if field in columns:
+                values = columns[field]
+                values = pd.Series(getattr(values, "to_numpy", lambda: values)(), index=frame.index)
+            elif field in frame:
+                values = frame[field]
+            else:
+                return None
+            # Missing values (None or NaN) take the table default, as in the
+            # scalar path
+            default = self.defaults.get(field)
+            if default is not None and values.hasnans:
+                missing = values.isna().to_numpy()
+                if isinstance(default, list):
+                    values = pd.Series([default if m else v for v, m in zip(values, missing)],
+                                       index=values.index, dtype=object)
+                else:
+                    values = values.where(~missing, default)
+            return values
+
+        fired = np.ones((len(frame), len(self.ids)), dtype=bool)
+        for j, conditions in enumerate(self._conditions):
+            for field, op, value in conditions:
+                values = column(field)
+                if values is None:
+                    fired[:, j] &= _scalar_test(op, value)(self.defaults.get(field))
+                else:
+                    fired[:, j] &= _vector_test(op, value, values)
+        return pd.DataFrame(fired, index=frame.index, columns=self.ids)
+
+    def evaluate_texts(self, frame, **columns):
+        """Per-row lists of fired rule texts, in table order"""
+        import numpy as np
+
+        fired = self.evaluate_frame(frame, **columns).to_numpy()
+        # One integer per row with bit j set when rule j fired; rows with the
+        # same code share one text list (copied per row)
+        weights = 1 << np.arange(len(self.ids), dtype=np.int64 if len(self.ids) < 63 else object)
+        codes = fired.astype(weights.dtype) @ weights
+        texts = {code: [t for j, t in enumerate(self.texts) if code >> j & 1]
+                 for code in set(codes.tolist())}
+        return [texts[code].copy() for code in codes.tolist()]
+
+    def mismatches(self, frame):
+        """Row positions where ``evaluate`` and ``evaluate_texts`` disagree"""
+        vector = self.evaluate_texts(frame)
+        return [i for i, (record, texts) in enumerate(zip(frame.to_dict("records"), vector))
+                if self.evaluate(record) != texts]
+
+
+def _candidates(op, value):
+    """Field values on and around a condition's boundary"""
+    if op == "in":
+        return list(value) + ["other"]
+    if op == "contains":
+        return [[value], [], ["other", value]]
+    if op == "truthy":
+        return [True, False, 0, 1]
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return [value - 1, value, value + 1]
+    return [value, "other"]
+
+
+def sample_frame(rules, size=2000, seed=0):
+    """Records exercising every condition, with None and NaN in every field"""
+    import numpy as np
+    import pandas as pd
+
+    candidates = {field: [None, math.nan] for field in rules.fields}
+    for conditions in rules._conditions:
+        for field, op, value in conditions:
+            candidates[field] += _candidates(op, value)
+    rng = np.random.default_rng(seed)
+    # Object columns keep None and NaN apart, as records from JSON would
+    return pd.DataFrame({field: pd.Series([values[i] for i in rng.integers(len(values), size=size)],
+                                          dtype=object)
+                         for field, values in candidates.items()})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check a rule table's scalar and vectorized evaluators agree")
+    commands = parser.add_subparsers(dest="command", required=True)
+    check = commands.add_parser("check", help="compare both evaluators on generated records")
+    check.add_argument("table", nargs="?", help="rule table JSON (default: the knowledge base's)")
+    check.add_argument("--records", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    if args.table:
+        with open(args.table) as f:
+            rules = RuleSet(json.load(f))
+    else:
+        from knowledge_base import current
+
+        rules = current().rules
+    frame = sample_frame(rules, args.records)
+    mismatched = rules.mismatches(frame)
+    for i in mismatched[:10]:
+        record = frame.iloc[i].to_dict()
+        print(f"{record}: scalar {rules.evaluate(record)} vs vector {rules.evaluate_texts(frame.iloc[[i]])[0]}")
+    print(f"{len(frame) - len(mismatched):,} of {len(frame):,} records agree")
+    return 1 if mismatched else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
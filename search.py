@@ -0,0 +1,139 @@
+"""Full-text search over the free-text fields of saved reports.
+
+``ReportSearch`` is a report-store indexer (like ``analytics.CohortAggregates``)
+over an SQLite FTS5 table: an inverted index, stored in the report database,
+of each report's ``cxr_notes``, ``other_labs``, ``current_medications`` and
+``cxr_findings``. Saving a report adds its postings in the same transaction,
+so the index never lags the archive and is never rebuilt.
+
+Queries are written as in a search box and translated by ``fts_query``:
+
+    bullae                 term
+    "alpha-1 antitrypsin"  phrase (words in order)
+    tiotrop*               prefix
+    bullae smoker*         every part must match
+
+Results come newest first (by report ID), which lets FTS5 stop after the
+first ``limit`` matches instead of ranking every one, and can be restricted
+to one patient and an ISO date range:
+
+    python search.py '"alpha-1"' --since 2026-01-01
+    python search.py bullae --patient MRN-004217
+"""
+import argparse
+import re
+
+# Report fields indexed, one FTS5 column each
+FIELDS = ("cxr_notes", "other_labs", "current_medications", "cxr_findings")
+
+DEFAULT_LIMIT = 50
+
+# Quoted phrases, or runs of anything else up to whitespace
+QUERY_PARTS = re.compile(r'"([^"]*)"?|(\S+)')
+
+
+def _quote(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def fts_query(query):
+    """FTS5 MATCH expression for a search-box query, or None if it has no terms.
+
+    Every part is quoted, so FTS5 operators and punctuation in the query are
+    searched for as text: ``alpha-1`` is the phrase "alpha 1".
+    """
+    parts = []
+    for phrase, word in QUERY_PARTS.findall(query):
+        text = phrase if phrase else word
+        prefix = text.endswith("*")
+        text = text.rstrip("*")
+        if not re.search(r"\w", text):
+            continue
+        parts.append(_quote(text) + ("*" if prefix else ""))
+    return " ".join(parts) or None
+
+
+def _field_text(value):
+    if isinstance(value, (list, tuple)):
+        return "; ".join(map(str, value))
+    return value or ""
+
+
+class ReportSearch:
+    """Report-store indexer keeping an FTS5 index of the free-text fields"""
+
+    table = "report_search"
+
+    def create(self, conn):
+        # rowid is the report ID; prefix indexes make short prefixes cheap
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5(
+                {', '.join(FIELDS)},
+                patient_id UNINDEXED,
+                assessment_date UNINDEXED,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        """)
+
+    def update(self, conn, report_id, report):
+        patient = report.get("patient_data") or {}
+        texts = [_field_text(patient.get(field)) for field in FIELDS]
+        if not any(texts):
+            return
+        conn.execute(
+            f"INSERT INTO {self.table} (rowid, {', '.join(FIELDS)}, patient_id, assessment_date) "
+            f"VALUES (?, {', '.join('?' * len(FIELDS))}, ?, ?)",
+            (report_id, *texts, patient.get("patient_id") or "", report.get("assessment_date") or ""))
+
+    def search(self, conn, query, patient_id=None, since=None, until=None, limit=DEFAULT_LIMIT):
+        """Matching reports, newest first: dicts with report ID, patient, date and snippet"""
+        expression = fts_query(query)
+        if expression is None:
+            return []
+        clauses, params = [f"{self.table} MATCH ?"], [expression]
+        if patient_id:
+            # The reports table's patient index beats scanning every match
+            clauses.append("rowid IN (SELECT id FROM reports WHERE patient_id = ?)")
+            params.append(patient_id)
+        if since:
+            clauses.append("assessment_date >= ?")
+            params.append(since)
+        if until:
+            clauses.append("assessment_date < ?")
+            params.append(until)
+        rows = conn.execute(
+            f"SELECT rowid, patient_id, assessment_date, "
+            f"snippet({self.table}, -1, '**', '**', '…', 12) FROM {self.table} "
+            f"WHERE {' AND '.join(clauses)} ORDER BY rowid DESC LIMIT ?", (*params, int(limit)))
+        return [{"report_id": report_id, "patient_id": patient, "assessment_date": date,
+                 "snippet": snippet}
+                for report_id, patient, date, snippet in rows]
+
+
+def main(argv=None):
+    from storage import SQLiteReportStore, open_store
+    # The store's indexer is search.ReportSearch, not __main__'s copy
+    from search import ReportSearch as installed
+
+    parser = argparse.ArgumentParser(description="Search the free-text fields of saved reports")
+    parser.add_argument("query", help='terms, "quoted phrases" and prefix* terms')
+    parser.add_argument("--store", default=None, help="report store URL")
+    parser.add_argument("--patient", default=None, help="only this patient ID")
+    parser.add_argument("--since", default=None, help="ISO date, inclusive")
+    parser.add_argument("--until", default=None, help="ISO date, exclusive")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
+    args = parser.parse_args(argv)
+
+    store = open_store(args.store)
+    if not isinstance(store, SQLiteReportStore):
+        parser.error("search requires a sqlite:// report store")
+    hits = store.read(store.indexer(installed).search, args.query, args.patient,
+                      args.since, args.until, args.limit)
+    for hit in hits:
+        print(f"{hit['assessment_date'][:10]}\t{hit['patient_id']}\t#{hit['report_id']}\t{hit['snippet']}")
+    print(f"{len(hits)} reports")
+
+
+if __name__ == "__main__":
+    main()
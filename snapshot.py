@@ -0,0 +1,247 @@
+"""Columnar, memory-mapped snapshot of the numeric fields of saved reports.
+
+Each field is stored as a flat little-endian binary column (``<name>.bin``)
+next to a ``meta.json`` that records the row count, column dtypes, the
+dictionary for each categorical column and the last report ID exported from
+the report store. Columns are opened with ``np.memmap``, so cohort filters
+and aggregates touch only the pages they read:
+
+    snap = Snapshot("patient_data/snapshot")
+    group_e = snap.column("GOLD_group") == snap.code("GOLD_group", "E")
+    high_eos = snap.column("eosinophils") >= 300
+    print((group_e & high_eos).sum())
+
+``refresh`` appends only reports saved since the previous export. Run it
+after saves or on a schedule:
+
+    python snapshot.py refresh
+"""
+import argparse
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from storage import SQLiteReportStore, open_store
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-writer use only
+    fcntl = None
+
+DEFAULT_SNAPSHOT_DIR = "patient_data/snapshot"
+
+# Sentinel for missing integer values and categorical codes
+MISSING = -1
+
+# name -> (dtype, source section of the report, key)
+NUMERIC_COLUMNS = {
+    "report_id": ("<i8", None, None),
+    "assessment_date": ("<i8", None, "assessment_date"),
+    "age": ("<i2", "patient_data", "age"),
+    "pack_years": ("<i2", "patient_data", "pack_years"),
+    "bmi": ("<f4", "patient_data", "bmi"),
+    "mMRC_score": ("i1", "patient_data", "mMRC_score"),
+    "CAT_score": ("i1", "patient_data", "CAT_score"),
+    "exacerbations": ("i1", "patient_data", "exacerbations"),
+    "hospitalization": ("i1", "patient_data", "hospitalization"),
+    "fev1_percent": ("<f4", "patient_data", "fev1_percent"),
+    "fev1_fvc": ("<f4", "patient_data", "fev1_fvc"),
+    "eosinophils": ("<i2", "patient_data", "eosinophils"),
+}
+
+# Dictionary-encoded columns, stored as int8 codes into meta["categories"]
+CATEGORICAL_COLUMNS = {
+    "GOLD_group": ("diagnosis", "GOLD_group"),
+    "gold_stage": ("patient_data", "gold_stage"),
+    "gender": ("patient_data", "gender"),
+    "smoking_status": ("patient_data", "smoking_status"),
+}
+
+CATEGORY_DTYPE = "i1"
+
+
+def _epoch_seconds(value):
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except (TypeError, ValueError):
+        return MISSING
+
+
+class Snapshot:
+    """Read and incrementally extend a columnar snapshot directory"""
+
+    def __init__(self, directory=DEFAULT_SNAPSHOT_DIR):
+        self.directory = Path(directory)
+        self._columns = {}
+        self.meta = self._read_meta()
+
+    # Metadata
+
+    def _read_meta(self):
+        try:
+            with open(self.directory / "meta.json") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            dtypes = {name: spec[0] for name, spec in NUMERIC_COLUMNS.items()}
+            dtypes.update({name: CATEGORY_DTYPE for name in CATEGORICAL_COLUMNS})
+            return {"rows": 0, "last_report_id": 0, "dtypes": dtypes,
+                    "categories": {name: [] for name in CATEGORICAL_COLUMNS}}
+
+    def _write_meta(self):
+        tmp = self.directory / "meta.json.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self.directory / "meta.json")
+
+    @property
+    def rows(self):
+        return self.meta["rows"]
+
+    def reload(self):
+        """Pick up rows appended by another process"""
+        self.meta = self._read_meta()
+        self._columns.clear()
+
+    # Reading
+
+    def column(self, name):
+        """Read-only memory-mapped view of one column"""
+        if name not in self._columns:
+            dtype = np.dtype(self.meta["dtypes"][name])
+            if self.rows == 0:
+                self._columns[name] = np.empty(0, dtype=dtype)
+            else:
+                self._columns[name] = np.memmap(self.directory / f"{name}.bin", dtype=dtype,
+                                                mode="r", shape=(self.rows,))
+        return self._columns[name]
+
+    def code(self, name, value):
+        """Integer code of a categorical value (MISSING if never seen)"""
+        try:
+            return self.meta["categories"][name].index(value)
+        except ValueError:
+            return MISSING
+
+    def categories(self, name):
+        return list(self.meta["categories"][name])
+
+    def decode(self, name, codes):
+        """Map categorical codes back to their values (None for MISSING)"""
+        lookup = np.array(self.meta["categories"][name] + [None], dtype=object)
+        codes = np.asarray(codes)
+        return lookup[np.where(codes == MISSING, len(lookup) - 1, codes)]
+
+    def value_counts(self, name, mask=None):
+        """{value: count} for a categorical column, optionally under a mask"""
+        codes = self.column(name)
+        if mask is not None:
+            codes = codes[mask]
+        counts = np.bincount(codes[codes != MISSING].astype(np.intp),
+                             minlength=len(self.meta["categories"][name]))
+        return dict(zip(self.meta["categories"][name], counts.tolist()))
+
+    # Writing
+
+    @contextmanager
+    def _locked(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / ".lock", "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _encode(self, name, values):
+        categories = self.meta["categories"][name]
+        index = {value: i for i, value in enumerate(categories)}
+        codes = np.empty(len(values), dtype=CATEGORY_DTYPE)
+        for i, value in enumerate(values):
+            if value is None:
+                codes[i] = MISSING
+                continue
+            if value not in index:
+                index[value] = len(categories)
+                categories.append(value)
+            codes[i] = index[value]
+        return codes
+
+    def _numeric(self, name, values):
+        dtype = np.dtype(NUMERIC_COLUMNS[name][0])
+        missing = np.nan if dtype.kind == "f" else MISSING
+        return np.array([missing if v is None else v for v in values], dtype=dtype)
+
+    def append(self, reports):
+        """Append ``(report_id, report)`` pairs; caller holds the lock"""
+        if not reports:
+            return 0
+        fields = {name: [] for name in list(NUMERIC_COLUMNS) + list(CATEGORICAL_COLUMNS)}
+        for report_id, report in reports:
+            for name, (_, section, key) in NUMERIC_COLUMNS.items():
+                if name == "report_id":
+                    value = report_id
+                elif name == "assessment_date":
+                    value = _epoch_seconds(report.get(key))
+                else:
+                    value = (report.get(section) or {}).get(key)
+                fields[name].append(value)
+            for name, (section, key) in CATEGORICAL_COLUMNS.items():
+                fields[name].append((report.get(section) or {}).get(key))
+
+        arrays = {name: self._numeric(name, fields[name]) for name in NUMERIC_COLUMNS}
+        arrays.update({name: self._encode(name, fields[name]) for name in CATEGORICAL_COLUMNS})
+
+        for name, array in arrays.items():
+            path = self.directory / f"{name}.bin"
+            with open(path, "ab") as f:
+                # Drop any tail left by an interrupted append before extending
+                f.truncate(self.rows * array.dtype.itemsize)
+                array.tofile(f)
+
+        self.meta["rows"] += len(reports)
+        self.meta["last_report_id"] = max(self.meta["last_report_id"], reports[-1][0])
+        self._write_meta()
+        self._columns.clear()
+        return len(reports)
+
+    def refresh(self, store, batch_size=5000):
+        """Append every report saved in ``store`` since the last export"""
+        added = 0
+        with self._locked():
+            self.reload()
+            while True:
+                batch = store.reports_after(self.meta["last_report_id"], batch_size)
+                if not batch:
+                    break
+                added += self.append(batch)
+        return added
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Columnar analytics snapshot of saved reports")
+    parser.add_argument("command", choices=["refresh", "summary"])
+    parser.add_argument("--dir", default=DEFAULT_SNAPSHOT_DIR, help="snapshot directory")
+    parser.add_argument("--store", default=None, help="report store URL")
+    args = parser.parse_args(argv)
+
+    snap = Snapshot(args.dir)
+    if args.command == "refresh":
+        store = open_store(args.store)
+        if not isinstance(store, SQLiteReportStore):
+            parser.error("snapshots are exported from a sqlite:// store")
+        added = snap.refresh(store)
+        print(f"Appended {added} reports ({snap.rows} total)")
+    else:
+        print(f"{snap.rows} assessments")
+        for name in CATEGORICAL_COLUMNS:
+            print(f"{name}: {snap.value_counts(name)}")
+
+
+if __name__ == "__main__":
+    main()
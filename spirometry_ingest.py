@@ -0,0 +1,393 @@
+"""Streaming ingest of spirometry results exported by lab devices.
+
+Device exports (CSV, or XML with one element per test) are read record by
+record with generators, so memory stays flat whatever the file size. Each
+record's columns are matched to our fields by ``FIELD_ALIASES``, checked
+against the Clinical Assessment widgets' bounds, scored as on that page
+(FEV1 % predicted and GOLD stage) and upserted into the report database's
+``spirometry_results`` table, which keeps the most recent test per patient
+ID. The Clinical Assessment page offers that result instead of re-keying it.
+
+Predicted FEV1 is taken from the export when it has one, otherwise from the
+reference equations for the exported age, sex and height.
+
+Results are committed in batches together with a checkpoint of how far the
+file was read (a byte offset for CSV, a record count for XML), so a run
+that is interrupted resumes after the last committed batch:
+
+    python spirometry_ingest.py exports/spirometry_2026-10.csv
+    python spirometry_ingest.py exports/*.xml --record-tag Test --rejects rejects.csv
+"""
+import argparse
+import csv
+import re
+import sys
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+from assessment import calculate_fev1_percent, classify_spirometry
+from patient import validate
+from reference_equations import predicted
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_RECORD_TAG = "record"
+
+# Seconds between progress lines
+PROGRESS_INTERVAL = 2.0
+
+# Rejected records printed when no --rejects file is given
+MAX_LOGGED_REJECTS = 20
+
+# Bounds of the Clinical Assessment spirometry inputs
+BOUNDS = {
+    "fev1_actual": (0.0, 10.0),
+    "fev1_predicted": (0.0, 10.0),
+    "fvc": (0.0, 10.0),
+    "fev1_fvc": (0.0, 1.0),
+}
+
+# Field -> export column (or XML element/attribute) names it may arrive
+# under, compared ignoring case and punctuation ("FEV1 Pred" is fev1_pred)
+FIELD_ALIASES = {
+    "patient_id": ("patient_id", "mrn", "id", "subject_id"),
+    "test_date": ("test_date", "date", "test_datetime", "datetime"),
+    "fev1_actual": ("fev1", "fev1_l", "fev1_actual", "fev1_best", "fev1_meas"),
+    "fev1_predicted": ("fev1_pred", "fev1_predicted", "fev1_pred_l", "fev1_ref"),
+    "fvc": ("fvc", "fvc_l", "fvc_best", "fvc_meas"),
+    "fev1_fvc": ("fev1_fvc", "fev1_fvc_ratio", "ratio"),
+    "age": ("age",),
+    "gender": ("gender", "sex"),
+    "height_cm": ("height", "height_cm"),
+}
+
+SEX_CODES = {"m": "Male", "male": "Male", "f": "Female", "female": "Female", "other": "Other"}
+
+# Columns of spirometry_results after patient_id
+RESULT_COLUMNS = ("test_date", "fev1_actual", "fev1_predicted", "predicted_source", "fvc",
+                  "fev1_fvc", "fev1_percent", "gold_stage", "source", "ingested_at")
+
+
+def _normalize(name):
+    return re.sub(r"[^a-z0-9]", "", str(name).lower())
+
+
+ALIASES = {_normalize(alias): field for field, aliases in FIELD_ALIASES.items() for alias in aliases}
+
+
+@lru_cache(maxsize=1024)
+def _field(name):
+    # Exports repeat the same few column names on every record
+    return ALIASES.get(_normalize(name))
+
+
+# Readers: (position after the record, raw fields) per record
+
+def read_csv(path, start=0):
+    """Rows of a CSV export from byte offset ``start``; positions are byte offsets"""
+    with open(path, "rb") as f:
+        header_text = f.readline().decode("utf-8-sig", errors="replace")
+        delimiter = max((",", ";", "\t"), key=header_text.count)
+        header = next(csv.reader([header_text], delimiter=delimiter))
+        if start > f.tell():
+            f.seek(start)
+        position = f.tell()
+
+        def lines():
+            nonlocal position
+            for line in iter(f.readline, b""):
+                position = f.tell()
+                yield line.decode("utf-8", errors="replace")
+
+        for row in csv.reader(lines(), delimiter=delimiter):
+            if any(row):
+                yield position, dict(zip(header, row))
+
+
+def _local(tag):
+    return tag.rpartition("}")[2]
+
+
+def read_xml(path, start=0, record_tag=DEFAULT_RECORD_TAG):
+    """``record_tag`` elements of an XML export after the first ``start``; positions are counts.
+
+    A record's fields are its attributes and the text of its leaf elements.
+    """
+    count = 0
+    # Open elements, outermost first. Finished elements outside a record are
+    # removed from their parent, so the tree stays a single path from the
+    # root however deeply the records are nested in wrapper elements.
+    open_elements = []
+    open_records = 0
+    for event, element in ET.iterparse(path, events=("start", "end")):
+        is_record = _local(element.tag) == record_tag
+        if event == "start":
+            open_elements.append(element)
+            open_records += is_record
+            continue
+        open_elements.pop()
+        if is_record:
+            open_records -= 1
+            count += 1
+            if count > start:
+                raw = dict(element.attrib)
+                for child in element.iter():
+                    if child is not element and len(child) == 0:
+                        raw.setdefault(_local(child.tag), (child.text or "").strip())
+                yield count, raw
+        if not open_records and open_elements:
+            open_elements[-1].remove(element)
+
+
+def read_records(path, start=0, record_tag=DEFAULT_RECORD_TAG):
+    if Path(path).suffix.lower() == ".xml":
+        return read_xml(path, start, record_tag)
+    return read_csv(path, start)
+
+
+# Validation and scoring
+
+def _number(field, value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field}: {value!r} is not a number") from None
+    # Some devices report the ratio as a percentage
+    if field == "fev1_fvc" and 1 < number <= 100:
+        number /= 100
+    low, high = BOUNDS[field]
+    if not low <= number <= high:
+        raise ValueError(f"{field}: {number:g} is outside {low}-{high}")
+    return number
+
+
+def _demographics(values):
+    """(age, sex, height) validated as patient fields, each None if absent"""
+    age, sex, height = values.get("age"), values.get("gender"), values.get("height_cm")
+    try:
+        age = int(float(age)) if age is not None else None
+    except ValueError:
+        raise ValueError(f"age: {age!r} is not a valid int") from None
+    if sex is not None:
+        sex = SEX_CODES.get(sex.lower(), sex)
+    return validate("age", age), validate("gender", sex), validate("height_cm", height)
+
+
+def _values(raw):
+    """{field: stripped text} of a raw record, under the recognized field names"""
+    values = {}
+    for name, value in raw.items():
+        field = _field(name)
+        if field and field not in values and value is not None and str(value).strip():
+            values[field] = str(value).strip()
+    return values
+
+
+def parse_record(raw, default_date):
+    """Spirometry result for one export record; ValueError if it is unusable.
+
+    ``default_date`` (ISO) dates records without a test date.
+    """
+    values = _values(raw)
+    if not values.get("patient_id"):
+        raise ValueError("no patient ID")
+    if "fev1_actual" not in values:
+        raise ValueError("no FEV1")
+
+    numbers = {field: _number(field, values[field]) for field in BOUNDS if field in values}
+    fev1 = numbers["fev1_actual"]
+    if "fev1_fvc" not in numbers and numbers.get("fvc"):
+        if fev1 > numbers["fvc"]:
+            raise ValueError(f"FEV1 {fev1:g} exceeds FVC {numbers['fvc']:g}")
+        numbers["fev1_fvc"] = fev1 / numbers["fvc"]
+
+    fev1_predicted, predicted_source = numbers.get("fev1_predicted"), "export"
+    if fev1_predicted is None:
+        reference = predicted(*_demographics(values))
+        fev1_predicted = reference["fev1_predicted"] if reference else None
+        predicted_source = "reference equations" if reference else None
+    fev1_percent = calculate_fev1_percent(fev1, fev1_predicted) if fev1_predicted else None
+    fev1_percent = validate("fev1_percent", fev1_percent)
+
+    try:
+        test_date = datetime.fromisoformat(values["test_date"]).isoformat()
+    except KeyError:
+        test_date = default_date
+    except ValueError:
+        raise ValueError(f"test_date: {values['test_date']!r} is not an ISO date") from None
+
+    return {
+        "patient_id": values["patient_id"],
+        "test_date": test_date,
+        "fev1_actual": fev1,
+        "fev1_predicted": fev1_predicted,
+        "predicted_source": predicted_source,
+        "fvc": numbers.get("fvc"),
+        "fev1_fvc": numbers.get("fev1_fvc"),
+        "fev1_percent": fev1_percent,
+        "gold_stage": classify_spirometry(fev1_percent)[0] if fev1_percent is not None else None,
+    }
+
+
+# Storage
+
+class SpirometryResults:
+    """Latest ingested test per patient, and ingest checkpoints, in the report database"""
+
+    table = "spirometry_results"
+    checkpoints = "spirometry_checkpoints"
+
+    def create(self, conn):
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                patient_id TEXT PRIMARY KEY,
+                test_date TEXT NOT NULL,
+                fev1_actual REAL NOT NULL,
+                fev1_predicted REAL,
+                predicted_source TEXT,
+                fvc REAL,
+                fev1_fvc REAL,
+                fev1_percent REAL,
+                gold_stage TEXT,
+                source TEXT NOT NULL,
+                ingested_at TEXT NOT NULL
+            ) WITHOUT ROWID
+        """)
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.checkpoints} (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                records INTEGER NOT NULL,
+                updated_at TEXT NOT NULL
+            ) WITHOUT ROWID
+        """)
+
+    def upsert(self, conn, results, source, ingested_at):
+        """Store results by patient ID; a test never replaces a newer one. Returns rows changed."""
+        columns = ", ".join(RESULT_COLUMNS)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in RESULT_COLUMNS)
+        cursor = conn.executemany(
+            f"INSERT INTO {self.table} (patient_id, {columns}) "
+            f"VALUES ({', '.join('?' * (len(RESULT_COLUMNS) + 1))}) "
+            f"ON CONFLICT (patient_id) DO UPDATE SET {updates} "
+            f"WHERE excluded.test_date >= {self.table}.test_date",
+            [(r["patient_id"], *(r[c] for c in RESULT_COLUMNS[:-2]), source, ingested_at)
+             for r in results])
+        return cursor.rowcount
+
+    def latest(self, conn, patient_id):
+        """The stored result for ``patient_id``, or None"""
+        row = conn.execute(f"SELECT {', '.join(RESULT_COLUMNS)} FROM {self.table} "
+                           "WHERE patient_id = ?", (patient_id,)).fetchone()
+        return dict(zip(RESULT_COLUMNS, row), patient_id=patient_id) if row else None
+
+    def checkpoint(self, conn, path):
+        """(file size, position, records) reached in ``path``, or None"""
+        return conn.execute(f"SELECT size, position, records FROM {self.checkpoints} "
+                            "WHERE path = ?", (path,)).fetchone()
+
+    def save_checkpoint(self, conn, path, size, position, records):
+        conn.execute(
+            f"INSERT OR REPLACE INTO {self.checkpoints} (path, size, position, records, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (path, size, position, records, datetime.now().isoformat(timespec="seconds")))
+
+
+def ingest(path, store, batch_size=DEFAULT_BATCH_SIZE, record_tag=DEFAULT_RECORD_TAG,
+           restart=False, rejects=None, log=sys.stderr):
+    """Ingest one export into a SQLite report store, resuming from its checkpoint.
+
+    Rejected records go to the csv writer ``rejects`` when given (else the
+    first few are logged). Returns a dict of counts, seconds and rate.
+    """
+    path = Path(path).resolve()
+    results = SpirometryResults()
+    store.write(results.create)
+    size = path.stat().st_size
+    checkpoint = None if restart else store.read(results.checkpoint, str(path))
+    # A file smaller than at the checkpoint was replaced; start it over
+    if checkpoint is None or size < checkpoint[0]:
+        position, records = 0, 0
+    else:
+        position, records = checkpoint[1:]
+
+    stats = {"file": path.name, "resumed_at": records, "read": 0, "upserted": 0, "rejected": 0}
+    ingested_at = datetime.now().isoformat(timespec="seconds")
+    start = last_report = time.perf_counter()
+    batch = []
+
+    def report_progress():
+        elapsed = time.perf_counter() - start
+        rate = stats["read"] / elapsed if elapsed > 0 else 0.0
+        print(f"{path.name}: {stats['read']} records in {elapsed:.1f}s ({rate:,.0f} records/sec), "
+              f"{stats['upserted']} upserted, {stats['rejected']} rejected", file=log)
+
+    def commit():
+        def write(conn):
+            stats["upserted"] += results.upsert(conn, batch, path.name, ingested_at)
+            results.save_checkpoint(conn, str(path), size, position, records)
+        store.write(write)
+        batch.clear()
+
+    for position, raw in read_records(path, position, record_tag):
+        records += 1
+        stats["read"] += 1
+        try:
+            batch.append(parse_record(raw, ingested_at))
+        except ValueError as e:
+            stats["rejected"] += 1
+            if rejects is not None:
+                patient_id = _values(raw).get("patient_id", "")
+                rejects.writerow([path.name, records, patient_id, str(e)])
+            elif stats["rejected"] <= MAX_LOGGED_REJECTS:
+                print(f"{path.name} record {records}: {e}", file=log)
+        if stats["read"] % batch_size == 0:
+            commit()
+            if time.perf_counter() - last_report >= PROGRESS_INTERVAL:
+                last_report = time.perf_counter()
+                report_progress()
+    commit()
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["records_per_sec"] = stats["read"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+    return stats
+
+
+def main(argv=None):
+    from storage import SQLiteReportStore, open_store
+
+    parser = argparse.ArgumentParser(description="Ingest spirometry exports (CSV or XML) into the report store")
+    parser.add_argument("exports", nargs="+", help="CSV or XML export files")
+    parser.add_argument("--store", default=None, help="report store URL (sqlite:// only)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="records per transaction and checkpoint")
+    parser.add_argument("--record-tag", default=DEFAULT_RECORD_TAG,
+                        help="XML element holding one test")
+    parser.add_argument("--restart", action="store_true", help="ignore checkpoints and read from the start")
+    parser.add_argument("--rejects", help="write rejected records and reasons to this CSV file")
+    args = parser.parse_args(argv)
+
+    store = open_store(args.store)
+    if not isinstance(store, SQLiteReportStore):
+        parser.error("spirometry ingest requires a sqlite:// report store")
+
+    rejects_file = open(args.rejects, "w", newline="") if args.rejects else None
+    try:
+        rejects = csv.writer(rejects_file) if rejects_file else None
+        if rejects:
+            rejects.writerow(["file", "record", "patient_id", "error"])
+        for export in args.exports:
+            stats = ingest(export, store, args.batch_size, args.record_tag, args.restart, rejects)
+            resumed = f" (resumed after record {stats['resumed_at']})" if stats["resumed_at"] else ""
+            print(f"{stats['file']}: {stats['read']} records{resumed}, {stats['upserted']} upserted, "
+                  f"{stats['rejected']} rejected, {stats['records_per_sec']:,.0f} records/sec")
+    finally:
+        if rejects_file:
+            rejects_file.close()
+
+
+if __name__ == "__main__":
+    main()
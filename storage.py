@@ -0,0 +1,332 @@
+"""Storage backends for saved assessment reports.
+
+The default backend is a SQLite database in WAL mode with indexes on patient
+ID, assessment date and GOLD group, so a patient's history is an index range
+scan instead of a directory walk, and several Streamlit sessions (or server
+processes) can save concurrently. The original one-JSON-file-per-report
+layout remains available as ``JSONDirectoryStore``.
+
+The backend is chosen with the ``COPD_REPORT_STORE`` environment variable:
+
+    sqlite:///patient_data/reports.db   (default, relative path)
+    sqlite:////var/lib/copd/reports.db  (absolute path)
+    json:///patient_data
+
+Existing JSON report directories can be imported once with:
+
+    python storage.py migrate patient_data
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+
+from analytics import CohortAggregates, CohortDensity
+from search import ReportSearch
+from trajectory import Trajectories
+
+DEFAULT_STORE_URL = "sqlite:///patient_data/reports.db"
+
+
+class ReportStore(ABC):
+    """Interface shared by all report storage backends"""
+
+    @abstractmethod
+    def save(self, report, source=None, text=None):
+        """Persist one report; returns a reference string for display.
+
+        ``text`` is the report already serialized as JSON, stored as-is to
+        avoid encoding it twice.
+        """
+
+    @abstractmethod
+    def history(self, patient_id):
+        """All reports for a patient, oldest first"""
+
+    @abstractmethod
+    def find(self, GOLD_group=None, since=None, until=None, limit=None):
+        """Reports filtered by group and ISO assessment-date range"""
+
+    def iter_reports(self, batch_size=1000):
+        """(report_id, report) for every stored report, without loading all at once"""
+        yield from enumerate(self.find(), 1)
+
+    @abstractmethod
+    def count(self):
+        """Number of stored reports"""
+
+    def close(self):
+        pass
+
+
+def _report_keys(report):
+    patient = report.get("patient_data") or {}
+    diagnosis = report.get("diagnosis") or {}
+    return (patient.get("patient_id") or "",
+            report.get("assessment_date") or datetime.now().isoformat(),
+            diagnosis.get("GOLD_group"))
+
+
+class SQLiteReportStore(ReportStore):
+    """Reports in one SQLite table, indexed for patient, date and group lookups"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id TEXT NOT NULL,
+            assessment_date TEXT NOT NULL,
+            GOLD_group TEXT,
+            source TEXT UNIQUE,
+            report TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_reports_patient
+            ON reports (patient_id, assessment_date);
+        CREATE INDEX IF NOT EXISTS idx_reports_date
+            ON reports (assessment_date);
+        CREATE INDEX IF NOT EXISTS idx_reports_group
+            ON reports (GOLD_group, assessment_date);
+    """
+
+    def __init__(self, path, indexers=()):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        # Streamlit serves each session on its own thread; sqlite3
+        # connections must not be shared between threads.
+        self._local = threading.local()
+        self._connect().executescript(self.SCHEMA)
+        # Indexers maintain derived tables inside each save transaction
+        self.indexers = list(indexers)
+        for indexer in self.indexers:
+            self._install(indexer)
+
+    def _install(self, indexer):
+        """Create an indexer's tables, backfilling them from existing reports"""
+        def install(conn):
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (indexer.table,)).fetchone()
+            indexer.create(conn)
+            if not exists:
+                for report_id, report in conn.execute("SELECT id, report FROM reports ORDER BY id"):
+                    indexer.update(conn, report_id, json.loads(report))
+        self.write(install)
+
+    def indexer(self, kind):
+        """The installed indexer of class ``kind``, or None"""
+        return next((i for i in self.indexers if isinstance(i, kind)), None)
+
+    def read(self, query, *args):
+        """Run ``query(conn, *args)`` on this thread's connection"""
+        return query(self._connect(), *args)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def write(self, statements):
+        """Run ``statements(conn)`` in one IMMEDIATE transaction on this thread's connection"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = statements(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def _insert(self, conn, report, source, text=None):
+        patient_id, assessment_date, group = _report_keys(report)
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO reports "
+            "(patient_id, assessment_date, GOLD_group, source, report) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (patient_id, assessment_date, group, source, text or json.dumps(report)))
+        if not cursor.rowcount:
+            return None
+        for indexer in self.indexers:
+            indexer.update(conn, cursor.lastrowid, report)
+        return cursor.lastrowid
+
+    def save(self, report, source=None, text=None):
+        report_id = self.write(lambda conn: self._insert(conn, report, source, text))
+        return f"{self.path}#{report_id}"
+
+    def save_many(self, reports):
+        """Insert (report, source) pairs in one transaction; returns new rows"""
+        def insert_all(conn):
+            return sum(self._insert(conn, report, source) is not None
+                       for report, source in reports)
+        return self.write(insert_all)
+
+    def _select(self, where="", params=(), limit=None):
+        sql = f"SELECT report FROM reports {where} ORDER BY assessment_date, id"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        rows = self._connect().execute(sql, params)
+        return [json.loads(report) for (report,) in rows]
+
+    def history(self, patient_id):
+        return self._select("WHERE patient_id = ?", (patient_id,))
+
+    def find(self, GOLD_group=None, since=None, until=None, limit=None):
+        clauses, params = [], []
+        if GOLD_group is not None:
+            clauses.append("GOLD_group = ?")
+            params.append(GOLD_group)
+        if since is not None:
+            clauses.append("assessment_date >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("assessment_date < ?")
+            params.append(until)
+        where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+        return self._select(where, params, limit)
+
+    def reports_after(self, report_id, limit):
+        """Up to ``limit`` (id, report) pairs saved after ``report_id``"""
+        rows = self._connect().execute(
+            "SELECT id, report FROM reports WHERE id > ? ORDER BY id LIMIT ?",
+            (report_id, limit))
+        return [(row_id, json.loads(report)) for row_id, report in rows]
+
+    def iter_reports(self, batch_size=1000):
+        last_id = 0
+        while True:
+            batch = self.reports_after(last_id, batch_size)
+            if not batch:
+                return
+            yield from batch
+            last_id = batch[-1][0]
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+
+    def version(self):
+        """Highest report id, which changes with every saved report (ids are
+        never reused); the cache key for everything derived from the store"""
+        return self._connect().execute("SELECT MAX(id) FROM reports").fetchone()[0] or 0
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class JSONDirectoryStore(ReportStore):
+    """Legacy layout: one indented JSON file per report"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def save(self, report, source=None, text=None):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        suffix = 0
+        while True:
+            name = f"patient_{timestamp}.json" if not suffix else f"patient_{timestamp}_{suffix}.json"
+            filename = self.directory / name
+            try:
+                # "x" fails instead of overwriting a save from the same second
+                with open(filename, 'x') as f:
+                    if text is None:
+                        json.dump(report, f, indent=4)
+                    else:
+                        f.write(text)
+                return str(filename)
+            except FileExistsError:
+                suffix += 1
+
+    def _all(self):
+        for filename in sorted(self.directory.glob("patient_*.json")):
+            with open(filename) as f:
+                yield json.load(f)
+
+    def history(self, patient_id):
+        reports = [r for r in self._all() if _report_keys(r)[0] == patient_id]
+        return sorted(reports, key=lambda r: _report_keys(r)[1])
+
+    def find(self, GOLD_group=None, since=None, until=None, limit=None):
+        matches = []
+        for report in self._all():
+            _, assessment_date, group = _report_keys(report)
+            if GOLD_group is not None and group != GOLD_group:
+                continue
+            if since is not None and assessment_date < since:
+                continue
+            if until is not None and assessment_date >= until:
+                continue
+            matches.append(report)
+        matches.sort(key=lambda r: _report_keys(r)[1])
+        return matches[:limit] if limit is not None else matches
+
+    def iter_reports(self, batch_size=1000):
+        yield from enumerate(self._all(), 1)
+
+    def count(self):
+        return sum(1 for _ in self.directory.glob("patient_*.json"))
+
+
+def open_store(url=None):
+    """Open the backend named by ``url`` or ``COPD_REPORT_STORE``"""
+    url = url or os.environ.get("COPD_REPORT_STORE", DEFAULT_STORE_URL)
+    scheme, _, path = url.partition("://")
+    # sqlite:///relative/path and sqlite:////absolute/path, as in SQLAlchemy
+    path = path[1:] if path.startswith("/") else path
+    if scheme == "sqlite":
+        indexers = [CohortAggregates(), CohortDensity(), Trajectories(), ReportSearch()]
+        return SQLiteReportStore(path, indexers=indexers)
+    if scheme == "json":
+        return JSONDirectoryStore(path)
+    raise ValueError(f"Unsupported report store: {url}")
+
+
+def migrate_json_dir(directory, store, batch_size=1000):
+    """Import ``patient_*.json`` reports from a directory into ``store``.
+
+    Each file's path is recorded as the report source, so running the
+    migration again does not create duplicates. Returns the number of
+    reports imported.
+    """
+    imported = 0
+    batch = []
+    for filename in sorted(Path(directory).glob("patient_*.json")):
+        with open(filename) as f:
+            batch.append((json.load(f), str(filename.resolve())))
+        if len(batch) >= batch_size:
+            imported += store.save_many(batch)
+            batch = []
+    if batch:
+        imported += store.save_many(batch)
+    return imported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report store maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate = commands.add_parser("migrate", help="import a directory of JSON reports")
+    migrate.add_argument("directory", help="directory containing patient_*.json files")
+    migrate.add_argument("--store", default=None,
+                         help=f"target store URL (default: $COPD_REPORT_STORE or {DEFAULT_STORE_URL})")
+    args = parser.parse_args(argv)
+
+    store = open_store(args.store)
+    if not isinstance(store, SQLiteReportStore):
+        parser.error("migration target must be a sqlite:// store")
+    imported = migrate_json_dir(args.directory, store)
+    print(f"Imported {imported} reports into {store.path} ({store.count()} total)")
+
+
+if __name__ == "__main__":
+    main()
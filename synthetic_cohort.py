@@ -0,0 +1,243 @@
+"""Synthetic COPD cohorts for load and scale testing (no real patient data).
+
+Patients are generated a chunk at a time with NumPy, so millions of rows
+stream out in constant memory. Fields are drawn jointly rather than
+independently: a latent disease-severity score, raised by smoking exposure
+and age, drives FEV1 % predicted, FEV1/FVC, dyspnea, the CAT items,
+exacerbations, hospitalization and CXR findings; eosinophils raise
+exacerbation risk and asthma overlap. With ``--visits`` each patient gets a
+series of assessments six months apart with a per-patient FEV1 decline, for
+the trend indexer.
+
+Output is either the batch-assessment input layout (CSV, with the eight CAT
+items, ``height_cm`` and ``fev1_actual``/``fev1_predicted``, the predicted
+value from ``reference_equations.py``) or fully assessed reports in
+the saved-report JSON layout, as JSON lines or straight into a report store:
+
+    python synthetic_cohort.py 1000000 --csv cohort.csv
+    python synthetic_cohort.py 100000 --visits 4 --jsonl reports.jsonl
+    python synthetic_cohort.py 100000 --visits 4 --store sqlite:///load/reports.db
+
+The same seed and chunk size always produce the same cohort.
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from assessment import CAT_ITEMS
+from patient import COMORBIDITY_OPTIONS, CXR_FINDING_OPTIONS, GENDER_OPTIONS, SMOKING_OPTIONS
+from reference_equations import SEXES, predicted_batch
+
+START_DATE = datetime(2024, 1, 1)
+VISIT_INTERVAL_DAYS = 182
+
+GENDER_WEIGHTS = (0.55, 0.44, 0.01)
+SMOKING_WEIGHTS = (0.35, 0.55, 0.10)
+
+# Base prevalence of each comorbidity (in COMORBIDITY_OPTIONS order) at age 65
+COMORBIDITY_PREVALENCE = (0.30, 0.20, 0.10, 0.45, 0.20, 0.15)
+
+# Free-text medication lists, mildest regimen first
+MEDICATION_LISTS = (
+    "",
+    "Albuterol inhaler as needed",
+    "Spiriva Respimat",
+    "Anoro Ellipta",
+    "Stiolto Respimat, albuterol",
+    "Symbicort, Spiriva",
+    "Trelegy Ellipta",
+    "Breztri Aerosphere, metoprolol 50 mg",
+    "Trelegy Ellipta, Spiriva",
+)
+
+# Batch-assessment CSV columns, in order
+CSV_COLUMNS = (["patient_id", "assessment_date", "age", "gender", "smoking_status",
+                "pack_years", "bmi", "height_cm", "comorbidities", "current_medications", "mMRC_score"]
+               + CAT_ITEMS
+               + ["exacerbations", "hospitalization", "fev1_actual", "fev1_predicted",
+                  "fev1_fvc", "eosinophils", "cxr_findings", "cxr_notes", "other_labs"])
+
+
+def _sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+def _join_flags(flags, names):
+    """'; '-joined names of the True columns of a boolean matrix, per row"""
+    codes = flags @ (1 << np.arange(flags.shape[1]))
+    labels = {code: "; ".join(n for j, n in enumerate(names) if code >> j & 1)
+              for code in np.unique(codes).tolist()}
+    return np.array([labels[code] for code in codes.tolist()], dtype=object)
+
+
+def generate(patients, rng, first_id=0, visits=1, prefix="SYN"):
+    """DataFrame of ``patients * visits`` rows in the batch-assessment layout"""
+    n = patients
+
+    # Demographics and exposure
+    gender = np.array(GENDER_OPTIONS, dtype=object)[rng.choice(3, n, p=GENDER_WEIGHTS)]
+    male = gender == "Male"
+    age = np.clip(rng.normal(66, 9, n), 40, 92)
+    smoking_code = rng.choice(3, n, p=SMOKING_WEIGHTS)
+    never = smoking_code == 2
+    pack_years = np.where(never, 0, np.clip(rng.gamma(4, 10, n), 1, 150)).round()
+    height = np.where(male, rng.normal(175, 7, n), rng.normal(162, 6.5, n))
+
+    # Latent severity (standard-normal-ish) and yearly FEV1 decline
+    severity = rng.normal(0, 1, n) + 0.012 * (pack_years - 35) + 0.02 * (age - 66)
+    decline = rng.normal(-1.5, 2.0, n) - 0.5 * (smoking_code == 0)
+    eosinophils = np.clip(np.round(rng.lognormal(5.1, 0.6, n), -1), 0, 2000)
+    base_bmi = rng.normal(26.5, 4.5, n)
+
+    comorbid_p = np.array(COMORBIDITY_PREVALENCE) * np.exp(0.02 * (age - 65))[:, None]
+    comorbid_p[:, 2] *= np.where(eosinophils >= 300, 2.0, 0.8)     # asthma overlap
+    comorbid_p[:, 5] *= np.where(male, 0.5, 1.6)                    # osteoporosis
+    comorbidities = _join_flags(rng.random((n, len(COMORBIDITY_OPTIONS))) < comorbid_p,
+                                COMORBIDITY_OPTIONS)
+
+    rows = []
+    for visit in range(visits):
+        years = visit * VISIT_INTERVAL_DAYS / 365.25
+        visit_age = age + years
+        fev1_percent = np.clip(60 - 18 * severity + decline * years + rng.normal(0, 3, n), 12, 120)
+        # Reference equations by sex; the mean of both for "Other"
+        male_fev1, female_fev1 = (predicted_batch(visit_age, np.full(n, sex, dtype=object),
+                                                  height)["fev1_predicted"] for sex in SEXES)
+        fev1_predicted = np.select([male, gender == "Female"], [male_fev1, female_fev1],
+                                   (male_fev1 + female_fev1) / 2)
+        fev1_fvc = np.clip(0.42 + 0.0025 * fev1_percent + rng.normal(0, 0.05, n), 0.2, 0.95)
+
+        # Symptoms follow airflow limitation, with individual variation
+        symptoms = (65 - fev1_percent) / 20 + rng.normal(0, 0.9, n)
+        mMRC = np.digitize(symptoms, [-0.6, 0.5, 1.5, 2.5])
+        cat_p = _sigmoid(0.9 * symptoms[:, None] - 0.5 + rng.normal(0, 0.6, (n, len(CAT_ITEMS))))
+        cat_items = rng.binomial(5, cat_p)
+
+        exacerbation_rate = np.exp(-1.0 + 0.55 * severity + 0.35 * (eosinophils >= 300))
+        exacerbations = np.minimum(rng.poisson(exacerbation_rate), 20)
+        hospitalization = rng.random(n) < _sigmoid(-3.2 + 0.9 * exacerbations)
+        bmi = np.clip(base_bmi - 1.5 * np.maximum(severity, 0) + rng.normal(0, 0.5, n), 10, 50)
+
+        regimen = np.clip(np.round(1 + 2.2 * severity + exacerbations + rng.normal(0, 1.5, n)),
+                          0, len(MEDICATION_LISTS) - 1).astype(int)
+        # One column per CXR_FINDING_OPTIONS entry except "No significant findings"
+        findings = np.column_stack([
+            rng.random(n) < _sigmoid(1.2 * severity - 0.2),     # Hyperinflation
+            rng.random(n) < _sigmoid(1.2 * severity - 1.0),     # Flattened diaphragm
+            rng.random(n) < _sigmoid(severity - 2.5),           # Bullae
+            rng.random(n) < _sigmoid(severity - 1.5),           # Increased retrosternal airspace
+            rng.random(n) < _sigmoid(severity - 2.0),           # Narrow cardiac silhouette
+            rng.random(n) < 0.25 + 0.2 * (exacerbations > 0),   # Bronchial wall thickening
+        ])
+        cxr_findings = _join_flags(findings, CXR_FINDING_OPTIONS[:-1])
+        cxr_findings[cxr_findings == ""] = CXR_FINDING_OPTIONS[-1]
+
+        date = START_DATE + pd.Timedelta(days=visit * VISIT_INTERVAL_DAYS)
+        frame = pd.DataFrame({
+            "patient_id": [f"{prefix}-{i:08d}" for i in range(first_id, first_id + n)],
+            "assessment_date": (date + pd.to_timedelta(rng.integers(0, 28, n), unit="D")).strftime(
+                "%Y-%m-%dT%H:%M:%S"),
+            "age": np.floor(visit_age).astype(int),
+            "gender": gender,
+            "smoking_status": np.array(SMOKING_OPTIONS, dtype=object)[smoking_code],
+            "pack_years": pack_years.astype(int),
+            "bmi": bmi.round(1),
+            "height_cm": height.round(1),
+            "comorbidities": comorbidities,
+            "current_medications": np.array(MEDICATION_LISTS, dtype=object)[regimen],
+            "mMRC_score": mMRC,
+            **{item: cat_items[:, j] for j, item in enumerate(CAT_ITEMS)},
+            "exacerbations": exacerbations,
+            "hospitalization": hospitalization,
+            "fev1_actual": (fev1_percent / 100 * fev1_predicted).round(2),
+            "fev1_predicted": fev1_predicted.round(2),
+            "fev1_fvc": fev1_fvc.round(2),
+            "eosinophils": eosinophils.astype(int),
+            "cxr_findings": cxr_findings,
+            "cxr_notes": "",
+            "other_labs": "",
+        }, columns=CSV_COLUMNS)
+        rows.append(frame)
+    return pd.concat(rows, ignore_index=True) if visits > 1 else rows[0]
+
+
+def iter_cohort(size, seed=0, chunk_size=100000, visits=1):
+    """Yield DataFrames covering ``size`` patients, ``chunk_size`` at a time"""
+    for index, first in enumerate(range(0, size, chunk_size)):
+        rng = np.random.default_rng([seed, index])
+        yield generate(min(chunk_size, size - first), rng, first, visits, prefix=f"SYN{seed}")
+
+
+def write_csv(chunks, path):
+    rows = 0
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+        rows += len(chunk)
+    return rows
+
+
+def iter_reports(chunks):
+    """Assessed reports in the saved-report layout, chunk by chunk"""
+    from batch_assess import chunk_reports, normalize_chunk
+
+    for chunk in chunks:
+        yield from chunk_reports(normalize_chunk(chunk))
+
+
+def write_jsonl(chunks, path):
+    rows = 0
+    with open(path, "w") as f:
+        for report in iter_reports(chunks):
+            f.write(json.dumps(report))
+            f.write("\n")
+            rows += 1
+    return rows
+
+
+def load_store(chunks, url, batch_size=5000):
+    from storage import open_store
+
+    store = open_store(url)
+    batch, rows = [], 0
+    for report in iter_reports(chunks):
+        batch.append((report, None))
+        if len(batch) >= batch_size:
+            rows += store.save_many(batch)
+            batch = []
+    if batch:
+        rows += store.save_many(batch)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic COPD cohort")
+    parser.add_argument("patients", type=int, help="number of patients")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--csv", help="batch-assessment input CSV")
+    output.add_argument("--jsonl", help="assessed reports, one JSON object per line")
+    output.add_argument("--store", help="assess and save reports to this report store URL")
+    parser.add_argument("--visits", type=int, default=1, help="assessments per patient")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=100000, help="patients generated at a time")
+    args = parser.parse_args(argv)
+
+    chunks = iter_cohort(args.patients, args.seed, args.chunk_size, args.visits)
+    start = time.perf_counter()
+    if args.csv:
+        rows = write_csv(chunks, args.csv)
+    elif args.jsonl:
+        rows = write_jsonl(chunks, args.jsonl)
+    else:
+        rows = load_store(chunks, args.store)
+    elapsed = time.perf_counter() - start
+    print(f"{rows:,} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:,.0f} rows/sec)",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""Per-patient trends across saved assessments.
+
+Reports are linked by ``patient_id`` into a time series. ``Trajectories`` is
+a report-store indexer (like ``analytics.CohortAggregates``): for every
+patient and metric it keeps the running sums of an ordinary least-squares
+fit of value against time (n, Σt, Σy, Σt², Σty), so saving a report updates
+the slope with a few additions instead of refitting the patient's history.
+Time is in years since the patient's first saved assessment, which keeps the
+sums small enough that the fit does not lose precision.
+
+A patient is flagged when a trend worsens faster than ``THRESHOLDS`` allows
+over at least ``MIN_POINTS`` assessments spanning ``MIN_SPAN_YEARS``. The
+flag is stored with the trend and indexed, so listing every rapid FEV1
+decliner is an index lookup:
+
+    python trajectory.py decliners
+    python trajectory.py patient MRN-004217
+"""
+import argparse
+from datetime import datetime
+
+DAYS_PER_YEAR = 365.25
+
+# metric -> (label, unit, worsening slope per year); FEV1 worsens by
+# falling, CAT and exacerbations by rising
+THRESHOLDS = {
+    "fev1_percent": ("FEV1 % predicted", "%/yr", -2.0),
+    "CAT_score": ("CAT score", "points/yr", 2.0),
+    "exacerbations": ("Exacerbations", "per yr", 1.0),
+}
+
+MIN_POINTS = 3
+MIN_SPAN_YEARS = 1.0
+
+TREND_COLUMNS = ("n", "origin", "sum_t", "sum_y", "sum_tt", "sum_ty",
+                 "min_t", "max_t", "last_t", "last_y", "slope", "rapid")
+
+
+def slope(n, sum_t, sum_y, sum_tt, sum_ty):
+    """Least-squares slope from running sums, or None with too few distinct times"""
+    denominator = n * sum_tt - sum_t * sum_t
+    if n < 2 or abs(denominator) < 1e-12:
+        return None
+    return (n * sum_ty - sum_t * sum_y) / denominator
+
+
+def is_rapid(metric, n, span, trend_slope):
+    """True if ``metric`` worsens faster than its threshold"""
+    if trend_slope is None or n < MIN_POINTS or span < MIN_SPAN_YEARS:
+        return False
+    threshold = THRESHOLDS[metric][2]
+    return trend_slope <= threshold if threshold < 0 else trend_slope >= threshold
+
+
+def _years(origin, date):
+    return (datetime.fromisoformat(date) - datetime.fromisoformat(origin)).days / DAYS_PER_YEAR
+
+
+def add_point(trend, metric, date, value):
+    """Trend dict (TREND_COLUMNS) with one more observation; ``trend`` may be None"""
+    if trend is None:
+        trend = dict(n=0, origin=date, sum_t=0.0, sum_y=0.0, sum_tt=0.0, sum_ty=0.0,
+                     min_t=0.0, max_t=0.0, last_t=None, last_y=None)
+    else:
+        trend = dict(trend)
+    t, y = _years(trend["origin"], date), float(value)
+    trend["n"] += 1
+    trend["sum_t"] += t
+    trend["sum_y"] += y
+    trend["sum_tt"] += t * t
+    trend["sum_ty"] += t * y
+    trend["min_t"] = min(trend["min_t"], t)
+    trend["max_t"] = max(trend["max_t"], t)
+    # Reports may arrive out of date order; keep the latest by date
+    if trend["last_t"] is None or t >= trend["last_t"]:
+        trend["last_t"], trend["last_y"] = t, y
+    trend["slope"] = slope(trend["n"], trend["sum_t"], trend["sum_y"],
+                           trend["sum_tt"], trend["sum_ty"])
+    trend["rapid"] = is_rapid(metric, trend["n"], trend["max_t"] - trend["min_t"], trend["slope"])
+    return trend
+
+
+class Trajectories:
+    """Report-store indexer keeping a running trend per patient and metric"""
+
+    table = "patient_trajectories"
+
+    def create(self, conn):
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                patient_id TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                n INTEGER NOT NULL,
+                origin TEXT NOT NULL,
+                sum_t REAL NOT NULL,
+                sum_y REAL NOT NULL,
+                sum_tt REAL NOT NULL,
+                sum_ty REAL NOT NULL,
+                min_t REAL NOT NULL,
+                max_t REAL NOT NULL,
+                last_t REAL,
+                last_y REAL,
+                slope REAL,
+                rapid INTEGER NOT NULL,
+                PRIMARY KEY (patient_id, metric)
+            ) WITHOUT ROWID
+        """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_rapid "
+                     f"ON {self.table} (metric, slope) WHERE rapid = 1")
+
+    def update(self, conn, report_id, report):
+        patient = report.get("patient_data") or {}
+        patient_id, date = patient.get("patient_id"), report.get("assessment_date")
+        if not patient_id or not date:
+            return
+        for metric in THRESHOLDS:
+            if patient.get(metric) is None:
+                continue
+            row = conn.execute(
+                f"SELECT {', '.join(TREND_COLUMNS)} FROM {self.table} "
+                "WHERE patient_id = ? AND metric = ?", (patient_id, metric)).fetchone()
+            trend = add_point(dict(zip(TREND_COLUMNS, row)) if row else None,
+                              metric, date, patient[metric])
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (patient_id, metric, {', '.join(TREND_COLUMNS)}) "
+                f"VALUES (?, ?, {', '.join('?' * len(TREND_COLUMNS))})",
+                (patient_id, metric, *(trend[c] for c in TREND_COLUMNS)))
+
+    def patient(self, conn, patient_id):
+        """{metric: trend} for one patient's saved assessments"""
+        rows = conn.execute(
+            f"SELECT metric, n, max_t - min_t, last_y, slope, rapid FROM {self.table} "
+            "WHERE patient_id = ?", (patient_id,))
+        trends = {metric: {"points": n, "span_years": span, "latest": latest,
+                           "slope": trend_slope, "rapid": bool(rapid)}
+                  for metric, n, span, latest, trend_slope, rapid in rows}
+        return {metric: trends[metric] for metric in THRESHOLDS if metric in trends}
+
+    def series(self, conn, patient_id):
+        """{metric: (dates, values)} of one patient's saved assessments, oldest first"""
+        columns = ", ".join(f"json_extract(report, '$.patient_data.{metric}')" for metric in THRESHOLDS)
+        rows = conn.execute(
+            f"SELECT assessment_date, {columns} FROM reports "
+            "WHERE patient_id = ? ORDER BY assessment_date", (patient_id,)).fetchall()
+        series = {}
+        for i, metric in enumerate(THRESHOLDS, 1):
+            points = [(row[0], row[i]) for row in rows if row[i] is not None]
+            if points:
+                series[metric] = tuple(map(list, zip(*points)))
+        return series
+
+    def rapid(self, conn, metric="fev1_percent", limit=None):
+        """Flagged patients for ``metric``, fastest worsening first"""
+        order = "ASC" if THRESHOLDS[metric][2] < 0 else "DESC"
+        sql = (f"SELECT patient_id, n, max_t - min_t, last_y, slope FROM {self.table} "
+               f"WHERE metric = ? AND rapid = 1 ORDER BY slope {order}")
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [{"patient_id": patient_id, "points": n, "span_years": span,
+                 "latest": latest, "slope": trend_slope}
+                for patient_id, n, span, latest, trend_slope in conn.execute(sql, (metric,))]
+
+
+def main(argv=None):
+    from storage import SQLiteReportStore, open_store
+    # The store's indexer is trajectory.Trajectories, not __main__'s copy
+    from trajectory import Trajectories as installed
+
+    parser = argparse.ArgumentParser(description="Patient trends across saved assessments")
+    parser.add_argument("--store", default=None, help="report store URL")
+    commands = parser.add_subparsers(dest="command", required=True)
+    decliners = commands.add_parser("decliners", help="list patients flagged for rapid worsening")
+    decliners.add_argument("--metric", choices=list(THRESHOLDS), default="fev1_percent")
+    decliners.add_argument("--limit", type=int, default=None)
+    patient = commands.add_parser("patient", help="show one patient's trends")
+    patient.add_argument("patient_id")
+    args = parser.parse_args(argv)
+
+    store = open_store(args.store)
+    if not isinstance(store, SQLiteReportStore):
+        parser.error("trends require a sqlite:// report store")
+    trajectories = store.indexer(installed)
+
+    if args.command == "decliners":
+        label, unit, _ = THRESHOLDS[args.metric]
+        rows = store.read(trajectories.rapid, args.metric, args.limit)
+        for row in rows:
+            print(f"{row['patient_id']}\t{row['slope']:+.2f} {unit}\t"
+                  f"{row['points']} assessments over {row['span_years']:.1f} yr\t"
+                  f"latest {row['latest']:g}")
+        print(f"{len(rows)} patients flagged for {label}")
+    else:
+        trends = store.read(trajectories.patient, args.patient_id)
+        for metric, trend in trends.items():
+            label, unit, _ = THRESHOLDS[metric]
+            rate = "n/a" if trend["slope"] is None else f"{trend['slope']:+.2f} {unit}"
+            print(f"{label:<18} {rate:<16} {trend['points']} points"
+                  f"{'  RAPID' if trend['rapid'] else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,915 @@
+"""Page rendering for the Streamlit app.
+
+``app.py`` is re-executed on every widget interaction, while this module is
+imported once per server process. Constant tables, cached resources and the
+per-page render functions therefore live here, and each rerun only runs the
+function for the selected page.
+"""
+
+from datetime import timedelta
+
+import streamlit as st
+
+from analytics import FEV1_BIN_WIDTH, CohortAggregates, CohortDensity
+from assessment import (
+    MMRC_SCALE,
+    OBSTRUCTION_RATIO,
+    airflow_obstruction,
+    build_report,
+    calculate_CAT_score,
+    calculate_fev1_percent,
+    calculate_mMRC_score,
+    classify_spirometry,
+)
+from charts import cat_items_figure, cohort_density_figure, trend_figure
+from export import ReportExporter
+from knowledge_base import current as current_knowledge_base
+from metrics import timed
+from patient import COMORBIDITY_OPTIONS, CXR_FINDING_OPTIONS, GENDER_OPTIONS, SMOKING_OPTIONS
+from policy_simulation import (
+    DEFAULT_REFERENCE,
+    DEFAULT_REPLICATES,
+    POLICIES,
+    POLICY_DESCRIPTIONS,
+    cohort_from_store,
+    simulate,
+)
+from recommendations import cached_bundle
+from recommendations import stats as recommendation_cache_stats
+from reference_equations import predicted as reference_values
+from search import DEFAULT_LIMIT as SEARCH_LIMIT
+from search import ReportSearch
+from spirometry_ingest import SpirometryResults
+from storage import SQLiteReportStore, open_store
+from trajectory import MIN_POINTS, MIN_SPAN_YEARS, THRESHOLDS, Trajectories
+
+# Custom CSS
+CUSTOM_CSS = """
+<style>
+    .main-header {
+        font-size: 2.5rem;
+        color: #1f77b4;
+        text-align: center;
+        margin-bottom: 2rem;
+    }
+    .section-header {
+        font-size: 1.5rem;
+        color: #2c3e50;
+        margin-top: 1rem;
+        margin-bottom: 1rem;
+        border-bottom: 2px solid #1f77b4;
+        padding-bottom: 0.5rem;
+    }
+    .info-box {
+        background-color: #e3f2fd;
+        padding: 1rem;
+        border-radius: 0.5rem;
+        margin: 1rem 0;
+    }
+    .warning-box {
+        background-color: #fff3cd;
+        padding: 1rem;
+        border-radius: 0.5rem;
+        margin: 1rem 0;
+        border-left: 4px solid #ffc107;
+    }
+    .success-box {
+        background-color: #d4edda;
+        padding: 1rem;
+        border-radius: 0.5rem;
+        margin: 1rem 0;
+        border-left: 4px solid #28a745;
+    }
+    .stButton>button {
+        width: 100%;
+        background-color: #1f77b4;
+        color: white;
+    }
+</style>
+"""
+
+# Widget options (the others are defined with the patient record schema)
+MMRC_OPTIONS = tuple(MMRC_SCALE)
+
+# Knowledge Base reference tables
+SPIROMETRY_TABLE = [
+    {"GOLD Stage": "GOLD 1", "Severity": "Mild", "FEV1 % Predicted": "≥80%"},
+    {"GOLD Stage": "GOLD 2", "Severity": "Moderate", "FEV1 % Predicted": "50-79%"},
+    {"GOLD Stage": "GOLD 3", "Severity": "Severe", "FEV1 % Predicted": "30-49%"},
+    {"GOLD Stage": "GOLD 4", "Severity": "Very Severe", "FEV1 % Predicted": "<30%"}
+]
+
+EOSINOPHIL_TABLE = [
+    {"Eosinophil Count": "<100 cells/μL", "ICS Benefit": "Minimal", "Risk": "Higher pneumonia risk"},
+    {"Eosinophil Count": "100-300 cells/μL", "ICS Benefit": "Moderate", "Risk": "Intermediate"},
+    {"Eosinophil Count": "≥300 cells/μL", "ICS Benefit": "High", "Risk": "Consider triple therapy"}
+]
+
+# Load COPD knowledge base. Not st.cache_resource: the knowledge base module
+# already shares one immutable object and swaps it when the files change.
+@timed("load_knowledge_base")
+def load_knowledge_base():
+    """Load COPD treatment guidelines from the knowledge base"""
+    return current_knowledge_base()
+
+
+def load_medication_index():
+    """Indexed medications.json of the live knowledge base, shared by all sessions"""
+    return load_knowledge_base().medications
+
+
+def medication_rows(records):
+    """Knowledge Base table rows for medication records"""
+    rows = []
+    for med in records:
+        row = {
+            "Medication": med['name'],
+            "Brand Names": ", ".join(med['brand_names']) or "—",
+            "Dose": med.get('dose', ""),
+            "Frequency": med.get('frequency', ""),
+            "Device": med.get('device', "")
+        }
+        if "onset" in med:
+            row["Onset"] = med['onset']
+            row["Duration"] = med.get('duration', "")
+        rows.append(row)
+    return rows
+
+
+@st.cache_resource(max_entries=2)
+def knowledge_base_tables(version, _knowledge_base):
+    """Knowledge Base tab tables, built once per knowledge-base version"""
+    import pandas as pd
+    
+    index = _knowledge_base.medications
+    return {
+        "medication_classes": {key: pd.DataFrame(medication_rows(index.by_class(key)))
+                               for key in index.classes},
+        "spirometry": pd.DataFrame(SPIROMETRY_TABLE),
+        "eosinophil": pd.DataFrame(EOSINOPHIL_TABLE)
+    }
+
+
+@st.cache_resource
+def get_report_store():
+    """Report store shared by all sessions in this server process"""
+    return open_store()
+
+
+@st.cache_resource
+def get_report_exporter():
+    """Background export pool shared by all sessions"""
+    return ReportExporter()
+
+
+@timed("save_patient_data")
+def save_patient_data(data):
+    """Save and render an assessment report in the background.
+
+    Returns a Future of ``export.export_report``'s result for the page to
+    poll. Nothing needs clearing afterwards: every cache derived from the
+    store is keyed on ``version()``, which the save changes.
+    """
+    return get_report_exporter().submit(data, get_report_store())
+
+
+@st.cache_data(max_entries=4)
+def load_cohort_summary(version):
+    """Cohort aggregates; ``version`` is the store's ``version()``, new with every save"""
+    store = get_report_store()
+    return store.read(store.indexer(CohortAggregates).summary)
+
+
+@st.cache_data(max_entries=4)
+def load_rapid_decliners(version):
+    """Patients flagged for rapid FEV1 decline; ``version`` as for the summary"""
+    store = get_report_store()
+    return store.read(store.indexer(Trajectories).rapid)
+
+
+@st.cache_data(max_entries=4)
+def load_cohort_density_chart(version):
+    """FEV1 % vs CAT density figure; ``version`` as for the summary"""
+    store = get_report_store()
+    return cohort_density_figure(store.read(store.indexer(CohortDensity).bins))
+
+
+@st.cache_data(max_entries=64)
+def load_trend_chart(version, patient_id):
+    """Figure of one patient's saved FEV1, CAT and exacerbations; ``version`` as for the summary"""
+    store = get_report_store()
+    return trend_figure(store.read(store.indexer(Trajectories).series, patient_id))
+
+
+@st.cache_data(max_entries=64)
+def cat_items_chart(scores):
+    """CAT item radar for a tuple of item scores in CAT_QUESTIONS order"""
+    return cat_items_figure([label for _, label, _ in CAT_QUESTIONS], scores)
+
+
+@st.cache_data(max_entries=2)
+def load_policy_cohort(version):
+    """Latest assessment per patient for policy simulation; ``version`` as for the summary"""
+    return cohort_from_store(get_report_store())
+
+
+@st.cache_data(max_entries=16)
+def run_policy_simulation(version, policies, replicates, seed):
+    """Simulated outcomes of ``policies`` against the reference policy"""
+    names = (DEFAULT_REFERENCE, *policies)
+    return simulate(load_policy_cohort(version), {name: POLICIES[name] for name in names},
+                    replicates, seed)
+
+
+@st.cache_resource
+def get_spirometry_results():
+    """Ingested device spirometry in the shared store, or None without a SQLite store"""
+    store = get_report_store()
+    if not isinstance(store, SQLiteReportStore):
+        return None
+    results = SpirometryResults()
+    store.write(results.create)
+    return results
+
+
+def device_spirometry(patient_id):
+    """Latest ingested device result for a patient, or None"""
+    results = get_spirometry_results()
+    if not patient_id or results is None:
+        return None
+    return get_report_store().read(results.latest, patient_id)
+
+
+def use_device_result(result):
+    """Copy an ingested result into the spirometry inputs (button callback)"""
+    st.session_state.fev1_actual = result["fev1_actual"]
+    if result["fev1_fvc"] is not None:
+        st.session_state.fev1_fvc = result["fev1_fvc"]
+    if result["predicted_source"] == "export":
+        st.session_state.use_reference = False
+        st.session_state.fev1_predicted = result["fev1_predicted"]
+
+
+def patient_trends(patient_id):
+    """Saved trends for one patient, or {} without a SQLite store"""
+    store = get_report_store()
+    if not patient_id or not isinstance(store, SQLiteReportStore):
+        return {}
+    return store.read(store.indexer(Trajectories).patient, patient_id)
+
+
+def render_patient_information():
+    """Patient Information page: demographics and history"""
+    st.markdown('<div class="section-header">Patient Information</div>', unsafe_allow_html=True)
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        patient_id = st.text_input("Patient ID/MRN", key="patient_id")
+        age = st.number_input("Age", min_value=18, max_value=120, value=60, key="age")
+        gender = st.selectbox("Gender", GENDER_OPTIONS, key="gender")
+        
+    with col2:
+        smoking_status = st.selectbox("Smoking Status", SMOKING_OPTIONS, key="smoking")
+        pack_years = st.number_input("Pack Years (if applicable)", 
+                                    min_value=0, max_value=200, value=0, key="pack_years")
+        bmi = st.number_input("BMI", min_value=10.0, max_value=50.0, value=25.0, key="bmi")
+        height_cm = st.number_input("Height (cm)", min_value=100.0, max_value=250.0, value=None,
+                                    step=1.0, placeholder="For predicted spirometry values",
+                                    key="height_cm")
+    
+    st.markdown("### Medical History")
+    comorbidities = st.multiselect("Comorbidities", COMORBIDITY_OPTIONS, key="comorbidities")
+    
+    current_medications = st.text_area("Current Medications", 
+                                      placeholder="List current medications...",
+                                      key="current_meds")
+    
+    if st.button("Save Patient Information", key="save_patient_info"):
+        try:
+            st.session_state.patient_data.update(
+                patient_id=patient_id,
+                age=age,
+                gender=gender,
+                smoking_status=smoking_status,
+                pack_years=pack_years,
+                bmi=bmi,
+                height_cm=height_cm,
+                comorbidities=comorbidities,
+                current_medications=current_medications
+            )
+        except ValueError as e:
+            st.error(f"❌ {e}")
+        else:
+            st.success("✅ Patient information saved!")
+
+
+# CAT questionnaire items: (response key, label, help text)
+CAT_QUESTIONS = (
+    ("cough", "Cough frequency", "0=Never cough, 5=Cough all the time"),
+    ("phlegm", "Phlegm in chest", "0=No phlegm, 5=Chest completely full"),
+    ("chest_tight", "Chest tightness", "0=Not tight, 5=Very tight"),
+    ("breathless", "Breathlessness going up hills/stairs", "0=Not breathless, 5=Very breathless"),
+    ("activities", "Limited doing activities at home", "0=Not limited, 5=Very limited"),
+    ("confidence", "Confidence leaving home", "0=Very confident, 5=Not confident at all"),
+    ("sleep", "Sleep quality", "0=Sleep soundly, 5=Don't sleep soundly"),
+    ("energy", "Energy level", "0=Lots of energy, 5=No energy at all")
+)
+
+
+def cat_responses():
+    """Current CAT slider values from session state"""
+    return {item: st.session_state.get(f"cat_{item}", 0) for item, _, _ in CAT_QUESTIONS}
+
+
+def spirometry_reference():
+    """Reference-equation values for the saved patient, or None without age, sex and height"""
+    record = st.session_state.patient_data
+    return reference_values(record.age, record.gender, record.height_cm)
+
+
+def spirometry_values():
+    """(FEV1 %, GOLD stage, severity) for the current spirometry inputs"""
+    fev1_predicted = st.session_state.get("fev1_predicted", 3.0)
+    reference = spirometry_reference()
+    if reference and st.session_state.get("use_reference", True):
+        fev1_predicted = reference["fev1_predicted"]
+    fev1_percent = calculate_fev1_percent(st.session_state.get("fev1_actual", 2.0), fev1_predicted)
+    if fev1_percent is None:
+        return None, None, None
+    return (fev1_percent, *classify_spirometry(fev1_percent))
+
+
+# Moving a CAT slider or editing a spirometry value reruns only the fragment
+# that owns it, not the whole script.
+@st.fragment
+def cat_questionnaire():
+    """CAT sliders with a live total"""
+    columns = st.columns(2)
+    for i, (item, label, help_text) in enumerate(CAT_QUESTIONS):
+        with columns[i // 4]:
+            st.slider(label, 0, 5, 0, help=help_text, key=f"cat_{item}")
+    
+    CAT_score = calculate_CAT_score(cat_responses())
+    st.info(f"**CAT Score: {CAT_score}** (0-9: Low, 10-20: Medium, 21-30: High, 31-40: Very High)")
+
+
+@st.fragment
+def spirometry_inputs():
+    """Spirometry inputs with live FEV1 % predicted, GOLD stage and obstruction check"""
+    device = device_spirometry(st.session_state.patient_data.patient_id)
+    if device:
+        ratio = f", FEV1/FVC {device['fev1_fvc']:.2f}" if device['fev1_fvc'] is not None else ""
+        st.caption(f"Device result from {device['test_date'][:10]} ({device['source']}): "
+                   f"FEV1 {device['fev1_actual']:.2f} L{ratio}")
+        st.button("Use device result", key="use_device_result", on_click=use_device_result,
+                  args=(device,))
+    
+    reference = spirometry_reference()
+    use_reference = reference is not None and st.toggle(
+        "Use predicted values from reference equations (age, sex, height)",
+        value=True, key="use_reference")
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.number_input("FEV1 (Liters)", min_value=0.0, max_value=10.0, 
+                        value=2.0, step=0.1, key="fev1_actual")
+    with col2:
+        if use_reference:
+            st.metric("FEV1 Predicted (Liters)", f"{reference['fev1_predicted']:.2f}")
+            st.caption(f"LLN {reference['fev1_lln']:.2f} L | FVC predicted "
+                       f"{reference['fvc_predicted']:.2f} L (LLN {reference['fvc_lln']:.2f} L)")
+        else:
+            st.number_input("FEV1 Predicted (Liters)", min_value=0.0, max_value=10.0,
+                            value=3.0, step=0.1, key="fev1_predicted")
+    with col3:
+        st.number_input("FEV1/FVC Ratio", min_value=0.0, max_value=1.0,
+                        value=0.65, step=0.01, key="fev1_fvc")
+    
+    fev1_percent, gold_stage, severity = spirometry_values()
+    if fev1_percent is not None:
+        st.info(f"**FEV1: {fev1_percent:.1f}% predicted | {gold_stage} ({severity})**")
+    
+    fev1_fvc = st.session_state.fev1_fvc
+    lln = f" (LLN {reference['fev1_fvc_lln']:.2f})" if reference else ""
+    if airflow_obstruction(fev1_fvc):
+        st.info(f"FEV1/FVC {fev1_fvc:.2f} < {OBSTRUCTION_RATIO:.2f}{lln}: airflow obstruction confirmed")
+    else:
+        st.warning(f"FEV1/FVC {fev1_fvc:.2f} ≥ {OBSTRUCTION_RATIO:.2f}{lln}: airflow obstruction "
+                   "not confirmed, so the GOLD stage does not apply")
+
+
+def render_clinical_assessment():
+    """Clinical Assessment page: mMRC, CAT, exacerbations, spirometry, labs"""
+    st.markdown('<div class="section-header">Clinical Assessment</div>', unsafe_allow_html=True)
+    
+    # Symptom Assessment
+    st.markdown("### 1. Dyspnea Assessment (mMRC Scale)")
+    dyspnea_level = st.selectbox(
+        "Select the statement that best describes breathlessness:",
+        MMRC_OPTIONS,
+        key="dyspnea"
+    )
+    mMRC_score = calculate_mMRC_score(dyspnea_level)
+    st.info(f"**mMRC Score: {mMRC_score}**")
+    
+    # CAT Score
+    st.markdown("### 2. COPD Assessment Test (CAT)")
+    st.write("Rate each item from 0 (best) to 5 (worst):")
+    
+    cat_questionnaire()
+    
+    # Exacerbation History
+    st.markdown("### 3. Exacerbation History")
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        exacerbations = st.number_input(
+            "Number of exacerbations in past year requiring antibiotics/steroids:",
+            min_value=0, max_value=20, value=0, key="exacerbations"
+        )
+    
+    with col2:
+        hospitalization = st.checkbox("Any hospitalization for COPD exacerbation in past year?",
+                                    key="hospitalization")
+    
+    # Spirometry
+    st.markdown("### 4. Spirometry Results")
+    spirometry_inputs()
+    
+    # Blood Tests
+    st.markdown("### 5. Laboratory Results")
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        eosinophils = st.number_input("Blood Eosinophils (cells/μL)", 
+                                     min_value=0, max_value=2000, value=150, key="eosinophils")
+        st.caption("Reference: <100 (low), 100-300 (intermediate), ≥300 (high)")
+    
+    with col2:
+        other_labs = st.text_area("Other Lab Results", 
+                                 placeholder="Hemoglobin, Alpha-1 antitrypsin, etc.",
+                                 key="other_labs")
+    
+    # Chest X-ray Findings
+    st.markdown("### 6. Chest X-ray Findings")
+    cxr_findings = st.multiselect("Select CXR Findings:", CXR_FINDING_OPTIONS, key="cxr_findings")
+    
+    cxr_notes = st.text_area("Additional CXR Notes", key="cxr_notes")
+    
+    if st.button("Complete Assessment", key="complete_assessment"):
+        # The fragments keep their inputs in session state; read them once here
+        fev1_percent, gold_stage, _ = spirometry_values()
+        try:
+            st.session_state.patient_data.update(
+                mMRC_score=mMRC_score,
+                CAT_score=calculate_CAT_score(cat_responses()),
+                exacerbations=exacerbations,
+                hospitalization=hospitalization,
+                fev1_percent=fev1_percent,
+                fev1_fvc=st.session_state.fev1_fvc,
+                gold_stage=gold_stage,
+                eosinophils=eosinophils,
+                cxr_findings=cxr_findings,
+                cxr_notes=cxr_notes,
+                other_labs=other_labs
+            )
+        except ValueError as e:
+            st.error(f"❌ {e}")
+        else:
+            # The sliders' state is dropped once the page is left
+            st.session_state.cat_items = tuple(cat_responses().values())
+            st.session_state.assessment_complete = True
+            st.session_state.pop("report_export", None)
+            st.success("✅ Clinical assessment completed! Go to 'Diagnosis & Treatment' for recommendations.")
+
+
+def render_diagnosis_and_treatment():
+    """Diagnosis & Treatment page: GOLD group, recommendations, report"""
+    knowledge_base = load_knowledge_base()
+    
+    st.markdown('<div class="section-header">Diagnosis & Treatment Recommendations</div>', unsafe_allow_html=True)
+    
+    if not st.session_state.assessment_complete:
+        st.warning("⚠️ Please complete the Clinical Assessment first.")
+        return
+    
+    # Validated when the assessment was completed; no fallbacks needed
+    record = st.session_state.patient_data
+    data = record.to_dict()
+    
+    # GOLD group, considerations and report sections, shared across sessions
+    bundle = cached_bundle(data, knowledge_base)
+    GOLD_group = bundle['GOLD_group']
+    
+    group_info = knowledge_base['groups'][GOLD_group]
+    
+    # Display Diagnosis
+    st.markdown("### Diagnosis Summary")
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric("GOLD Group", GOLD_group)
+        st.caption(group_info['name'])
+    
+    with col2:
+        if record.gold_stage:
+            st.metric("Airflow Limitation", record.gold_stage)
+            st.caption(f"FEV1: {record.fev1_percent:.1f}%")
+        if record.fev1_fvc is not None:
+            confirmed = "confirms" if airflow_obstruction(record.fev1_fvc) else "does not confirm"
+            st.caption(f"FEV1/FVC {record.fev1_fvc:.2f} {confirmed} obstruction (<{OBSTRUCTION_RATIO:.2f})")
+    
+    with col3:
+        st.metric("Symptom Burden", 
+                 "High" if record.CAT_score >= 10 else "Low")
+        st.caption(f"CAT: {record.CAT_score}, mMRC: {record.mMRC_score}")
+    
+    if st.session_state.get("cat_items"):
+        with st.expander("CAT Item Breakdown"):
+            st.plotly_chart(cat_items_chart(st.session_state.cat_items))
+    
+    # Trends across this patient's saved assessments
+    trends = patient_trends(record.patient_id)
+    if trends:
+        st.markdown("### Trends Across Saved Assessments")
+        
+        for metric, trend in trends.items():
+            label, unit, _ = THRESHOLDS[metric]
+            if trend['rapid']:
+                st.error(f"🚩 **Rapid worsening of {label}:** {trend['slope']:+.1f} {unit} "
+                         f"over {trend['points']} assessments ({trend['span_years']:.1f} years)")
+        
+        columns = st.columns(len(trends))
+        for column, (metric, trend) in zip(columns, trends.items()):
+            label, unit, _ = THRESHOLDS[metric]
+            with column:
+                st.metric(label, f"{trend['latest']:g}",
+                          None if trend['slope'] is None else f"{trend['slope']:+.1f} {unit}",
+                          delta_color="normal" if metric == "fev1_percent" else "inverse")
+                st.caption(f"{trend['points']} saved assessments")
+        
+        st.plotly_chart(load_trend_chart(get_report_store().version(), record.patient_id))
+    
+    # Treatment Recommendations
+    st.markdown("### Treatment Recommendations")
+    
+    st.markdown('<div class="success-box">', unsafe_allow_html=True)
+    st.markdown(f"**Primary Treatment Strategy:** {group_info['treatment']}")
+    st.markdown('</div>', unsafe_allow_html=True)
+    
+    # Medication Options
+    st.markdown("#### Recommended Medications")
+    
+    for i, med in enumerate(group_info['medications'], 1):
+        st.write(f"{i}. {med}")
+    
+    # Special Considerations
+    st.markdown("#### Special Considerations")
+    
+    considerations = bundle['considerations']
+
+    for consideration in considerations:
+        st.markdown(f"- {consideration}")
+    
+    # Rescue Therapy
+    st.markdown("#### Rescue Therapy (All Patients)")
+    st.markdown('<div class="info-box">', unsafe_allow_html=True)
+    st.write("**All patients should have a short-acting bronchodilator for symptom relief:**")
+    for rescue in knowledge_base['rescue_therapy']:
+        st.write(f"- {rescue}")
+    st.markdown('</div>', unsafe_allow_html=True)
+    
+    # Non-Pharmacologic Management
+    st.markdown("### Non-Pharmacologic Management")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.markdown("#### Essential Interventions")
+        st.write("✅ Smoking cessation (if applicable)")
+        st.write("✅ Pulmonary rehabilitation")
+        st.write("✅ Influenza vaccination (annual)")
+        st.write("✅ Pneumococcal vaccination")
+        st.write("✅ COVID-19 vaccination")
+    
+    with col2:
+        st.markdown("#### Additional Recommendations")
+        st.write("• Regular exercise as tolerated")
+        st.write("• Nutritional optimization")
+        st.write("• Oxygen therapy if hypoxemic")
+        st.write("• Education on inhaler technique")
+        st.write("• Self-management education")
+    
+    # Follow-up Plan
+    st.markdown("### Follow-up Plan")
+    st.markdown('<div class="warning-box">', unsafe_allow_html=True)
+    st.write("**Recommended Follow-up:**")
+    st.write("- Initial follow-up: 2-4 weeks after starting new therapy")
+    st.write("- Routine follow-up: Every 3-6 months for stable patients")
+    st.write("- Monitor for: Symptom control, exacerbation frequency, side effects")
+    st.write("- Adjust therapy based on response (see GOLD guidelines)")
+    st.markdown('</div>', unsafe_allow_html=True)
+    
+    # Save Report
+    if st.button("💾 Save Assessment Report", key="save_report"):
+        report_data = build_report(data, GOLD_group, considerations, knowledge_base)
+        st.session_state.report_export = save_patient_data(report_data)
+    
+    export = st.session_state.get("report_export")
+    if export is not None:
+        if export.done():
+            render_export_downloads(export)
+        else:
+            export_progress()
+
+
+# Polls the pending export without rerunning the page; once it finishes the
+# whole page reruns once to show the downloads.
+@st.fragment(run_every=0.5)
+def export_progress():
+    """Progress note for a report export still running in the background"""
+    if st.session_state.report_export.done():
+        st.rerun()
+    st.info("⏳ Saving report and preparing downloads...")
+
+
+def render_export_downloads(export):
+    """Saved-report message and JSON/XLSX/PDF downloads of a finished export"""
+    try:
+        result = export.result()
+    except Exception as e:
+        st.error(f"❌ Report could not be saved: {e}")
+        return
+    
+    st.success(f"✅ Report saved: {result['reference']}")
+    
+    labels = {"json": "📥 Download Report (JSON)", "xlsx": "📊 Download Report (Excel)",
+              "pdf": "🖨️ Download Report (PDF)"}
+    for column, (fmt, (file_name, mime, content)) in zip(st.columns(len(result['files'])),
+                                                         result['files'].items()):
+        with column:
+            st.download_button(label=labels[fmt], data=content, file_name=file_name,
+                               mime=mime, on_click="ignore", key=f"download_{fmt}")
+
+
+# Searching reruns only this fragment; each query is a few dictionary lookups
+# in the shared medication index.
+@st.fragment
+def medication_search():
+    """Medication search box over generic names, brands, classes and devices"""
+    index = load_medication_index()
+    
+    query = st.text_input("🔍 Search medications",
+                          placeholder="Generic or brand name, class (e.g. LAMA) or device (e.g. SMI)",
+                          key="medication_search")
+    if not query:
+        return
+    
+    results = index.search(query, limit=10)
+    if not results:
+        st.write(f"No medications match '{query}'.")
+        return
+    for med in results:
+        brands = f" ({', '.join(med['brand_names'])})" if med['brand_names'] else ""
+        st.markdown(f"**{med['name']}**{brands} — {index.classes[med['medication_class']]['name']}  \n"
+                    f"{med.get('dose', '')}, {med.get('frequency', '').lower()} · {med.get('device', '')}")
+        if med.get('special_notes'):
+            st.caption(med['special_notes'])
+
+
+def render_knowledge_base():
+    """Knowledge Base page: GOLD groups, medications, spirometry, guidelines"""
+    knowledge_base = load_knowledge_base()
+    tables = knowledge_base_tables(knowledge_base.version, knowledge_base)
+    
+    st.markdown('<div class="section-header">COPD Knowledge Base (GOLD 2026)</div>', unsafe_allow_html=True)
+    cache = recommendation_cache_stats()
+    hit_rate = f", {cache['hit_rate']:.0%} hits" if cache['hit_rate'] is not None else ""
+    st.caption(f"Knowledge base version {knowledge_base.version} · "
+               f"recommendation cache {cache['size']:,}/{cache['maxsize']:,} results{hit_rate}")
+    
+    tab1, tab2, tab3, tab4 = st.tabs(["GOLD Groups", "Medications", "Spirometry", "Guidelines"])
+    
+    with tab1:
+        st.markdown("### GOLD ABE Classification System")
+        
+        for group_key, group_data in knowledge_base['groups'].items():
+            with st.expander(f"**Group {group_key}: {group_data['name']}**", expanded=True):
+                st.write("**Criteria:**")
+                for criterion, value in group_data['criteria'].items():
+                    st.write(f"- {criterion}: {value}")
+                
+                st.write(f"\n**Treatment:** {group_data['treatment']}")
+                
+                st.write("\n**Medication Options:**")
+                for med in group_data['medications']:
+                    st.write(f"- {med}")
+    
+    with tab2:
+        medication_search()
+        
+        st.markdown("### Medication Classes")
+        
+        for class_key, class_info in knowledge_base.medications.classes.items():
+            st.markdown(f"#### {class_info['name']}")
+            description = class_info.get('indication') or class_info.get('mechanism') or class_info.get('rationale')
+            if description:
+                st.caption(description)
+            st.table(tables['medication_classes'][class_key])
+    
+    with tab3:
+        st.markdown("### Spirometry Classification")
+        
+        st.table(tables['spirometry'])
+        
+        st.info("**Note:** FEV1/FVC <0.70 confirms airflow obstruction (COPD diagnosis)")
+    
+    with tab4:
+        st.markdown("### Key Guidelines Summary")
+        
+        st.markdown("#### Assessment Tools")
+        st.write("- **mMRC Dyspnea Scale:** 0-4 (≥2 indicates more symptomatic)")
+        st.write("- **CAT Score:** 0-40 (<10 low impact, ≥10 high impact)")
+        st.write("- **Exacerbation History:** ≥1 in past year indicates high risk")
+        
+        st.markdown("#### Treatment Principles")
+        st.write("1. All patients receive rescue bronchodilator (SABA ± SAMA)")
+        st.write("2. Regular therapy based on GOLD group (A, B, or E)")
+        st.write("3. Consider eosinophils for ICS decisions in Group E")
+        st.write("4. Prefer single-inhaler combinations for adherence")
+        st.write("5. Always combine with non-pharmacologic management")
+        
+        st.markdown("#### Eosinophil-Guided Therapy")
+        st.table(tables['eosinophil'])
+        
+        st.markdown("#### Red Flags")
+        st.markdown('<div class="warning-box">', unsafe_allow_html=True)
+        st.write("**Refer for specialist evaluation if:**")
+        st.write("- Diagnostic uncertainty")
+        st.write("- Severe COPD (GOLD 3-4)")
+        st.write("- Frequent exacerbations despite optimal therapy")
+        st.write("- Rapid decline in lung function")
+        st.write("- Hemoptysis")
+        st.write("- Consideration for oxygen therapy or surgical interventions")
+        st.markdown('</div>', unsafe_allow_html=True)
+        
+        st.markdown("#### References")
+        st.write("- Global Initiative for Chronic Obstructive Lung Disease (GOLD) 2026 Report")
+        st.write("- UpToDate: Stable COPD - Initial Pharmacologic Management")
+        st.write("- Latest update: January 2026")
+
+
+def render_cohort_analytics():
+    """Cohort Analytics page: aggregate mix and CAT distribution"""
+    import pandas as pd
+    
+    st.markdown('<div class="section-header">Cohort Analytics</div>', unsafe_allow_html=True)
+    
+    store = get_report_store()
+    if not isinstance(store, SQLiteReportStore):
+        st.info("Cohort analytics require the SQLite report store (COPD_REPORT_STORE=sqlite:///...).")
+        return
+    
+    version = store.version()
+    summary = load_cohort_summary(version)
+    if not summary['total']:
+        st.info("No assessments have been saved yet.")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric("Saved Assessments", f"{summary['total']:,}")
+    
+    with col2:
+        if summary['CAT_mean'] is not None:
+            st.metric("Mean CAT Score", f"{summary['CAT_mean']:.1f}")
+    
+    with col3:
+        st.metric("Triple-Therapy Considerations", f"{summary['triple_therapy_share']:.1%}")
+        st.caption(f"{summary['triple_therapy']:,} assessments")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.markdown("### GOLD Group Mix")
+        st.bar_chart(pd.Series(summary['GOLD_group'], name="Assessments"))
+    
+    with col2:
+        st.markdown("### GOLD Stage Mix")
+        st.bar_chart(pd.Series(summary['gold_stage'], name="Assessments"))
+    
+    st.markdown("### CAT Score Distribution")
+    st.bar_chart(pd.Series(summary['CAT_histogram'], name="Assessments").rename_axis("CAT score"))
+    
+    st.markdown("### FEV1 % Predicted vs CAT Score by GOLD Group")
+    st.caption(f"Each marker is a bin of assessments (CAT score, {FEV1_BIN_WIDTH}% of FEV1 predicted), "
+               "sized by count; dotted lines mark CAT 10 and GOLD stages 1-4")
+    st.plotly_chart(load_cohort_density_chart(version))
+    
+    st.markdown("### Rapid FEV1 Decliners")
+    decliners = load_rapid_decliners(version)
+    label, unit, threshold = THRESHOLDS["fev1_percent"]
+    st.caption(f"{label} falling by more than {-threshold:g} {unit} across at least "
+               f"{MIN_POINTS} assessments spanning {MIN_SPAN_YEARS:g}+ years")
+    if decliners:
+        st.dataframe(pd.DataFrame(decliners).rename(columns={
+            "patient_id": "Patient ID", "points": "Assessments", "span_years": "Years",
+            "latest": "Latest FEV1 %", "slope": f"Slope ({unit})"}).round(2),
+            hide_index=True)
+    else:
+        st.write("No patients flagged.")
+    
+    policy_what_if(version)
+
+
+def _interval(value, digits=0):
+    return f"{value['mean']:,.{digits}f} ({value['low']:,.{digits}f} to {value['high']:,.{digits}f})"
+
+
+@st.fragment
+def policy_what_if(version):
+    """Monte Carlo comparison of escalation policies over the saved cohort"""
+    import pandas as pd
+    
+    st.markdown("### Escalation Policy What-If")
+    st.caption(f"Expected exacerbations and pneumonia episodes per year for each patient's latest "
+               f"assessment, against the reference policy ({POLICY_DESCRIPTIONS[DEFAULT_REFERENCE]}), "
+               f"with 95% intervals. Effect sizes are planning estimates from trials.")
+    
+    col1, col2, col3 = st.columns([3, 2, 1])
+    
+    with col1:
+        policies = st.multiselect("Policies", [name for name in POLICIES if name != DEFAULT_REFERENCE],
+                                  default=["triple_eos300"], key="policy_names",
+                                  format_func=POLICY_DESCRIPTIONS.get)
+    with col2:
+        replicates = st.select_slider("Replicates", [500, 1000, 2000, 5000, 10000, 20000],
+                                      value=DEFAULT_REPLICATES, key="policy_replicates")
+    with col3:
+        seed = st.number_input("Seed", min_value=0, value=0, step=1, key="policy_seed")
+    
+    results = run_policy_simulation(version, tuple(policies), replicates, int(seed))
+    st.dataframe(pd.DataFrame([{
+        "Policy": POLICY_DESCRIPTIONS.get(name, name),
+        "On ICS": result["on_ics"],
+        "Therapy Changed": result["changed"],
+        "Exacerbations": _interval(result["exacerbations"]),
+        "Exacerbations Avoided": _interval(result["exacerbations_avoided"]),
+        "Pneumonia": _interval(result["pneumonia"], 1),
+        "Excess Pneumonia": _interval(result["excess_pneumonia"], 1),
+    } for name, result in results.items()]), hide_index=True)
+
+
+def render_report_search():
+    """Report Search page: full-text search of notes, labs, medications and CXR findings"""
+    st.markdown('<div class="section-header">Report Search</div>', unsafe_allow_html=True)
+    
+    store = get_report_store()
+    if not isinstance(store, SQLiteReportStore):
+        st.info("Report search requires the SQLite report store (COPD_REPORT_STORE=sqlite:///...).")
+        return
+    
+    query = st.text_input("Search saved reports", key="search_query",
+                          placeholder='bullae, "alpha-1 antitrypsin", tiotrop*')
+    st.caption("Searches CXR notes and findings, other labs and current medications. "
+               'Use quotes for a phrase and * for a prefix; every term must match.')
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        patient_id = st.text_input("Patient ID/MRN", key="search_patient")
+    with col2:
+        since = st.date_input("From", value=None, key="search_since")
+    with col3:
+        until = st.date_input("Until (inclusive)", value=None, key="search_until")
+    
+    if not query.strip():
+        return
+    
+    until = (until + timedelta(days=1)).isoformat() if until else None
+    hits = store.read(store.indexer(ReportSearch).search, query, patient_id.strip() or None,
+                      since.isoformat() if since else None, until)
+    if not hits:
+        st.write("No matching reports.")
+        return
+    
+    st.caption(f"{len(hits)} most recent matching reports" if len(hits) == SEARCH_LIMIT
+               else f"{len(hits)} matching reports")
+    for hit in hits:
+        st.markdown(f"**{hit['assessment_date'][:10]}** · {hit['patient_id'] or 'no patient ID'} "
+                    f"· #{hit['report_id']}  \n{hit['snippet']}")
+
+
+# Navigation: sidebar label -> page render function
+PAGES = {
+    "Patient Information": render_patient_information,
+    "Clinical Assessment": render_clinical_assessment,
+    "Diagnosis & Treatment": render_diagnosis_and_treatment,
+    "Knowledge Base": render_knowledge_base,
+    "Cohort Analytics": render_cohort_analytics,
+    "Report Search": render_report_search
+}